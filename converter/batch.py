@@ -0,0 +1,310 @@
+"""
+Compiles every musicxml and midi file in a directory to pcode across a pool of
+processes. A piece that fails is reported and the rest of the batch continues.
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import InvalidOperation
+from xml.etree.ElementTree import ParseError
+
+from constants import Constants
+from solenoids import SolenoidIndex
+from playable import ClusterPlanCache, Planner
+from compiler import (
+    MIDI_EXTENSIONS,
+    XML_EXTENSIONS,
+    compile_command_streams,
+    compile_piece,
+)
+from binary_pcode import BINARY_EXTENSION, write_binary_pcode
+from pcode import SeekIndex, INDEX_SUFFIX, merge_commands, write_pcode
+from pcode_v2 import V2_EXTENSION, write_pcode_v2
+
+PCODE_EXTENSION = ".pcode"
+
+FORMAT_EXTENSIONS = {
+    "text": PCODE_EXTENSION,
+    "binary": BINARY_EXTENSION,
+    "v2": V2_EXTENSION,
+}
+"""The file extension of each output format."""
+
+INPUT_ERRORS = (ValueError, OSError, EOFError, ParseError, InvalidOperation)
+"""
+The errors a bad score or output path raises. xsdata and mido report bad files as
+ValueError, OSError or EOFError. Any other exception is a bug. compile_batch still
+reports it as a failed piece, with its traceback, and carries on with the batch.
+"""
+
+worker_constants: Constants | None = None
+"""The Constants of the current worker process. Read once by init_worker."""
+worker_key_map: SolenoidIndex | None = None
+"""The SolenoidIndex of the current worker process. Built once by init_worker."""
+worker_plan_cache: ClusterPlanCache | None = None
+"""The cluster plans of every piece compiled by the current worker process."""
+
+
+class CompileResult:
+    def __init__(
+        self, input_file: str, output_file: str, seconds: float, error: str | None
+    ) -> None:
+        """
+        The outcome of compiling a single piece.
+
+        param input_file: The path of the musicxml or midi file.
+        param output_file: The path of the pcode file.
+        param seconds: The wall time spent compiling the piece.
+        param error: A description of the failure or None if the piece compiled.
+        """
+        self.input_file = input_file
+        self.output_file = output_file
+        self.seconds = seconds
+        self.error = error
+
+    def __str__(self) -> str:
+        name = os.path.basename(self.input_file)
+
+        if self.error is None:
+            return f"ok     {self.seconds:8.3f}s  {name}"
+        else:
+            return f"FAILED {self.seconds:8.3f}s  {name}: {self.error}"
+
+
+def init_worker() -> None:
+    global worker_constants, worker_key_map, worker_plan_cache
+
+    worker_constants = Constants()
+    worker_key_map = SolenoidIndex(88, worker_constants.first_88_key)
+    worker_plan_cache = ClusterPlanCache()
+
+
+def compile_job(
+    input_file: str,
+    output_file: str,
+    cache_directory: str | None,
+    planner: Planner,
+    two_hands: bool = False,
+    output_format: str = "text",
+    plan_jobs: int = 1,
+) -> CompileResult:
+    """
+    Compile a single piece inside a worker process. INPUT_ERRORS are caught and
+    returned as part of the result. Any other exception is raised to compile_batch.
+    """
+    start = time.perf_counter()
+
+    try:
+        if output_format == "v2":
+            streams = compile_command_streams(
+                worker_constants,
+                worker_key_map,
+                input_file,
+                cache_directory,
+                planner,
+                worker_plan_cache,
+                two_hands,
+                plan_jobs,
+            )
+            write_pcode_v2(output_file, merge_commands(streams))
+        else:
+            seek_index = SeekIndex()
+            pcode = compile_piece(
+                worker_constants,
+                worker_key_map,
+                input_file,
+                cache_directory,
+                planner,
+                worker_plan_cache,
+                two_hands,
+                seek_index,
+                plan_jobs,
+            )
+
+            if output_format == "binary":
+                write_binary_pcode(output_file, pcode)
+            else:
+                write_pcode(output_file, pcode)
+                seek_index.write(output_file + INDEX_SUFFIX)
+        error = None
+    except INPUT_ERRORS as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return CompileResult(input_file, output_file, time.perf_counter() - start, error)
+
+
+def find_scores(input_directory: str) -> list[str]:
+    """
+    Find every musicxml and midi file in a directory.
+
+    param input_directory: The path of the directory to search.
+
+    return: A sorted list of file paths.
+    """
+    extensions = MIDI_EXTENSIONS + XML_EXTENSIONS
+
+    return sorted(
+        os.path.join(input_directory, name)
+        for name in os.listdir(input_directory)
+        if name.lower().endswith(extensions)
+    )
+
+
+def output_path(
+    output_directory: str, input_file: str, extension: str = PCODE_EXTENSION
+) -> str:
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+
+    return os.path.join(output_directory, stem + extension)
+
+
+def compile_batch(
+    input_directory: str,
+    output_directory: str,
+    jobs: int | None = None,
+    cache_directory: str | None = None,
+    planner: Planner = Planner.GREEDY,
+    two_hands: bool = False,
+    output_format: str = "text",
+    plan_jobs: int = 1,
+) -> list[CompileResult]:
+    """
+    Compile every score in input_directory to a pcode file of the same name in
+    output_directory. Results are printed as each piece finishes. A piece that fails in
+    any way, even by crashing its worker, is reported as failed and the rest of the batch
+    carries on.
+
+    param input_directory: The path of the directory of musicxml and midi files.
+    param output_directory: The path to write pcode files to. It is created if missing.
+    param jobs: The number of worker processes or None for one per cpu.
+    param cache_directory: The path of the score cache directory or None to skip it.
+    param planner: The Planner used to choose the moves.
+    param two_hands: True to play the second staff of musicxml files with the left hand.
+    param output_format: A key of FORMAT_EXTENSIONS.
+    param plan_jobs: The number of processes each worker plans greedy clusters on.
+
+    return: A CompileResult for each piece in input file order.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    input_files = find_scores(input_directory)
+    extension = FORMAT_EXTENSIONS[output_format]
+    results: dict[str, CompileResult] = {}
+
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as executor:
+        futures = {
+            executor.submit(
+                compile_job,
+                input_file,
+                output_path(output_directory, input_file, extension),
+                cache_directory,
+                planner,
+                two_hands,
+                output_format,
+                plan_jobs,
+            ): input_file
+            for input_file in input_files
+        }
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                input_file = futures[future]
+                traceback.print_exception(type(e), e, e.__traceback__)
+                # The worker never reported its time, so this is the time since the
+                # batch started.
+                result = CompileResult(
+                    input_file,
+                    output_path(output_directory, input_file, extension),
+                    time.perf_counter() - start,
+                    f"unexpected {type(e).__name__}: {e}",
+                )
+
+            results[result.input_file] = result
+            print(result, flush=True)
+
+    return [results[input_file] for input_file in input_files]
+
+
+def parse_args(args: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compile a directory of musicxml and midi files to pcode."
+    )
+    parser.add_argument("input_directory", help="directory of scores to compile")
+    parser.add_argument("output_directory", help="directory to write pcode files to")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of worker processes (default: one per cpu)",
+    )
+    parser.add_argument(
+        "--plan-jobs",
+        type=int,
+        default=1,
+        help="number of processes each worker plans greedy clusters on (default: 1)",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache_directory",
+        default=None,
+        help="score cache directory shared by every worker",
+    )
+    parser.add_argument(
+        "--planner",
+        choices=[planner.name.lower() for planner in Planner],
+        default=Planner.GREEDY.name.lower(),
+        help="move planner to use (default: greedy)",
+    )
+    parser.add_argument(
+        "--two-hands",
+        action="store_true",
+        help="play the second staff with the left hand (musicxml only)",
+    )
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=list(FORMAT_EXTENSIONS),
+        default="text",
+        help="pcode format to write (default: text)",
+    )
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    arguments = parse_args(sys.argv[1:])
+
+    start = time.perf_counter()
+
+    results = compile_batch(
+        arguments.input_directory,
+        arguments.output_directory,
+        arguments.jobs,
+        arguments.cache_directory,
+        Planner[arguments.planner.upper()],
+        arguments.two_hands,
+        arguments.output_format,
+        arguments.plan_jobs,
+    )
+
+    failures = [result for result in results if result.error is not None]
+
+    print(
+        f"{len(results) - len(failures)} compiled, {len(failures)} failed "
+        f"in {time.perf_counter() - start:.3f}s"
+    )
+
+    for result in failures:
+        print(result)
+
+    sys.exit(1 if failures else 0)
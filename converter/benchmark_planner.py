@@ -0,0 +1,79 @@
+"""
+Compares the greedy and optimal planners on one or more scores for planning time and
+the total time lost to moves.
+"""
+
+import sys
+import time
+
+from constants import Constants
+from solenoids import SolenoidIndex
+from compiler import read_note_list
+from pcode import KEY_WIDTH
+from playable import PlayableNoteList, Planner
+
+
+def total_time_loss(note_list: PlayableNoteList) -> float:
+    """
+    Sum the part of each move that does not fit in the spare time after its note. This
+    is the value plan_positions minimizes.
+
+    return: A float value of microseconds.
+    """
+    total = 0.0
+
+    for i, move in enumerate(note_list.moves):
+        if move:
+            playable = note_list[i]
+            spare_time = playable.next_delay - playable.duration
+            move_time = note_list.travel_table.move_time(abs(move))
+            total += max(0.0, move_time - spare_time)
+
+    return total
+
+
+def run_planner(
+    constants: Constants, key_map: SolenoidIndex, input_file: str, planner: Planner
+) -> str:
+    note_list = read_note_list(key_map, input_file)
+    acceleration = constants.max_acceleration
+    velocity = constants.max_velocity
+
+    start = time.perf_counter()
+
+    try:
+        if planner == Planner.GREEDY:
+            note_list.find_groups()
+            note_list.find_clusters()
+        note_list.find_moves(KEY_WIDTH, acceleration, velocity, planner)
+    except ValueError as e:
+        return f"{planner.name:8} failed {e}"
+
+    seconds = time.perf_counter() - start
+    loss = total_time_loss(note_list)
+    distance = sum(abs(move) for move in note_list.moves)
+
+    return (
+        f"{planner.name:8} {seconds * 1000:9.2f}ms  "
+        f"time loss {loss / 1000:10.1f}ms  distance {distance:5} keys"
+    )
+
+
+if __name__ == "__main__":
+    import os
+
+    constants = Constants()
+
+    key_map = SolenoidIndex(88, constants.first_88_key)
+
+    input_files = sys.argv[1:]
+
+    if not input_files:
+        current_directory = os.path.dirname(os.path.realpath(__file__))
+        input_files = [f"{current_directory}/test.musicxml"]
+
+    for input_file in input_files:
+        print(os.path.basename(input_file))
+
+        for planner in Planner:
+            print(f"  {run_planner(constants, key_map, input_file, planner)}")
@@ -0,0 +1,251 @@
+"""
+A binary container for pcode. The file is a fixed size header followed by one fixed
+size record for each deploy and move command in pcode order, so a reader can memory map
+the records as a numpy structured array instead of parsing text. Text pcode converts to
+binary and back without any change.
+"""
+
+from __future__ import annotations
+import os
+from collections.abc import Iterable, Iterator
+
+import numpy
+
+from pcode import BASE_18, write_pcode
+
+MAGIC = b"PCOD"
+"""The first bytes of every binary pcode file."""
+FORMAT_VERSION = 1
+"""Changed whenever the header or record layout changes."""
+BINARY_EXTENSION = ".pcb"
+"""The file extension of binary pcode."""
+
+DEPLOY_DIGITS = 5
+"""The number of solenoid digits in the n parameter of a deploy."""
+
+HEADER_DTYPE = numpy.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u2"),
+        ("record_size", "<u2"),
+        ("count", "<u8"),
+    ]
+)
+"""The header of a binary pcode file."""
+
+RECORD_DTYPE = numpy.dtype(
+    [
+        ("command", "S1"),
+        ("hand", "u1"),
+        ("digits", "u1", (DEPLOY_DIGITS,)),
+        ("force", "<i2"),
+        ("position", "<i4"),
+        ("time", "<i4"),
+        ("duration", "<i4"),
+    ]
+)
+"""
+A single deploy or move command. command is b"d" or b"h". digits holds the BASE_18
+value of each digit of n and force holds f for deploys, position holds p for moves, and
+the other fields are zero. time is the t of a deploy or the d of a move and duration is
+l.
+"""
+
+DEPLOY = b"d"
+MOVE = b"h"
+
+CHUNK_RECORDS = 4096
+"""The number of records packed before each write."""
+
+
+def parse_command(line: str) -> tuple:
+    """
+    Convert a line of text pcode to a record.
+
+    param line: A deploy or move command such as "d s0 n1HHHH f80 t5000 l599".
+
+    return: A tuple of the fields of RECORD_DTYPE.
+    """
+    command, *parameters = line.split(" ")
+    fields = {parameter[0]: parameter[1:] for parameter in parameters}
+
+    if command == "d":
+        if len(fields["n"]) != DEPLOY_DIGITS:
+            raise ValueError(f"Deploy does not have {DEPLOY_DIGITS} digits: {line}")
+
+        digits = tuple(BASE_18.index(digit) for digit in fields["n"])
+
+        return (
+            DEPLOY,
+            int(fields["s"]),
+            digits,
+            int(fields["f"]),
+            0,
+            int(fields["t"]),
+            int(fields["l"]),
+        )
+
+    if command == "h":
+        return (
+            MOVE,
+            int(fields["s"]),
+            (0,) * DEPLOY_DIGITS,
+            0,
+            int(fields["p"]),
+            int(fields["d"]),
+            int(fields["l"]),
+        )
+
+    raise ValueError(f"Unknown pcode command: {line}")
+
+
+def format_record(record: numpy.void) -> str:
+    """
+    Convert a record back to its line of text pcode.
+
+    param record: A single element of an array of RECORD_DTYPE.
+
+    return: The command as a string without a newline.
+    """
+    command, hand, digits, force, position, time, duration = record.tolist()
+
+    if command == DEPLOY:
+        n = "".join(BASE_18[digit] for digit in digits)
+        return f"d s{hand} n{n} f{force} t{time} l{duration}"
+
+    return f"h s{hand} p{position} d{time} l{duration}"
+
+
+def iter_records(pcode: Iterable[str]) -> Iterator[numpy.ndarray]:
+    """
+    Pack text pcode into arrays of at most CHUNK_RECORDS records.
+
+    param pcode: The text pcode split at any points, such as the iterator from
+                 compile_piece or the lines of a file.
+
+    return: An iterator of arrays of RECORD_DTYPE in pcode order.
+    """
+    rows: list[tuple] = []
+    partial = ""
+
+    for text in pcode:
+        lines = (partial + text).split("\n")
+        partial = lines.pop()
+
+        for line in lines:
+            if line in ("s", "e", ""):
+                continue
+            rows.append(parse_command(line))
+
+        if len(rows) >= CHUNK_RECORDS:
+            yield numpy.array(rows, dtype=RECORD_DTYPE)
+            rows = []
+
+    if partial not in ("s", "e", ""):
+        rows.append(parse_command(partial))
+
+    if rows:
+        yield numpy.array(rows, dtype=RECORD_DTYPE)
+
+
+def write_binary_pcode(output_file: str, pcode: Iterable[str]) -> int:
+    """
+    Write text pcode as binary pcode. The records are written as they are packed and
+    the header is filled in at the end. The file is written under a temporary name and
+    then renamed so a failed compile never leaves a partial file behind.
+
+    param output_file: The path of the binary pcode file.
+    param pcode: The text pcode, such as the iterator from compile_piece.
+
+    return: The number of records written.
+    """
+    temp_path = f"{output_file}.{os.getpid()}.tmp"
+    header = numpy.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = FORMAT_VERSION
+    header["record_size"] = RECORD_DTYPE.itemsize
+
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(header.tobytes())
+
+            for records in iter_records(pcode):
+                f.write(records.tobytes())
+                header["count"] += len(records)
+
+            f.seek(0)
+            f.write(header.tobytes())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, output_file)
+
+    return int(header["count"][0])
+
+
+def read_binary_pcode(input_file: str) -> numpy.memmap:
+    """
+    Memory map the records of a binary pcode file.
+
+    param input_file: The path of the binary pcode file.
+
+    return: A read only array of RECORD_DTYPE with one record for each command.
+    """
+    header = numpy.fromfile(input_file, dtype=HEADER_DTYPE, count=1)
+
+    if len(header) == 0 or header["magic"][0] != MAGIC:
+        raise ValueError(f"{input_file} is not a binary pcode file")
+    if header["version"][0] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported binary pcode version {header['version'][0]}")
+    if header["record_size"][0] != RECORD_DTYPE.itemsize:
+        raise ValueError("Binary pcode record size does not match RECORD_DTYPE")
+
+    count = int(header["count"][0])
+
+    if count == 0:
+        return numpy.zeros(0, dtype=RECORD_DTYPE)
+
+    return numpy.memmap(
+        input_file,
+        dtype=RECORD_DTYPE,
+        mode="r",
+        offset=HEADER_DTYPE.itemsize,
+        shape=(count,),
+    )
+
+
+def binary_pcode_lines(records: numpy.ndarray) -> Iterator[str]:
+    """
+    Convert records back to text pcode.
+
+    param records: An array of RECORD_DTYPE such as the one from read_binary_pcode.
+
+    return: An iterator of the lines of the full text pcode.
+    """
+    yield "s\n"
+
+    for record in records:
+        yield f"{format_record(record)}\n"
+
+    yield "e"
+
+
+def text_to_binary(text_file: str, binary_file: str) -> int:
+    with open(text_file, "rt") as f:
+        return write_binary_pcode(binary_file, f)
+
+
+def binary_to_text(binary_file: str, text_file: str) -> None:
+    write_pcode(text_file, binary_pcode_lines(read_binary_pcode(binary_file)))
+
+
+if __name__ == "__main__":
+    import sys
+
+    input_file, output_file = sys.argv[1:3]
+
+    if input_file.endswith(BINARY_EXTENSION):
+        binary_to_text(input_file, output_file)
+    else:
+        print(f"{text_to_binary(input_file, output_file)} records")
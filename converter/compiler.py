@@ -0,0 +1,339 @@
+"""
+Compiles a single musicxml or midi file into pcode. This is shared by main.py and the
+batch compiler. Pieces are played by the right hand alone or by both hands with
+plan_two_hands.
+"""
+
+import multiprocessing
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import Constants
+from score_cache import load_piece
+from process_midi import midi_note_list
+from playable import ClusterPlanCache, PlayableNoteList, Planner
+from solenoids import SolenoidIndex
+from pcode import (
+    PlayCommand,
+    MoveCommand,
+    PlayList,
+    MoveList,
+    Hand,
+    SeekIndex,
+    merged_pcode_lines,
+    RETRACT_TIME,
+    KEY_WIDTH,
+)
+from hands import HAND_STAVES, avoid_collisions
+
+# TODO temp constants
+STREAM_XML = True
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+XML_EXTENSIONS = (".musicxml", ".xml")
+
+
+def read_note_list(
+    key_map: SolenoidIndex,
+    input_file: str,
+    cache_directory: str | None = None,
+    staff: int = 1,
+) -> PlayableNoteList:
+    """
+    Read the notes of a staff of the first part of a musicxml file or every track of a
+    midi file.
+
+    param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                   location, and valid hand positions for a giving pitch.
+    param input_file: The path to a musicxml or midi file.
+    param cache_directory: The path of the score cache directory or None to skip it.
+                           Only used for musicxml files.
+    param staff: The staff to read. Only used for musicxml files.
+
+    return: A PlayableNoteList ready to be planned.
+    """
+    if input_file.lower().endswith(MIDI_EXTENSIONS):
+        return midi_note_list(key_map, input_file)
+
+    processed_xml = load_piece(input_file, cache_directory, STREAM_XML)
+
+    score_part = processed_xml.parts_list[0]
+
+    return PlayableNoteList(key_map, processed_xml, score_part, staff)
+
+
+def plan_note_list(
+    constants: Constants,
+    note_list: PlayableNoteList,
+    planner: Planner = Planner.GREEDY,
+    plan_cache: ClusterPlanCache | None = None,
+    jobs: int = 1,
+) -> None:
+    """
+    Find the positions and time losses of every note of a single hand.
+
+    param constants: The Constants read from config.yaml.
+    param note_list: The PlayableNoteList of the hand.
+    param planner: The Planner used to choose the moves.
+    param plan_cache: A ClusterPlanCache to reuse plans from earlier pieces or None.
+    param jobs: The number of processes Planner.GREEDY plans clusters on.
+    """
+    note_list.find_groups()
+    note_list.find_clusters()
+    note_list.find_moves(
+        KEY_WIDTH,
+        constants.max_acceleration,
+        constants.max_velocity,
+        planner,
+        jobs,
+        plan_cache,
+    )
+    note_list.find_locations()
+    note_list.find_time_losses()
+
+
+def hand_command_streams(
+    note_list: PlayableNoteList, key_map: SolenoidIndex, hand: Hand
+) -> list[Iterator[PlayCommand | MoveCommand]]:
+    """
+    Generate the deploy and move commands of a single planned hand. The commands are
+    only generated as they are read.
+
+    param note_list: A PlayableNoteList that has found its time losses.
+    param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                   location, and valid hand positions for a giving pitch.
+    param hand: The Hand that plays note_list.
+
+    return: An iterator of the PlayCommands and one of the MoveCommands of the hand,
+            each in time order.
+    """
+    play_commands = PlayList(note_list, key_map)
+    move_commands = MoveList(note_list, key_map)
+
+    return [
+        play_commands.iter_play_commands(hand),
+        move_commands.iter_move_commands(hand, KEY_WIDTH, RETRACT_TIME),
+    ]
+
+
+def plan_hand(
+    constants: Constants,
+    key_map: SolenoidIndex,
+    input_file: str,
+    staff: int,
+    cache_directory: str | None = None,
+    planner: Planner = Planner.GREEDY,
+    plan_cache: ClusterPlanCache | None = None,
+    jobs: int = 1,
+) -> PlayableNoteList:
+    """
+    Read and plan a single staff for plan_two_hands.
+
+    return: The planned PlayableNoteList of the staff. It is empty if the staff has no
+            notes.
+    """
+    note_list = read_note_list(key_map, input_file, cache_directory, staff)
+
+    if len(note_list) > 0:
+        plan_note_list(constants, note_list, planner, plan_cache, jobs)
+
+    return note_list
+
+
+def plan_hand_process(
+    constants: Constants,
+    key_map: SolenoidIndex,
+    input_file: str,
+    staff: int,
+    cache_directory: str | None,
+    planner: Planner,
+    plan_cache: ClusterPlanCache | None,
+    jobs: int,
+) -> tuple[PlayableNoteList, ClusterPlanCache | None]:
+    """
+    Run plan_hand in a worker process of plan_two_hands. The plan_cache is a copy, so it
+    is sent back with the note list for its new plans to be merged.
+    """
+    note_list = plan_hand(
+        constants,
+        key_map,
+        input_file,
+        staff,
+        cache_directory,
+        planner,
+        plan_cache,
+        jobs,
+    )
+
+    return note_list, plan_cache
+
+
+def plan_two_hands(
+    constants: Constants,
+    key_map: SolenoidIndex,
+    input_file: str,
+    cache_directory: str | None = None,
+    planner: Planner = Planner.GREEDY,
+    plan_cache: ClusterPlanCache | None = None,
+    jobs: int = 1,
+) -> dict[Hand, PlayableNoteList]:
+    """
+    Plan each hand of a piece on its own staff, then replan one of them with
+    avoid_collisions if they would run into each other. The hands are planned at the
+    same time in separate processes, each with a copy of plan_cache that is merged back
+    afterwards. Inside a worker process, such as one of a batch, they are planned one
+    after the other instead. The batch already runs a piece on every cpu, so more
+    processes would only compete with it.
+
+    param constants: The Constants read from config.yaml.
+    param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                   location, and valid hand positions for a giving pitch.
+    param input_file: The path to a musicxml file.
+    param cache_directory: The path of the score cache directory or None to skip it.
+    param planner: The Planner used to choose the moves of each hand.
+    param plan_cache: A ClusterPlanCache to reuse plans from earlier pieces or None.
+    param jobs: The number of processes Planner.GREEDY plans the clusters of each
+                hand on.
+
+    return: The planned PlayableNoteList of each Hand.
+
+    raise ValueError: The input is a midi file or the hands can not be kept apart.
+    """
+    if input_file.lower().endswith(MIDI_EXTENSIONS):
+        raise ValueError("Midi files do not have staves to split between the hands.")
+
+    if multiprocessing.parent_process() is not None:
+        note_lists = {
+            hand: plan_hand(
+                constants,
+                key_map,
+                input_file,
+                staff,
+                cache_directory,
+                planner,
+                plan_cache,
+                jobs,
+            )
+            for hand, staff in HAND_STAVES.items()
+        }
+    else:
+        with ProcessPoolExecutor(max_workers=len(HAND_STAVES)) as executor:
+            futures = {
+                hand: executor.submit(
+                    plan_hand_process,
+                    constants,
+                    key_map,
+                    input_file,
+                    staff,
+                    cache_directory,
+                    planner,
+                    None if plan_cache is None else plan_cache.copy(),
+                    jobs,
+                )
+                for hand, staff in HAND_STAVES.items()
+            }
+            note_lists = {}
+
+            for hand, future in futures.items():
+                note_lists[hand], hand_cache = future.result()
+                if plan_cache is not None:
+                    plan_cache.merge(hand_cache)
+
+    avoid_collisions(
+        note_lists[Hand.LEFT],
+        note_lists[Hand.RIGHT],
+        KEY_WIDTH,
+        constants.max_acceleration,
+        constants.max_velocity,
+        planner,
+        jobs,
+        plan_cache,
+    )
+
+    return note_lists
+
+
+def compile_command_streams(
+    constants: Constants,
+    key_map: SolenoidIndex,
+    input_file: str,
+    cache_directory: str | None = None,
+    planner: Planner = Planner.GREEDY,
+    plan_cache: ClusterPlanCache | None = None,
+    two_hands: bool = False,
+    jobs: int = 1,
+) -> list[Iterator[PlayCommand | MoveCommand]]:
+    """
+    Plan a piece and set up the command streams of every hand that plays it. The piece
+    is planned before this returns but each command is only generated as it is read.
+
+    param constants: The Constants read from config.yaml.
+    param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                   location, and valid hand positions for a giving pitch.
+    param input_file: The path to a musicxml or midi file.
+    param cache_directory: The path of the score cache directory or None to skip it.
+    param planner: The Planner used to choose the moves.
+    param plan_cache: A ClusterPlanCache to reuse plans from earlier pieces or None.
+    param two_hands: True to play the second staff with the left hand.
+    param jobs: The number of processes Planner.GREEDY plans clusters on.
+
+    return: The streams of each hand that has notes, ready for merge_commands.
+    """
+    if two_hands:
+        note_lists = plan_two_hands(
+            constants, key_map, input_file, cache_directory, planner, plan_cache, jobs
+        )
+    else:
+        note_list = read_note_list(key_map, input_file, cache_directory)
+        plan_note_list(constants, note_list, planner, plan_cache, jobs)
+        note_lists = {Hand.RIGHT: note_list}
+
+    streams: list[Iterator[PlayCommand | MoveCommand]] = []
+
+    for hand, note_list in note_lists.items():
+        if len(note_list) > 0:
+            streams += hand_command_streams(note_list, key_map, hand)
+
+    return streams
+
+
+def compile_piece(
+    constants: Constants,
+    key_map: SolenoidIndex,
+    input_file: str,
+    cache_directory: str | None = None,
+    planner: Planner = Planner.GREEDY,
+    plan_cache: ClusterPlanCache | None = None,
+    two_hands: bool = False,
+    seek_index: SeekIndex | None = None,
+    jobs: int = 1,
+) -> Iterator[str]:
+    """
+    Plan the moves of a piece and generate its pcode as a single stream of deploys and
+    moves in time order.
+
+    param constants: The Constants read from config.yaml.
+    param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                   location, and valid hand positions for a giving pitch.
+    param input_file: The path to a musicxml or midi file.
+    param cache_directory: The path of the score cache directory or None to skip it.
+    param planner: The Planner used to choose the moves.
+    param plan_cache: A ClusterPlanCache to reuse plans from earlier pieces or None.
+    param two_hands: True to play the second staff with the left hand.
+    param seek_index: A SeekIndex to fill in as the pcode is generated or None.
+    param jobs: The number of processes Planner.GREEDY plans clusters on.
+
+    return: An iterator of the lines of the full pcode.
+    """
+    streams = compile_command_streams(
+        constants,
+        key_map,
+        input_file,
+        cache_directory,
+        planner,
+        plan_cache,
+        two_hands,
+        jobs,
+    )
+
+    return merged_pcode_lines(streams, seek_index)
@@ -2,6 +2,8 @@ import os
 import yaml
 from key import Key
 
+CONVERTER_VERSION = "0.2.1"
+
 
 class Constants:
     def __init__(self) -> None:
@@ -0,0 +1,190 @@
+"""
+Keeps the two hands of a piece from running into each other. Both hands are planned on
+their own first. If they overlap the left hand is held below the right hand and planned
+again, and if the left hand can not fit there the right hand is held above the left hand
+and planned again instead. Only one hand is ever replanned against the fixed plan of the
+other, so a piece where neither hand fits around the other one's plan, such as one where
+the staves cross, is rejected with a ValueError rather than planned jointly.
+
+Each hand sits at a position from the start of one note to the start of the next one
+and may be anywhere between the two positions while it moves. A hand at position p
+covers positions p to p + ROW_SOLENOIDS - 1, so the hands are clear of each other as
+long as the left hand position plus ROW_SOLENOIDS is at most the right hand position.
+"""
+
+from __future__ import annotations
+import math
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable
+
+from pcode import Hand
+from playable import ClusterPlanCache, PlayableNoteList, Planner
+from solenoids import ROW_SOLENOIDS
+
+HAND_STAVES = {Hand.RIGHT: 1, Hand.LEFT: 2}
+"""The musicxml staff played by each hand."""
+
+Reach = Callable[..., float]
+"""min or max, picking the lowest or highest positions of a hand."""
+
+
+def occupied_spans(
+    note_list: PlayableNoteList, reach: Reach = min
+) -> tuple[list[float], list[int]]:
+    """
+    Find the time span each note of a planned hand owns and how far the hand reaches
+    during it. Span i runs from the start of note i until the start of note i + 1. The
+    first span starts at -inf and the last ends at inf.
+
+    param note_list: A PlayableNoteList that has found its locations.
+    param reach: min for the lowest position of each span or max for the highest.
+
+    return: The start time of each span in microseconds and the position it reaches.
+    """
+    positions = note_list.columns.column("position").tolist()
+    starts: list[float] = note_list.columns.column("start").tolist()
+    starts[0] = -math.inf
+
+    reached = [reach(x, y) for x, y in zip(positions, positions[1:])]
+    reached.append(positions[-1])
+
+    return starts, reached
+
+
+def hand_limits(
+    note_list: PlayableNoteList, other_list: PlayableNoteList, reach: Reach
+) -> list[float]:
+    """
+    Find how far the other hand reaches during the span of each note of a hand.
+
+    param note_list: The PlayableNoteList of the hand to limit.
+    param other_list: A PlayableNoteList of the other hand that has found its locations.
+    param reach: min to limit the left hand by the lowest right hand position or max to
+                 limit the right hand by the highest left hand position.
+
+    return: A position for each note, inf or -inf where the other hand is not played.
+    """
+    if len(other_list) == 0:
+        return [math.inf if reach is min else -math.inf] * len(note_list)
+
+    other_starts, other_reached = occupied_spans(other_list, reach)
+    starts = note_list.columns.column("start").tolist()
+    ends = starts[1:] + [math.inf]
+    starts[0] = -math.inf
+
+    limits: list[float] = []
+
+    for start, end in zip(starts, ends):
+        first = max(bisect_right(other_starts, start) - 1, 0)
+        last = max(bisect_left(other_starts, end) - 1, first)
+        limits.append(reach(other_reached[first : last + 1]))
+
+    return limits
+
+
+def collides(left_list: PlayableNoteList, right_list: PlayableNoteList) -> bool:
+    """
+    Check if the left hand ever reaches into the right hand.
+
+    param left_list: A PlayableNoteList of the left hand that has found its locations.
+    param right_list: A PlayableNoteList of the right hand that has found its locations.
+
+    return: True if the hands overlap at any point.
+    """
+    if len(left_list) == 0:
+        return False
+
+    _, highs = occupied_spans(left_list, max)
+    limits = hand_limits(left_list, right_list, min)
+
+    return any(high + ROW_SOLENOIDS > limit for high, limit in zip(highs, limits))
+
+
+def clear_masks(
+    note_list: PlayableNoteList, other_list: PlayableNoteList, reach: Reach
+) -> list[int] | None:
+    """
+    Limit the positions of every note of a hand to those clear of the other hand from
+    the start of the note before it, while the hand moves to it, until the start of the
+    note after it.
+
+    param note_list: The PlayableNoteList of the hand to limit.
+    param other_list: A PlayableNoteList of the other hand that has found its locations.
+    param reach: min when note_list is the left hand or max when it is the right hand.
+
+    return: The new location mask of each note or None if a note has no position left.
+    """
+    limits = hand_limits(note_list, other_list, reach)
+    masks: list[int] = []
+
+    for i, (mask, limit) in enumerate(zip(note_list.columns.location_masks, limits)):
+        if i > 0:
+            limit = reach(limit, limits[i - 1])
+
+        if math.isinf(limit):
+            masks.append(mask)
+            continue
+
+        if reach is min:
+            highest = int(limit) - ROW_SOLENOIDS
+            mask &= (1 << (highest + 1)) - 1 if highest >= 0 else 0
+        else:
+            mask &= ~((1 << (int(limit) + ROW_SOLENOIDS)) - 1)
+
+        if mask == 0:
+            return None
+
+        masks.append(mask)
+
+    return masks
+
+
+def avoid_collisions(
+    left_list: PlayableNoteList,
+    right_list: PlayableNoteList,
+    key_width: float,
+    acceleration: float,
+    velocity: float,
+    planner: Planner = Planner.GREEDY,
+    jobs: int = 1,
+    plan_cache: ClusterPlanCache | None = None,
+) -> None:
+    """
+    Replan a hand if the two would overlap. The left hand is limited to the positions
+    below the right hand with clear_masks and planned again with planner. If a left
+    hand note has no such position the right hand is limited to the positions above the
+    left hand and replanned instead.
+
+    param left_list: A PlayableNoteList of the left hand that has found its locations.
+    param right_list: A PlayableNoteList of the right hand that has found its locations.
+    param key_width: A float of the width of a white key in mm.
+    param acceleration: A float of the max acceleration of a hand in mm/s^2.
+    param velocity: A float of the max velocity of a hand in mm/s.
+    param planner: The Planner the hands were planned with.
+    param jobs: The number of processes Planner.GREEDY plans clusters on.
+    param plan_cache: A ClusterPlanCache to reuse plans from earlier pieces or None.
+
+    raise ValueError: Neither hand can be played clear of the other one's plan.
+    """
+    if not collides(left_list, right_list):
+        return
+
+    note_list = left_list
+    masks = clear_masks(left_list, right_list, min)
+
+    if masks is None:
+        note_list = right_list
+        masks = clear_masks(right_list, left_list, max)
+
+    if masks is None:
+        raise ValueError(
+            "The hands can not be kept apart. Neither hand fits around the plan of the"
+            " other, which happens when the staves cross."
+        )
+
+    note_list.columns.location_masks[:] = masks
+    note_list.find_groups()
+    note_list.find_clusters()
+    note_list.find_moves(key_width, acceleration, velocity, planner, jobs, plan_cache)
+    note_list.find_locations()
+    note_list.find_time_losses()
@@ -0,0 +1,125 @@
+"""
+Hand kinematics for the converter. Travel times only depend on the number of keys moved,
+so they are computed once per machine profile and then looked up by key distance.
+"""
+
+from __future__ import annotations
+import math
+from functools import lru_cache
+
+import numpy
+
+ACTUATION_TIME = 50000
+"""Microseconds added to every move for the solenoids to retract and actuate."""
+TABLE_KEYS = 88
+"""Key distances from 0 up to this value are precomputed. Longer moves are computed."""
+
+
+def travel_time(distance: float, accel: float, velocity: float) -> float:
+    """TODO Verify and update"""
+    mAccelDistance = (velocity**2) / (2 * accel)
+    if mAccelDistance > distance:
+        rDistance = 0
+        accelDistance = distance
+    else:
+        accelDistance = mAccelDistance
+        rDistance = distance - accelDistance
+
+    accelTime = 2 * math.sqrt(accelDistance / (accel))
+    linearTime = rDistance / velocity
+    totalTime = accelTime + linearTime
+    return totalTime * 1000000
+
+
+class TravelTable:
+    def __init__(
+        self,
+        key_width: float,
+        acceleration: float,
+        velocity: float,
+        actuation_time: int = ACTUATION_TIME,
+    ) -> None:
+        """
+        The time needed for a move of every key distance on a single machine profile.
+
+        param key_width: A float value that represents the width of a piano key in mm.
+        param acceleration: The max acceleration of the hand in mm/s^2.
+        param velocity: The max velocity of the hand in mm/s.
+        param actuation_time: The microseconds added to every move for the solenoids.
+        """
+        self.key_width = key_width
+        self.acceleration = acceleration
+        self.velocity = velocity
+        self.actuation_time = actuation_time
+
+        self.travel_times = [
+            self.compute_travel(distance) for distance in range(TABLE_KEYS + 1)
+        ]
+        """The travel time in microseconds indexed by key distance."""
+        self.move_times = [travel + actuation_time for travel in self.travel_times]
+        """The travel time plus actuation time in microseconds indexed by key distance."""
+        self.move_time_array = numpy.array(self.move_times, dtype=numpy.float64)
+        """move_times as a numpy array for looking up many distances at once."""
+
+    @property
+    def profile(self) -> tuple[float, float, float, int]:
+        """The values the table was built from. Two tables with equal profiles are equal."""
+        return (self.key_width, self.acceleration, self.velocity, self.actuation_time)
+
+    def compute_travel(self, distance: int) -> float:
+        return travel_time(distance * self.key_width, self.acceleration, self.velocity)
+
+    def travel(self, distance: int) -> float:
+        """
+        Find the time to travel a number of keys.
+
+        param distance: A non negative integer number of keys.
+
+        return: A float value of microseconds.
+        """
+        if distance <= TABLE_KEYS:
+            return self.travel_times[distance]
+
+        return self.compute_travel(distance)
+
+    def move_time(self, distance: int) -> float:
+        """
+        Find the time a move of a number of keys takes away from the note before it.
+
+        param distance: A non negative integer number of keys.
+
+        return: A float value of microseconds including the actuation time.
+        """
+        if distance <= TABLE_KEYS:
+            return self.move_times[distance]
+
+        return self.compute_travel(distance) + self.actuation_time
+
+    def move_time_many(self, distances: numpy.ndarray) -> numpy.ndarray:
+        """
+        Find the move time of every distance in an array.
+
+        param distances: A numpy array of non negative integer numbers of keys.
+
+        return: A float64 numpy array of microseconds including the actuation time.
+        """
+        if distances.size and distances.max() > TABLE_KEYS:
+            return numpy.array(
+                [self.move_time(distance) for distance in distances.tolist()],
+                dtype=numpy.float64,
+            )
+
+        return self.move_time_array[distances]
+
+
+@lru_cache(maxsize=None)
+def travel_table(
+    key_width: float,
+    acceleration: float,
+    velocity: float,
+    actuation_time: int = ACTUATION_TIME,
+) -> TravelTable:
+    """
+    Get the shared TravelTable of a machine profile. Each profile is only built once.
+    """
+    return TravelTable(key_width, acceleration, velocity, actuation_time)
@@ -1,48 +1,51 @@
+import argparse
 import os
 from constants import Constants
-from procsss_xml import MusicPiece
-from playable import PlayableNoteList
 from solenoids import SolenoidIndex
-from pcode import PlayList, MoveList, Hand
+from compiler import compile_piece
+from pcode import SeekIndex, INDEX_SUFFIX, write_pcode
 
 # TODO temp constants
-RETRACT_TIME = 50000
-KEY_WIDTH = 23.2
 FILE_NAME = "/testing.pcode"
+CACHE_DIRECTORY = "/cache"
 
-constants = Constants()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile test.musicxml to pcode.")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes to plan greedy clusters on (default: 1)",
+    )
+    arguments = parser.parse_args()
 
-key_map = SolenoidIndex(88, constants.first_88_key)
+    constants = Constants()
 
-current_directory = os.path.dirname(os.path.realpath(__file__))
-file_name = "test.musicxml"
+    key_map = SolenoidIndex(88, constants.first_88_key)
 
-xml_file = f"{current_directory}/{file_name}"
+    current_directory = os.path.dirname(os.path.realpath(__file__))
+    file_name = "test.musicxml"
 
-processed_xml = MusicPiece(xml_file)
+    xml_file = f"{current_directory}/{file_name}"
 
-score_part = processed_xml.parts_list[0]
+    cache_directory = current_directory + CACHE_DIRECTORY
 
-note_list = PlayableNoteList(key_map, processed_xml, score_part, 1)
+    seek_index = SeekIndex()
 
-note_list.find_groups()
-note_list.find_clusters()
-note_list.find_moves(KEY_WIDTH, constants.max_acceleration, constants.max_velocity)
-note_list.find_locations()
-note_list.find_time_losses()
+    pcode = compile_piece(
+        constants,
+        key_map,
+        xml_file,
+        cache_directory,
+        seek_index=seek_index,
+        jobs=arguments.jobs,
+    )
 
-play_commands = PlayList(note_list, key_map)
-play_commands.generate_play_list(Hand.RIGHT)
+    write_path = current_directory + FILE_NAME
 
-move_commands = MoveList(note_list, key_map)
-move_commands.generate_move_list(Hand.RIGHT, 23.2, 50000)
-
-full_pcode = f"s\n{play_commands}{move_commands}e"
-
-write_path = os.path.dirname(os.path.realpath(__file__)) + FILE_NAME
-
-with open(write_path, "wt") as f:
-    f.write(full_pcode)
+    write_pcode(write_path, pcode)
+    seek_index.write(write_path + INDEX_SUFFIX)
 
 
 # TODO NEXT Find out why the start position is not correct.
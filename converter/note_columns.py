@@ -0,0 +1,152 @@
+"""
+Columnar storage for the notes of a PlayableNoteList. Every field of a note is held in
+its own numpy array indexed by note number so whole passes can work on arrays instead of
+individual PlayableNote objects.
+"""
+
+from __future__ import annotations
+import numpy
+
+from solenoids import SolenoidIndex
+
+INITIAL_CAPACITY = 64
+"""The number of notes room is made for before the first resize."""
+
+TIME_DTYPE = numpy.int64
+"""Microsecond columns. Integer microseconds of a long piece do not fit in 32 bits."""
+
+
+def grow_array(array: numpy.ndarray, size: int) -> numpy.ndarray:
+    new_array = numpy.zeros(size, dtype=array.dtype)
+    new_array[: len(array)] = array
+    return new_array
+
+
+class NoteColumns:
+    def __init__(
+        self, key_map: SolenoidIndex, capacity: int = INITIAL_CAPACITY
+    ) -> None:
+        """
+        The backing store of a PlayableNoteList. Rows can only be added at the end and
+        pitches can only be added to the last row.
+
+        param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                       location, and valid hand positions for a giving pitch.
+        param capacity: The number of notes to make room for up front.
+        """
+        self.key_map = key_map
+        """The SolenoidIndex shared by every note."""
+        self.count = 0
+        """The number of notes stored. Arrays are longer than this to leave room to grow."""
+
+        self.start = numpy.zeros(capacity, dtype=TIME_DTYPE)
+        """Microseconds from the piece start to the start of each note."""
+        self.duration = numpy.zeros(capacity, dtype=TIME_DTYPE)
+        """Microseconds from the start to the end of each note."""
+        self.velocity = numpy.zeros(capacity, dtype=numpy.int16)
+        """The midi like velocity of each note."""
+        self.next_delay = numpy.zeros(capacity, dtype=TIME_DTYPE)
+        """Microseconds until the next note starts. Zero means there is no next note."""
+        self.position = numpy.zeros(capacity, dtype=numpy.int16)
+        """The hand position each note is played at in keys."""
+        self.time_loss = numpy.zeros(capacity, dtype=TIME_DTYPE)
+        """Microseconds removed from the end of each note for moves and retracts."""
+
+        self.pitches = numpy.zeros(capacity, dtype=numpy.uint8)
+        """The midi pitches of every note packed end to end."""
+        self.pitch_count = 0
+        """The number of pitches stored in pitches."""
+        self.pitch_offsets = numpy.zeros(capacity + 1, dtype=numpy.int64)
+        """Note i holds pitches[pitch_offsets[i] : pitch_offsets[i + 1]]."""
+
+        self.location_masks: list[int] = []
+        """
+        The valid hand positions of each note as a bitmask. Masks can be wider than 64 bits
+        so they are kept as python integers.
+        """
+        self.measures: list[str | None] = []
+        """The musicxml measure number of each note or None if it is not known."""
+
+    def reserve(self, note_count: int, pitch_count: int) -> None:
+        """Make sure there is room for note_count notes and pitch_count pitches."""
+        if note_count > len(self.start):
+            size = max(note_count, 2 * len(self.start))
+
+            self.start = grow_array(self.start, size)
+            self.duration = grow_array(self.duration, size)
+            self.velocity = grow_array(self.velocity, size)
+            self.next_delay = grow_array(self.next_delay, size)
+            self.position = grow_array(self.position, size)
+            self.time_loss = grow_array(self.time_loss, size)
+            self.pitch_offsets = grow_array(self.pitch_offsets, size + 1)
+
+        if pitch_count > len(self.pitches):
+            size = max(pitch_count, 2 * len(self.pitches))
+            self.pitches = grow_array(self.pitches, size)
+
+    def append(
+        self,
+        note_start: int,
+        duration: int,
+        midi_pitch: int,
+        velocity: int,
+        measure: str | None = None,
+    ) -> int:
+        """
+        Add a single pitch note to the end of the columns.
+
+        param note_start: An integer that represents the start time of the note in microseconds.
+        param duration: An integer that represents the duration of the note in microseconds.
+        param midi_pitch: An integer that represents the midi pitch of the note.
+        param velocity: An integer that represents the volume of the note.
+        param measure: The musicxml measure number of the note or None.
+
+        return: The index of the new note.
+        """
+        index = self.count
+        self.reserve(index + 1, self.pitch_count + 1)
+
+        self.start[index] = note_start
+        self.duration[index] = duration
+        self.velocity[index] = velocity
+        self.pitches[self.pitch_count] = midi_pitch
+        self.pitch_count += 1
+        self.pitch_offsets[index + 1] = self.pitch_count
+        self.location_masks.append(self.key_map.mask_for_pitch(midi_pitch))
+        self.measures.append(measure)
+
+        self.count += 1
+
+        return index
+
+    def add_pitch(self, index: int, midi_pitch: int) -> None:
+        """
+        Add a pitch to the last note.
+
+        param index: The index of the note. Must be the last note.
+        param midi_pitch: An integer that represents the midi pitch to add.
+        """
+        if index != self.count - 1:
+            raise ValueError("Pitches can only be added to the last note.")
+
+        self.reserve(self.count, self.pitch_count + 1)
+
+        self.pitches[self.pitch_count] = midi_pitch
+        self.pitch_count += 1
+        self.pitch_offsets[index + 1] = self.pitch_count
+
+    def note_pitches(self, index: int) -> list[int]:
+        return self.pitches[
+            self.pitch_offsets[index] : self.pitch_offsets[index + 1]
+        ].tolist()
+
+    def column(self, name: str) -> numpy.ndarray:
+        """
+        Get a column trimmed to the stored notes. The array is a view so writes to it
+        change the notes, but it is only valid until the next append.
+
+        param name: The name of a column such as "start" or "duration".
+
+        return: A numpy array with one entry for each note.
+        """
+        return getattr(self, name)[: self.count]
@@ -1,9 +1,3 @@
-from enum import Enum
-
-from solenoids import SolenoidIndex
-from playable import PlayableNote, PlayableNoteList
-from constants import base_18
-
 """
 TODO TODO TODO
 
@@ -12,15 +6,50 @@ general changes to pcode.
 Various parameters for the pcode file should show up after the s. These should be parameters that need to be adhered to for the pcode to operate correctly
 ex. retract time, key width, key count, velocity, acceleration, etc
 
-Time should be changed from relative us between each command to an absolute time. The time should be a uint64 since that can hold over 500,000 years worth of time.
+Every command keeps its absolute time in microseconds in absolute_time and the relative
+milliseconds of text pcode are found from it. pcode_v2.py writes the absolute times as
+uint64 microseconds.
 
 """
 
+import heapq
+import json
+import os
+from collections.abc import Iterable, Iterator
+from enum import Enum
+
+from solenoids import SolenoidIndex, ROW_SOLENOIDS
+from playable import PlayableNote, PlayableNoteList
+from constants import base_18
+
 # TODO temp constants
 RETRACT_TIME = 50000
 KEY_WIDTH = 23.2
 START_DELAY = 5000
-KEYWIDTH = 23.2
+
+SEEK_INTERVAL = 5000000
+"""Microseconds between the timed entries of a SeekIndex."""
+INDEX_SUFFIX = ".index.json"
+"""Added to the path of a pcode file to get the path of its SeekIndex."""
+
+BASE_18 = base_18()
+"""The digits of a deploy command. The last digit marks an unused finger."""
+
+
+def us_to_ms(time_us: int) -> int:
+    """
+    Convert integer microseconds to the integer milliseconds written to pcode. This
+    truncates towards zero and is the only rounding of time after the playable notes are
+    built.
+
+    param time_us: An integer value of microseconds.
+
+    return: An integer value of milliseconds.
+    """
+    if time_us < 0:
+        return -(-time_us // 1000)
+
+    return time_us // 1000
 
 
 class Hand(Enum):
@@ -33,7 +62,7 @@ class PlayCommand:
         self,
         hand: Hand,
         note: PlayableNote,
-        previous_time: float,
+        previous_time: int,
     ) -> None:
         """
         A single deploy of the solenoids of a single hand.
@@ -47,7 +76,7 @@ class PlayCommand:
         self.note = note
         """The PlayableNote associated with this command."""
         self.previous_time = previous_time
-        # """A float value in microseconds from the previous PlayCommand."""
+        # """An integer value in microseconds from the previous PlayCommand."""
 
         self.hand_parameter: int = 0
         """TODO"""
@@ -59,6 +88,10 @@ class PlayCommand:
         """TODO"""
         self.duration_parameter: int = 0
         """TODO"""
+        self.absolute_time: int = 0
+        """Microseconds from the start of the pcode timeline to this deploy."""
+        self.duration_us: int = 0
+        """Microseconds the solenoids are held deployed."""
 
         self.pcode: str = ""
         """TODO"""
@@ -76,18 +109,20 @@ class PlayCommand:
         param key_map: A SolenoidIndex object that relates pitch, position, and solenoid.
         param position: An integer value for the position in terms of piano keys.
         """
-        for i, pitch in enumerate(self.note.midi_pitches):
+        digits: list[str] = []
+
+        for pitch in self.note.midi_pitches:
             index_list = key_map.index_list[pitch]
             locations_list = index_list.positions
             solenoid_position = locations_list.index(self.note.position) + (
-                index_list.row * 9
+                index_list.row * ROW_SOLENOIDS
             )
             # TODO How to assign "finger" to solenoid
-            base = base_18()
-            self.digit_parameter += str(base[solenoid_position])
+            digits.append(BASE_18[solenoid_position])
 
-        for _ in range(i, 4):
-            self.digit_parameter += str(base[-1])
+        digits += [BASE_18[-1]] * (5 - len(digits))
+
+        self.digit_parameter += "".join(digits)
 
     def set_velocity_paramter(self) -> None:
         """TODO"""
@@ -95,18 +130,20 @@ class PlayCommand:
 
     def set_time_parameter(self) -> None:
         """TODO"""
-        relative_start_us = self.note.note_start - self.previous_time
-        # TODO adapt from ms to us in the future
-        relative_start_ms = int(relative_start_us / 1000)
-        self.time_parameter = relative_start_ms
+        # Both times are truncated on their own so the error never adds up across notes.
+        self.time_parameter = us_to_ms(self.note.note_start) - us_to_ms(
+            self.previous_time
+        )
+        self.absolute_time = START_DELAY * 1000 + self.note.note_start
 
     def set_duration_parameter(self) -> None:
         """TODO"""
         ideal_duration_us = self.note.duration
         actual_duration_us = ideal_duration_us - self.note.time_loss
         # TODO adapt from ms to ms in the future
-        actual_duration_ms = int(actual_duration_us / 1000)
+        actual_duration_ms = us_to_ms(actual_duration_us)
         self.duration_parameter = actual_duration_ms
+        self.duration_us = actual_duration_us
 
     def generate_pcode(self, key_map: SolenoidIndex) -> None:
         """TODO"""
@@ -115,32 +152,22 @@ class PlayCommand:
         self.set_velocity_paramter()
         self.set_time_parameter()
         self.set_duration_parameter()
-        self.pcode += "d"
-        self.pcode += " s"
-        self.pcode += str(self.hand_parameter)
-        self.pcode += " n"
-        self.pcode += self.digit_parameter
-        self.pcode += " f"
-        self.pcode += str(self.velocity_parameter)
-        self.pcode += " t"
-        self.pcode += str(self.time_parameter)
-        self.pcode += " l"
-        self.pcode += str(self.duration_parameter)
+        self.write_pcode(self.time_parameter)
+
+    def write_pcode(self, time_parameter: int) -> None:
+        """
+        Write the pcode of this command with the given time parameter.
+
+        param time_parameter: An integer value of milliseconds since the previous deploy.
+        """
+        self.pcode = (
+            f"d s{self.hand_parameter} n{self.digit_parameter}"
+            f" f{self.velocity_parameter} t{time_parameter} l{self.duration_parameter}"
+        )
 
     def set_first_time(self, initial_time: int) -> None:
         """TODO"""
-        self.pcode = ""
-        self.pcode += "d"
-        self.pcode += " s"
-        self.pcode += str(self.hand_parameter)
-        self.pcode += " n"
-        self.pcode += self.digit_parameter
-        self.pcode += " f"
-        self.pcode += str(self.velocity_parameter)
-        self.pcode += " t"
-        self.pcode += str(initial_time)
-        self.pcode += " l"
-        self.pcode += str(self.duration_parameter)
+        self.write_pcode(initial_time)
 
 
 class MoveCommand:
@@ -149,14 +176,15 @@ class MoveCommand:
         hand: Hand,
         note: PlayableNote,
         next_note: PlayableNote,
-        previous_move_time: float,
+        previous_move_time: int,
     ) -> None:
         """
         A single move of a single hand.
 
         param hand: A hand enum that represents the hand that will process this command.
         param note: The PlayableNote that should finish immediately prior to this move.
-        param previous_time: An integer value in absolute musicxml ticks for the previous move.
+        param previous_move_time: An integer value in microseconds from the start of the piece
+                                  to the previous move.
         """
         self.hand = hand
         """TODO"""
@@ -175,6 +203,10 @@ class MoveCommand:
         """TODO"""
         self.duration_parameter: int = 0
         """TODO"""
+        self.absolute_time: int = 0
+        """Microseconds from the start of the pcode timeline to this move."""
+        self.duration_us: int = 0
+        """Microseconds the move is given to finish."""
 
         self.pcode: str = ""
         """TODO"""
@@ -191,7 +223,7 @@ class MoveCommand:
 
     def set_time_parameter(
         self,
-        retract_time: float,
+        retract_time: int,
     ) -> None:
         """TODO"""
 
@@ -201,14 +233,14 @@ class MoveCommand:
             - self.note.time_loss
         )
 
-        relative_start_us = abs_start_us - self.previous_move_time
-        # TODO adapt from ms to us in the future
-        relative_start_ms = int(relative_start_us / 1000)
-        self.time_parameter = relative_start_ms
+        self.absolute_time = START_DELAY * 1000 + abs_start_us
+        self.time_parameter = us_to_ms(self.absolute_time) - us_to_ms(
+            START_DELAY * 1000 + self.previous_move_time
+        )
 
     def set_duration_parameter(
         self,
-        retract_time: float,
+        retract_time: int,
     ) -> None:
         """TODO"""
         note_diff_time = self.note.next_delay
@@ -216,18 +248,20 @@ class MoveCommand:
         ideal_duration_us = duration_ticks
         move_duration_us = (ideal_duration_us - retract_time) + self.note.time_loss
         # TODO adapt from ms to ms in the future
-        move_duration_ms = int(move_duration_us / 1000)
+        move_duration_ms = us_to_ms(move_duration_us)
         self.duration_parameter = move_duration_ms
+        self.duration_us = move_duration_us
 
     def set_first_times(self):
         """TODO"""
         self.time_parameter = 0
         self.duration_parameter = START_DELAY
+        self.duration_us = START_DELAY * 1000
 
     def generate_pcode(
         self,
         key_width: float,
-        retract_time: float,
+        retract_time: int,
     ) -> None:
         """TODO"""
         self.set_hand_paramter()
@@ -239,15 +273,18 @@ class MoveCommand:
             self.set_time_parameter(retract_time)
             self.set_duration_parameter(retract_time)
 
-        self.pcode += "h"
-        self.pcode += " s"
-        self.pcode += str(self.hand_parameter)
-        self.pcode += " p"
-        self.pcode += str(self.position_parameter)
-        self.pcode += " d"
-        self.pcode += str(self.time_parameter)
-        self.pcode += " l"
-        self.pcode += str(self.duration_parameter)
+        self.write_pcode(self.time_parameter)
+
+    def write_pcode(self, time_parameter: int) -> None:
+        """
+        Write the pcode of this command with the given time parameter.
+
+        param time_parameter: An integer value of milliseconds since the previous move.
+        """
+        self.pcode = (
+            f"h s{self.hand_parameter} p{self.position_parameter}"
+            f" d{time_parameter} l{self.duration_parameter}"
+        )
 
 
 class PlayList:
@@ -264,22 +301,28 @@ class PlayList:
         self.play_commands: list[PlayCommand] = []
         """TODO"""
 
-    def generate_play_list(self, hand: Hand) -> None:
-        previous_time: float = 0
-        for note in self.note_list.playable_list:
+    def iter_play_commands(self, hand: Hand) -> Iterator[PlayCommand]:
+        """
+        Generate the PlayCommand of each note one at a time without storing them.
+
+        param hand: The Hand that plays the notes.
+
+        return: An iterator of PlayCommands with their pcode generated.
+        """
+        previous_time: int = 0
+        for i, note in enumerate(self.note_list):
             play_command = PlayCommand(hand, note, previous_time)
             play_command.generate_pcode(self.key_map)
-            self.play_commands.append(play_command)
+            if i == 0:
+                play_command.set_first_time(START_DELAY)
+            yield play_command
             previous_time = note.note_start
 
-        self.play_commands[0].set_first_time(START_DELAY)
+    def generate_play_list(self, hand: Hand) -> None:
+        self.play_commands.extend(self.iter_play_commands(hand))
 
     def __str__(self):
-        temp_string = ""
-        for item in self.play_commands:
-            temp_string = temp_string + item.pcode + "\n"
-
-        return temp_string
+        return "".join(pcode_lines(self.play_commands))
 
 
 class MoveList:
@@ -296,44 +339,213 @@ class MoveList:
         self.move_commands: list[MoveCommand] = []
         """TODO"""
 
-    def generate_move_list(
-        self, hand: Hand, key_width: float, retract_time: float
-    ) -> None:
-        """TODO"""
-        previous_time: float = 0
+    def iter_move_commands(
+        self, hand: Hand, key_width: float, retract_time: int
+    ) -> Iterator[MoveCommand]:
+        """
+        Generate a MoveCommand for the first note and for each change of position one at
+        a time without storing them.
 
-        for i in range(0, len(self.note_list.playable_list)):
-            if i == 0:
-                move_command = MoveCommand(
-                    hand, self.note_list[i], self.note_list[i], previous_time
-                )
+        param hand: The Hand that plays the notes.
+        param key_width: A float of the width of a white key in mm.
+        param retract_time: An integer value of microseconds a solenoid takes to retract.
+
+        return: An iterator of MoveCommands with their pcode generated.
+        """
+        previous_time: int = 0
+        previous_note: PlayableNote | None = None
+
+        for note in self.note_list:
+            if previous_note is None:
+                move_command = MoveCommand(hand, note, note, previous_time)
                 move_command.generate_pcode(key_width, retract_time)
 
-                self.move_commands.append(move_command)
+                yield move_command
 
                 previous_time = -1 * START_DELAY * 1000
 
-            else:
-                if self.note_list[i].position != self.note_list[i - 1].position:
-                    move_command = MoveCommand(
-                        hand, self.note_list[i - 1], self.note_list[i], previous_time
-                    )
-                    move_command.generate_pcode(key_width, retract_time)
+            elif note.position != previous_note.position:
+                move_command = MoveCommand(hand, previous_note, note, previous_time)
+                move_command.generate_pcode(key_width, retract_time)
+
+                yield move_command
+
+                previous_time = move_command.absolute_time - START_DELAY * 1000
 
-                    self.move_commands.append(move_command)
+            previous_note = note
 
-                    previous_time += move_command.time_parameter * 1000
+    def generate_move_list(
+        self, hand: Hand, key_width: float, retract_time: int
+    ) -> None:
+        """TODO"""
+        self.move_commands.extend(
+            self.iter_move_commands(hand, key_width, retract_time)
+        )
 
     def __str__(self):
-        temp_string = ""
-        for item in self.move_commands:
-            temp_string = temp_string + item.pcode + "\n"
+        return "".join(pcode_lines(self.move_commands))
+
+
+def pcode_lines(commands: Iterable[PlayCommand | MoveCommand]) -> Iterator[str]:
+    for command in commands:
+        yield f"{command.pcode}\n"
+
+
+def command_order(command: PlayCommand | MoveCommand) -> tuple[int, bool, int]:
+    """
+    The order of commands in a merged stream. Commands are in time order with moves
+    before deploys at the same time and lower hands before higher ones.
+    """
+    return (command.absolute_time, isinstance(command, PlayCommand), command.hand.value)
+
+
+def merge_commands(
+    streams: Iterable[Iterable[PlayCommand | MoveCommand]],
+) -> Iterator[PlayCommand | MoveCommand]:
+    """
+    Merge streams of commands that are each in time order, such as the iterators from
+    iter_play_commands and iter_move_commands, with a k-way heap merge. Only the next
+    command of each stream is held at a time.
+
+    param streams: The command streams of every hand and command type.
+
+    return: An iterator of every command in command_order.
+    """
+    return heapq.merge(*streams, key=command_order)
+
+
+class SeekIndex:
+    def __init__(self, interval: int = SEEK_INTERVAL) -> None:
+        """
+        A sidecar index of a merged pcode stream that lets a decoder start at the first
+        note of any measure, or every interval microseconds, without reading what comes
+        before it. Each entry holds the byte offset of the first command to read, its
+        absolute time, the times the relative times of the following deploys and moves
+        are counted from, and the position each hand has been sent to.
+
+        param interval: Microseconds between timed entries.
+        """
+        self.interval = interval
+        """Microseconds between timed entries."""
+        self.measures: dict[str, dict] = {}
+        """The entry of the first deploy of each measure keyed by measure number."""
+        self.marks: list[dict] = []
+        """Entry i is at the first command at or after i * interval microseconds."""
+
+        self.offset = 0
+        """The byte offset of the next line of the stream."""
+        self.previous_times = {PlayCommand: 0, MoveCommand: 0}
+        """The time in milliseconds of the last deploy and last move."""
+        self.positions: dict[int, int] = {}
+        """The last position parameter sent to each hand keyed by hand parameter."""
+
+    def entry(self, command: PlayCommand | MoveCommand) -> dict:
+        return {
+            "offset": self.offset,
+            "time": command.absolute_time,
+            "deploy_time": self.previous_times[PlayCommand],
+            "move_time": self.previous_times[MoveCommand],
+            "positions": dict(self.positions),
+        }
+
+    def add(self, command: PlayCommand | MoveCommand, line: str) -> None:
+        """
+        Record a command of the stream. Commands must be added in stream order.
+
+        param command: A command with its pcode written.
+        param line: The line of the command as written to the stream.
+        """
+        while command.absolute_time >= len(self.marks) * self.interval:
+            self.marks.append(self.entry(command))
+
+        if isinstance(command, PlayCommand):
+            measure = command.note.measure
+            if measure is not None and measure not in self.measures:
+                self.measures[measure] = self.entry(command)
+        else:
+            self.positions[command.hand_parameter] = command.position_parameter
+
+        self.previous_times[type(command)] = us_to_ms(command.absolute_time)
+        self.advance(line)
+
+    def advance(self, text: str) -> None:
+        """Skip over text in the stream that is not a command."""
+        self.offset += len(text.encode())
+
+    def write(self, index_file: str) -> None:
+        """
+        Write the index as json.
+
+        param index_file: The path of the index, usually the pcode path plus INDEX_SUFFIX.
+        """
+        index = {
+            "interval": self.interval,
+            "measures": self.measures,
+            "marks": self.marks,
+        }
+
+        with open(index_file, "wt") as f:
+            json.dump(index, f)
+
+
+def merged_pcode_lines(
+    streams: Iterable[Iterable[PlayCommand | MoveCommand]],
+    seek_index: SeekIndex | None = None,
+) -> Iterator[str]:
+    """
+    Generate a single pcode stream in time order from the command streams of any number
+    of hands. Every time parameter is rewritten as the milliseconds since the previous
+    command of the same type across every hand. Times are converted from the absolute
+    timeline so the deltas add up to the true time of each command.
+
+    param streams: The command streams of every hand and command type.
+    param seek_index: A SeekIndex to fill in as the lines are generated or None.
+
+    return: An iterator of the lines of the full pcode.
+    """
+    previous_times = {PlayCommand: 0, MoveCommand: 0}
+
+    if seek_index is not None:
+        seek_index.advance("s\n")
+
+    yield "s\n"
+
+    for command in merge_commands(streams):
+        absolute_ms = us_to_ms(command.absolute_time)
+        command.write_pcode(absolute_ms - previous_times[type(command)])
+        previous_times[type(command)] = absolute_ms
+        line = f"{command.pcode}\n"
+
+        if seek_index is not None:
+            seek_index.add(command, line)
+
+        yield line
+
+    yield "e"
+
+
+def write_pcode(output_file: str, pcode: Iterable[str]) -> None:
+    """
+    Write pcode to a file as it is generated. The file is written under a temporary
+    name and then renamed so a failed or interrupted compile never leaves a partial
+    file behind.
+
+    param output_file: The path of the pcode file.
+    param pcode: The lines of the pcode, such as the iterator from compile_piece.
+    """
+    temp_path = f"{output_file}.{os.getpid()}.tmp"
+
+    try:
+        with open(temp_path, "wt") as f:
+            f.writelines(pcode)
+    except BaseException:
+        os.remove(temp_path)
+        raise
 
-        return temp_string
+    os.replace(temp_path, output_file)
 
 
 if __name__ == "__main__":
-    import os
     from constants import Constants
     from procsss_xml import MusicPiece
 
@@ -354,7 +566,7 @@ if __name__ == "__main__":
 
     note_list.find_groups()
     note_list.find_clusters()
-    note_list.find_moves(KEYWIDTH, constants.max_acceleration, constants.max_velocity)
+    note_list.find_moves(KEY_WIDTH, constants.max_acceleration, constants.max_velocity)
     note_list.find_locations()
     note_list.find_time_losses()
 
@@ -0,0 +1,346 @@
+"""
+pcode v2. Every command carries its absolute time as uint64 microseconds. Commands are
+written in time order, each as a header byte followed by zig-zag varints, with the time
+stored as the change from the previous command. Every BLOCK_RECORDS commands a new block
+starts from time zero again and a seek index at the end of the file holds the absolute
+time and byte offset of each block, so a reader can start at any time by decoding a
+single block instead of summing the times of the whole file.
+
+A command is written as:
+    1 byte   0 for a deploy or 1 for a move, plus the hand shifted left by one
+    varint   the zig-zag change in time from the previous command of the block
+    varint   the zig-zag duration in microseconds
+    deploy:  DEPLOY_DIGITS bytes of solenoid digits then the zig-zag varint force
+    move:    the zig-zag varint position in mm
+"""
+
+from __future__ import annotations
+import bisect
+import mmap
+import os
+from collections.abc import Iterable, Iterator
+
+import numpy
+
+from pcode import BASE_18, PlayCommand, MoveCommand, merge_commands
+from binary_pcode import DEPLOY_DIGITS, DEPLOY, MOVE
+
+MAGIC = b"PCV2"
+"""The first bytes of every pcode v2 file."""
+FORMAT_VERSION = 2
+"""Changed whenever the header, record or index layout changes."""
+V2_EXTENSION = ".pc2"
+"""The file extension of pcode v2."""
+
+BLOCK_RECORDS = 256
+"""The number of commands in each seekable block."""
+
+HEADER_DTYPE = numpy.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u2"),
+        ("block_records", "<u2"),
+        ("count", "<u8"),
+        ("index_offset", "<u8"),
+    ]
+)
+"""The header of a pcode v2 file. index_offset is the byte offset of the seek index."""
+
+INDEX_DTYPE = numpy.dtype([("time", "<u8"), ("offset", "<u8")])
+"""The absolute time of the first command of a block and the byte offset of the block."""
+
+RECORD_DTYPE = numpy.dtype(
+    [
+        ("command", "S1"),
+        ("hand", "u1"),
+        ("time", "<u8"),
+        ("duration", "<i8"),
+        ("digits", "u1", (DEPLOY_DIGITS,)),
+        ("force", "<i2"),
+        ("position", "<i4"),
+    ]
+)
+"""A decoded command. time is microseconds from the start of the pcode timeline."""
+
+
+def zigzag(value: int) -> int:
+    """Map a signed integer to an unsigned one so small negatives stay small."""
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    """
+    Append an unsigned integer 7 bits at a time with the high bit set on every byte
+    except the last.
+
+    param buffer: The bytearray to append to.
+    param value: A non negative integer.
+    """
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes | mmap.mmap, offset: int) -> tuple[int, int]:
+    """
+    Read an unsigned integer written by write_varint.
+
+    param data: The bytes to read from.
+    param offset: The offset of the first byte of the varint.
+
+    return: The integer and the offset of the byte after it.
+    """
+    value = 0
+    shift = 0
+
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_command(
+    buffer: bytearray, command: PlayCommand | MoveCommand, previous_time: int
+) -> None:
+    """
+    Append a single command to buffer.
+
+    param buffer: The bytearray to append to.
+    param command: A PlayCommand or MoveCommand that has generated its pcode.
+    param previous_time: The absolute_time of the previous command of the block or 0 for
+                         the first command of a block.
+    """
+    is_move = isinstance(command, MoveCommand)
+
+    buffer.append(is_move | (command.hand.value << 1))
+    write_varint(buffer, zigzag(command.absolute_time - previous_time))
+    write_varint(buffer, zigzag(command.duration_us))
+
+    if is_move:
+        write_varint(buffer, zigzag(command.position_parameter))
+    else:
+        digits = [BASE_18.index(digit) for digit in command.digit_parameter]
+        if len(digits) != DEPLOY_DIGITS:
+            raise ValueError(f"Deploy does not have {DEPLOY_DIGITS} digits")
+        buffer.extend(digits)
+        write_varint(buffer, zigzag(command.velocity_parameter))
+
+
+def write_pcode_v2(
+    output_file: str, commands: Iterable[PlayCommand | MoveCommand]
+) -> int:
+    """
+    Write commands as pcode v2 as they are generated. The header and seek index are
+    filled in at the end. The file is written under a temporary name and then renamed
+    so a failed compile never leaves a partial file behind.
+
+    param output_file: The path of the pcode v2 file.
+    param commands: Commands in time order, such as the iterator from merge_commands.
+
+    return: The number of commands written.
+    """
+    header = numpy.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = FORMAT_VERSION
+    header["block_records"] = BLOCK_RECORDS
+
+    index: list[tuple[int, int]] = []
+    buffer = bytearray()
+    previous_time = 0
+    count = 0
+    temp_path = f"{output_file}.{os.getpid()}.tmp"
+
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(header.tobytes())
+            offset = HEADER_DTYPE.itemsize
+
+            for command in commands:
+                if count % BLOCK_RECORDS == 0:
+                    f.write(buffer)
+                    offset += len(buffer)
+                    buffer.clear()
+                    previous_time = 0
+                    index.append((command.absolute_time, offset))
+
+                encode_command(buffer, command, previous_time)
+                previous_time = command.absolute_time
+                count += 1
+
+            f.write(buffer)
+            offset += len(buffer)
+
+            f.write(numpy.array(index, dtype=INDEX_DTYPE).tobytes())
+
+            header["count"] = count
+            header["index_offset"] = offset
+            f.seek(0)
+            f.write(header.tobytes())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, output_file)
+
+    return count
+
+
+class PcodeV2Reader:
+    def __init__(self, input_file: str) -> None:
+        """
+        A memory mapped pcode v2 file. Only the header and seek index are read up front
+        and each block is decoded when it is asked for.
+
+        param input_file: The path of the pcode v2 file.
+        """
+        with open(input_file, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            """The contents of the file."""
+
+        try:
+            if len(self.data) < HEADER_DTYPE.itemsize:
+                raise ValueError(f"{input_file} is too short to be a pcode v2 file")
+
+            header_bytes = self.data[: HEADER_DTYPE.itemsize]
+            header = numpy.frombuffer(header_bytes, HEADER_DTYPE)[0]
+
+            if header["magic"] != MAGIC:
+                raise ValueError(f"{input_file} is not a pcode v2 file")
+            if header["version"] != FORMAT_VERSION:
+                raise ValueError(f"Unsupported pcode v2 version {header['version']}")
+
+            self.count = int(header["count"])
+            """The number of commands in the file."""
+            self.block_records = int(header["block_records"])
+            """The number of commands in each block. The last block may have fewer."""
+            self.index_offset = int(header["index_offset"])
+            """
+            The byte offset of the seek index, which is also the end of the last block.
+            """
+
+            if self.block_records == 0:
+                raise ValueError(f"{input_file} has no commands in each block")
+
+            index_size = -(-self.count // self.block_records) * INDEX_DTYPE.itemsize
+
+            if self.index_offset + index_size > len(self.data):
+                raise ValueError(f"{input_file} is truncated")
+
+            self.index = numpy.frombuffer(
+                self.data[self.index_offset : self.index_offset + index_size],
+                INDEX_DTYPE,
+            )
+            """The absolute time and byte offset of the first command of each block."""
+            self.block_times: list[int] = self.index["time"].tolist()
+            """The absolute time of the first command of each block."""
+        except Exception:
+            self.data.close()
+            raise
+
+    def __len__(self) -> int:
+        return self.count
+
+    def read_block(self, block: int) -> numpy.ndarray:
+        """
+        Decode a single block.
+
+        param block: The index of the block.
+
+        return: An array of RECORD_DTYPE with a command for each record of the block.
+        """
+        first = block * self.block_records
+        records = numpy.zeros(
+            min(self.block_records, self.count - first), dtype=RECORD_DTYPE
+        )
+        data = self.data
+        offset = int(self.index["offset"][block])
+        time = 0
+
+        for record in records:
+            kind = data[offset]
+            offset += 1
+            delta, offset = read_varint(data, offset)
+            duration, offset = read_varint(data, offset)
+            time += unzigzag(delta)
+
+            record["hand"] = kind >> 1
+            record["time"] = time
+            record["duration"] = unzigzag(duration)
+
+            if kind & 1:
+                position, offset = read_varint(data, offset)
+                record["command"] = MOVE
+                record["position"] = unzigzag(position)
+            else:
+                record["command"] = DEPLOY
+                record["digits"] = list(data[offset : offset + DEPLOY_DIGITS])
+                offset += DEPLOY_DIGITS
+                force, offset = read_varint(data, offset)
+                record["force"] = unzigzag(force)
+
+        return records
+
+    def seek(self, time: int) -> Iterator[numpy.ndarray]:
+        """
+        Decode every command at or after a time. Only the block that holds the time and
+        the blocks after it are decoded.
+
+        param time: Microseconds from the start of the pcode timeline.
+
+        return: An iterator of arrays of RECORD_DTYPE, one for each block.
+        """
+        # Commands at the same time can span blocks, so start from the last block that
+        # begins before time rather than at it.
+        block = max(bisect.bisect_left(self.block_times, time) - 1, 0)
+
+        for i in range(block, len(self.block_times)):
+            records = self.read_block(i)
+            if i == block:
+                records = records[records["time"] >= time]
+            yield records
+
+    def records(self) -> numpy.ndarray:
+        """Decode every command of the file into a single array of RECORD_DTYPE."""
+        blocks = [self.read_block(i) for i in range(len(self.block_times))]
+
+        if not blocks:
+            return numpy.zeros(0, dtype=RECORD_DTYPE)
+
+        return numpy.concatenate(blocks)
+
+    def close(self) -> None:
+        self.data.close()
+
+    def __enter__(self) -> PcodeV2Reader:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    import sys
+    from constants import Constants
+    from solenoids import SolenoidIndex
+    from compiler import compile_command_streams
+
+    constants = Constants()
+
+    key_map = SolenoidIndex(88, constants.first_88_key)
+
+    input_file, output_file = sys.argv[1:3]
+
+    streams = compile_command_streams(constants, key_map, input_file)
+
+    print(f"{write_pcode_v2(output_file, merge_commands(streams))} commands")
+
+    with PcodeV2Reader(output_file) as reader:
+        print(reader.records())
@@ -1,16 +1,25 @@
+from __future__ import annotations
+import heapq
+import itertools
 import math
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
 
-from solenoids import SolenoidIndex
+import numpy
+
+from solenoids import SolenoidIndex, mask_positions, mask_min, mask_max
+from kinematics import TravelTable, travel_table
+from note_columns import NoteColumns
 from procsss_xml import (
     MusicPiece,
     TempoList,
     DynamicList,
     TaggedNote,
-    tick_tag_note,
-    extract_pitch,
 )
-from generated.musicxml import ScorePart, Note, Rest
+from generated.musicxml import ScorePart
 from decimal import Decimal
+from fractions import Fraction
 
 # TODO change to enum
 OUTSIDE_LOCATION = 1
@@ -22,37 +31,29 @@ LEFT_DIRECTION = 1
 RIGHT_DIRECTION = 2
 UNKNOWN_DIRECTION = 3
 
-KEYWIDTH = 23.2
-actuationTime = 50000
-Inital_duration = 5000
-maxSpeed = 300
-maxAccel = 3000
-
-US_PER_MINUTE = 1e6 * 60
-
-NOTES_IN_OCTAVE = 12
-BASE_OCTAVE_OFFSET = 1
+PLAN_CACHE_SIZE = 4096
+"""The number of plans a ClusterPlanCache keeps before dropping the least recently used."""
 
 
-def is_note_chord(note: Note) -> bool:
-    result = any(isinstance(x, Note.Chord) for x in note.choice)
-    return result
+class Planner(Enum):
+    GREEDY = 0
+    """Assign each need to earlier notes cluster by cluster with find_optimal_moves."""
+    OPTIMAL = 1
+    """Search every position sequence with plan_positions for the least total time loss."""
 
 
-def is_note_rest(note: Note) -> bool:
-    result = any(isinstance(x, Rest) for x in note.choice)
-    return result
+NOTES_IN_OCTAVE = 12
+BASE_OCTAVE_OFFSET = 1
 
 
-def pitch_to_midi(note: Note) -> int:
+def pitch_to_midi(pitch: tuple[str, int, Decimal]) -> int:
     """
     Converts a string representation of a pitch to its midi equivilent.
 
-    param letter: The letter of the pitch as a string.
-    param octave: The octave of the pitch as an integer.
-    param alter: An integer which represents if the note is a sharp or flat.
+    param pitch: A tuple of the letter of the pitch as a string, the octave of the pitch
+    as an integer, and a value which represents if the note is a sharp or flat.
     """
-    (step, octave, alter) = extract_pitch(note)
+    (step, octave, alter) = pitch
 
     note_offset = ord(step) - ord("C")
     octave_offset = (octave + BASE_OCTAVE_OFFSET) * NOTES_IN_OCTAVE
@@ -69,31 +70,14 @@ def pitch_to_midi(note: Note) -> int:
     return result
 
 
-def convert_tick_time(tempo: Decimal, divisions: Decimal) -> Decimal:
-    """
-    TODO
-    """
-    divisions_per_minute = tempo * divisions
-
-    result = Decimal(US_PER_MINUTE) / divisions_per_minute
-
-    return result
-
-
 def xml_note_time(
     tagged_note: TaggedNote,
     tempo_list: TempoList,
     divisions: Decimal,
-) -> Decimal:
-    duration_time: Decimal = 0
-
-    note_duration = tick_tag_note(tagged_note.note)
+) -> Fraction:
+    end_tick = tagged_note.tick + tagged_note.duration
 
-    for i in range(0, int(note_duration)):
-        current_tempo = tempo_list.tempo_at_tick(tagged_note.tick + i)
-        duration_time += convert_tick_time(current_tempo, divisions)
-
-    return duration_time
+    return tempo_list.tick_time(tagged_note.tick, end_tick, divisions)
 
 
 def convert_velocity(xml_velocity: Decimal) -> Decimal:
@@ -119,77 +103,147 @@ def xml_dynamic(tagged_note: TaggedNote, dynamic_list: DynamicList) -> int:
     return int(velocity)
 
 
-def move_closer_to_zero(lst):
-    return [x - 1 if x > 0 else x + 1 if x < 0 else x for x in lst]
+def plan_positions(columns: NoteColumns, travel_table: TravelTable) -> list[int]:
+    """
+    Find the hand position of every note that loses the least total time to moves. Each
+    note is a stage whose states are its possible_locations and a move between two
+    notes costs the part of its travel and actuation time that does not fit in the
+    spare time after the first note. A move is not allowed if that cost reaches the
+    duration of the note. Equal costs are broken by the shortest total distance.
 
+    param columns: The NoteColumns of a piece.
+    param travel_table: The TravelTable of the machine profile.
 
-def travel_time(distance, accel, velocity):
-    """TODO Verify and update"""
-    mAccelDistance = (velocity**2) / (2 * accel)
-    if mAccelDistance > distance:
-        rDistance = 0
-        accelDistance = distance
-    else:
-        accelDistance = mAccelDistance
-        rDistance = distance - accelDistance
+    return: A list of integer positions with one position for each note.
+    """
+    if not columns.count:
+        return []
+
+    durations = columns.column("duration").tolist()
+    spare_times = (columns.column("next_delay") - columns.column("duration")).tolist()
+    masks = columns.location_masks
 
-    accelTime = 2 * math.sqrt(accelDistance / (accel))
-    linearTime = rDistance / velocity
-    totalTime = accelTime + linearTime
-    return totalTime * 1000000
+    # For each state the (time loss, distance) of the best path to it.
+    costs = {position: (0.0, 0) for position in mask_positions(masks[0])}
+    back_links: list[dict[int, int]] = []
+
+    for i in range(1, columns.count):
+        spare_time = spare_times[i - 1]
+        previous_duration = durations[i - 1]
+        next_costs: dict[int, tuple[float, int]] = {}
+        links: dict[int, int] = {}
+
+        for position in mask_positions(masks[i]):
+            best: tuple[float, int] | None = None
+
+            for previous_position, (time_loss, distance) in costs.items():
+                move_distance = abs(position - previous_position)
+                loss = max(0.0, travel_table.move_time(move_distance) - spare_time)
+
+                if move_distance and loss >= previous_duration:
+                    continue
+
+                candidate = (time_loss + loss, distance + move_distance)
+                if best is None or candidate < best:
+                    best = candidate
+                    links[position] = previous_position
+
+            if best is not None:
+                next_costs[position] = best
+
+        if not next_costs:
+            raise ValueError(f"No playable position for note {i}")
+
+        costs = next_costs
+        back_links.append(links)
+
+    position = min(costs, key=costs.__getitem__)
+    positions = [position]
+
+    for links in reversed(back_links):
+        position = links[position]
+        positions.append(position)
+
+    positions.reverse()
+
+    return positions
 
 
 class PlayableNote:
-    def __init__(
-        self,
-        key_map: SolenoidIndex,
-        note_start: Decimal,
-        duration: Decimal,
-        midi_pitch: int,
-        velocity: int,
-    ) -> None:
+    __slots__ = ("columns", "index")
+
+    def __init__(self, columns: NoteColumns, index: int) -> None:
         """
         Holds all the information for a single playable set of notes. This could be a single key or a chord.
         Only contains a single start time and total duration so any keys played with a different start or duration
-        must be held in a different instance.
+        must be held in a different instance. The values live in the row of a NoteColumns and this object is only
+        a view of that row, so any number of PlayableNotes can refer to the same note.
 
-        param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key location, and valid
-                       hand positions for a giving pitch.
-        param note_start: An integer that represents the start time of the note(s) in terms of musicXML ticks.
-        param duration: An integer that represents the total duration the note(s) in terms of musicXML ticks.
-        param midi_pitch: An integer that represents the pitch of the note equivilent to the midi pitch number.
-        param velocity: An integer that represents the volume of the note(s) similar to midi velocity.
+        param columns: The NoteColumns holding the note.
+        param index: The row of the note in columns.
         """
-        self.note_start = note_start
-        """The number of musicxml ticks as an integer from the piece start to beginning to play this note."""
-        self.duration = duration
-        """The number of musicxml ticks as an integer from the start of the note to the end of the note."""
-        self.midi_pitches = [midi_pitch]
+        self.columns = columns
+        self.index = index
+
+    @property
+    def note_start(self) -> int:
+        """The number of microseconds as an integer from the piece start to beginning to play this note."""
+        return int(self.columns.start[self.index])
+
+    @property
+    def duration(self) -> int:
+        """The number of microseconds as an integer from the start of the note to the end of the note."""
+        return int(self.columns.duration[self.index])
+
+    @duration.setter
+    def duration(self, duration: int) -> None:
+        self.columns.duration[self.index] = duration
+
+    @property
+    def midi_pitches(self) -> list[int]:
         """
-        The group of pitches that make up this note represented by 
+        The group of pitches that make up this note represented by
         integer values equal to the midi representation.
         """
-        self.velocity = velocity
+        return self.columns.note_pitches(self.index)
+
+    @property
+    def velocity(self) -> int:
         """The volume/velocity/force the note should be played with represented as an interger."""
-        self.key_map = key_map
+        return int(self.columns.velocity[self.index])
+
+    @property
+    def key_map(self) -> SolenoidIndex:
         """
         A SolenoidIndex object that holds the mapping between midi pitch, key location, and valid
         hand positions for a giving pitch.
         """
+        return self.columns.key_map
 
-        self.next_delay: Decimal = 0
-        """An integer value of musicxml ticks until the next note starts. Zero means there is no next note."""
+    @property
+    def next_delay(self) -> int:
+        """An integer value of microseconds until the next note starts. Zero means there is no next note."""
+        return int(self.columns.next_delay[self.index])
 
-        new_locations = self.key_map.playable_for_pitch(midi_pitch)
-        self.possible_locations = set(
-            filter(lambda item: item is not None, new_locations)
-        )
-        """A set that contains every valid location for the hand that allows this note to be played."""
+    @property
+    def location_mask(self) -> int:
+        """A bitmask with bit n set when hand position n allows this note to be played."""
+        return self.columns.location_masks[self.index]
 
-        self.position: int = 0
-        """TODO"""
+    @property
+    def measure(self) -> str | None:
+        """The musicxml measure number of the note or None if it is not known."""
+        return self.columns.measures[self.index]
+
+    @property
+    def position(self) -> int:
+        """The hand position in keys this note is played at."""
+        return int(self.columns.position[self.index])
 
-        self.time_loss: float = 0.0
+    @property
+    def time_loss(self) -> int:
+        """An integer value of microseconds removed from the end of the note for moves and retracts."""
+        return int(self.columns.time_loss[self.index])
 
     def add_pitch(self, new_midi_pitch: int) -> int:
         """
@@ -200,24 +254,27 @@ class PlayableNote:
         param new_midi_pitch: An integer that represents the pitch of the note equivilent to the midi pitch number
                               that will be added to the PlayableNote.
         """
-        new_locations = self.key_map.playable_for_pitch(new_midi_pitch)
-        filtered_locations = set(filter(lambda item: item is not None, new_locations))
-        temp_locations = set(self.possible_locations) & filtered_locations
+        temp_mask = self.location_mask & self.key_map.mask_for_pitch(new_midi_pitch)
 
-        if temp_locations:
-            self.possible_locations = temp_locations
-            self.midi_pitches.append(new_midi_pitch)
+        if temp_mask:
+            self.columns.location_masks[self.index] = temp_mask
+            self.columns.add_pitch(self.index, new_midi_pitch)
             return INSIDE_LOCATION
         else:
             return OUTSIDE_LOCATION
 
+    @property
+    def possible_locations(self) -> set[int]:
+        """A set that contains every valid location for the hand that allows this note to be played."""
+        return set(mask_positions(self.location_mask))
+
     def max_position(self) -> int:
         """
         Returns the maximum position for this PlayableNote.
 
         return: Integer that represents the maximum possible_location.
         """
-        return max(self.possible_locations)
+        return mask_max(self.location_mask)
 
     def min_position(self) -> int:
         """
@@ -225,46 +282,38 @@ class PlayableNote:
 
         return: Integer that represents the minimum possible_location.
         """
-        return min(self.possible_locations)
+        return mask_min(self.location_mask)
 
-    def set_delay(self, next_start: Decimal) -> None:
+    def set_delay(self, next_start: int) -> None:
         """TODO Might remove"""
-        self.next_delay = next_start - self.note_start
+        self.columns.next_delay[self.index] = next_start - self.note_start
 
     def set_time_loss(self, time_loss: float) -> None:
         """TODO TODO TODO
-        Set the time loss for the note in terms of microseconds as a float.
+        Set the time loss for the note in terms of microseconds. This is rounded to the
+        nearest integer microsecond to stay in the integer timebase.
 
         param time_loss: A float value that represents the total time removed
         from the playing duration for things like moves and solenoid retracts
         """
-        self.time_loss = Decimal(time_loss)
+        self.columns.time_loss[self.index] = round(time_loss)
 
-    def move_score(
-        self,
-        distance: int,
-        key_width: float,
-        acceleration: float,
-        velociy: float,
-    ) -> float:
+    def move_score(self, distance: int, travel_table: TravelTable) -> float:
         """
         Takes in a distance to be traveled after the note is played and returns a score based on how much it affects
         the note. A lower score means the note was affected less. A score of over 1 means the entered distance cannot
         be traveled after playing this note.
 
         param distance: An integer value for the number of keys that need to be moved.
-        param key_width: A float value that represents the width of a piano key in mm.
+        param travel_table: The TravelTable of the machine profile.
 
         return: A float value that represents the score of this potential move. A lower score is better and a score of
         over 1 means the entered distance cannot be traveled after playing this note.
         """
-        distance_mm = distance * key_width
-        score_time = (
-            travel_time(distance_mm, acceleration, velociy) + actuationTime
-        )  # TODO This needs to not be a file constant. This should be a config value.
+        score_time = travel_table.move_time(distance)
         spare_time = self.next_delay - self.duration
         if score_time >= spare_time:
-            real_score_time = Decimal(score_time) - spare_time
+            real_score_time = score_time - spare_time
             note_time = self.duration
             score = real_score_time / note_time
             return score
@@ -277,22 +326,13 @@ class PlayableNote:
 
         param position: An integer value that represents the position in keys to play this note.
         """
-        self.position = position
+        self.columns.position[self.index] = position
 
-    def find_time_loss(
-        self,
-        distance: int,
-        key_width: float,
-        acceleration: float,
-        velociy: float,
-    ):
+    def find_time_loss(self, distance: int, travel_table: TravelTable):
         """
         TODO
         """
-        distance_mm = distance * key_width
-        lost_time = (
-            travel_time(distance_mm, acceleration, velociy) + actuationTime
-        )  # TODO This should be a config value not a file constant.
+        lost_time = travel_table.move_time(distance)
         self.set_time_loss(lost_time)
 
     def __iter__(self) -> list[int]:
@@ -314,9 +354,9 @@ class PlayableNoteList:
     def __init__(
         self,
         key_map: SolenoidIndex,
-        processed_xml: MusicPiece,
-        score_part: ScorePart,
-        staff: int,
+        processed_xml: MusicPiece | None,
+        score_part: ScorePart | None = None,
+        staff: int = 1,
     ) -> None:
         """
         Takes in a XMLNoteList object and converts it to a list of PlayableNotes. PlayableNotes combine same time notes
@@ -324,7 +364,10 @@ class PlayableNoteList:
 
         param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key location, and valid
                        hand positions for a giving pitch.
-        param note_list: A XMLNoteList object containing each note for a particular staff of a musicxml part.
+        param processed_xml: The piece to read the notes from. If None the list starts empty and notes are added with
+                             add_note.
+        param score_part: The part of processed_xml to read.
+        param staff: The staff of score_part to read.
         """
         self.key_map = key_map
 
@@ -332,12 +375,21 @@ class PlayableNoteList:
         A SolenoidIndex object that holds the mapping between midi pitch, key location, and valid 
         hand positions for a giving pitch.
         """
-        self.playable_list: list[PlayableNote] = []
-        """The list of every note in the XMLNoteList in the form of PlayableNotes."""
+        self.columns = NoteColumns(key_map)
+        """The NoteColumns that hold every note in this list."""
 
         self.moves: list[int] = []
         """Every move that should take place during this PlayableNoteList as a list of integers."""
 
+        self.travel_table: TravelTable | None = None
+        """The TravelTable of the machine profile used by find_moves and find_time_losses."""
+
+        self.start_location: int | None = None
+        """The position of the first note when set by a planner. None to use the first group."""
+
+        if processed_xml is None:
+            return
+
         self.divisions = processed_xml.part_divisions(score_part)
 
         xml_notes = processed_xml.tick_tag_notes(score_part, staff)
@@ -358,52 +410,66 @@ class PlayableNoteList:
 
         param note_list: A XMLNoteList object containing each note for a particular staff of a musicxml part.
         """
-        current_us_time = Decimal(0)
+        # The running time is kept exact and each note is rounded to whole
+        # microseconds on its own, so rounding never adds up along the piece.
+        current_us_time = Fraction(0)
 
         for tagged_note in note_list:
-            if is_note_rest(tagged_note.note):
+            if tagged_note.is_rest():
                 current_us_time += xml_note_time(
                     tagged_note, tempo_list, self.divisions
                 )
-            elif self.playable_list:
-                previous_playable = self.playable_list[-1]
-
-                midi_pitch = pitch_to_midi(tagged_note.note)
-
-                if is_note_chord(tagged_note.note):
-                    previous_playable.add_pitch(midi_pitch)
-
-                else:
-                    velocity = xml_dynamic(tagged_note, dynamic_list)
-                    note_duration = xml_note_time(
-                        tagged_note, tempo_list, self.divisions
-                    )
-
-                    temp_playable = PlayableNote(
-                        self.key_map,
-                        current_us_time,
-                        note_duration,
-                        midi_pitch,
-                        velocity,
-                    )
-                    current_us_time += note_duration
-                    self.playable_list[-1].set_delay(temp_playable.note_start)
-                    self.playable_list.append(temp_playable)
+            elif tagged_note.chord and len(self):
+                self[-1].add_pitch(pitch_to_midi(tagged_note.pitch))
 
             else:
                 velocity = xml_dynamic(tagged_note, dynamic_list)
-                note_duration = xml_note_time(tagged_note, tempo_list, self.divisions)
-                midi_pitch = pitch_to_midi(tagged_note.note)
+                note_end = current_us_time + xml_note_time(
+                    tagged_note, tempo_list, self.divisions
+                )
+                midi_pitch = pitch_to_midi(tagged_note.pitch)
+                note_start = round(current_us_time)
 
-                temp_playable = PlayableNote(
-                    self.key_map,
-                    current_us_time,
-                    note_duration,
+                self.add_note(
+                    note_start,
+                    round(note_end) - note_start,
                     midi_pitch,
                     velocity,
+                    tagged_note.measure,
                 )
-                current_us_time += note_duration
-                self.playable_list.append(temp_playable)
+                current_us_time = note_end
+
+    def add_note(
+        self,
+        note_start: int,
+        duration: int,
+        midi_pitch: int,
+        velocity: int,
+        measure: str | None = None,
+    ) -> PlayableNote:
+        """
+        Add a single pitch note to the end of the list and set the delay of the previous note.
+
+        param note_start: An integer that represents the start time of the note in microseconds. It must not be
+                          before the start of the last note in the list.
+        param duration: An integer that represents the total duration the note in microseconds.
+        param midi_pitch: An integer that represents the pitch of the note equivilent to the midi pitch number.
+        param velocity: An integer that represents the volume of the note similar to midi velocity.
+        param measure: The musicxml measure number the note starts in or None if it is not known.
+
+        return: The new PlayableNote. More pitches can be added to it with add_pitch.
+        """
+        if len(self):
+            self[-1].set_delay(note_start)
+
+        index = self.columns.append(note_start, duration, midi_pitch, velocity, measure)
+
+        return PlayableNote(self.columns, index)
+
+    @property
+    def playable_list(self) -> list[PlayableNote]:
+        """The list of every note in the form of PlayableNotes."""
+        return list(self)
 
     def find_groups(self) -> None:
         self.group_list = PlayableGroupList(self)
@@ -426,48 +492,140 @@ class PlayableNoteList:
                     self.moves[:-overlap] + overlap_moves + cluster.moves[overlap:]
                 )
 
-    def find_moves(self, key_width: float, acceleration: int, velocity: int) -> None:
-        for cluster in self.group_list.cluster_list:
+    def find_moves(
+        self,
+        key_width: float,
+        acceleration: int,
+        velocity: int,
+        planner: Planner = Planner.GREEDY,
+        jobs: int = 1,
+        plan_cache: ClusterPlanCache | None = None,
+    ) -> None:
+        """
+        Find the move after every note.
+
+        param key_width: A float value that represents the width of a piano key in mm.
+        param acceleration: The max acceleration of the hand.
+        param velocity: The max velocity of the hand.
+        param planner: The Planner used to choose the moves. Planner.GREEDY needs
+                       find_groups and find_clusters to have been run first.
+        param jobs: The number of worker processes Planner.GREEDY plans clusters on. The
+                    moves are the same for any number of jobs.
+        param plan_cache: A ClusterPlanCache to share plans between pieces. If None a new
+                          cache is used so repeats within this piece are still only
+                          planned once.
+        """
+        self.travel_table = travel_table(key_width, acceleration, velocity)
+
+        if planner == Planner.OPTIMAL:
+            positions = plan_positions(self.columns, self.travel_table)
+            self.start_location = positions[0] if positions else None
+            self.moves = [y - x for x, y in zip(positions, positions[1:])]
+            if positions:
+                self.moves.append(0)
+            return
+
+        cluster_list = self.group_list.cluster_list
+
+        if plan_cache is None:
+            plan_cache = ClusterPlanCache()
+
+        # The first cluster of each key that is not in plan_cache, in cluster order. The
+        # plans of this piece are kept here too since plan_cache may drop them.
+        keys: list[tuple] = []
+        unplanned: dict[tuple, PlayableGroupCluster] = {}
+        plans: dict[tuple, tuple[list[int], list[int]]] = {}
+
+        for cluster in cluster_list:
             cluster.set_cluster_list()
-            cluster.find_optimal_moves(key_width, acceleration, velocity)
+            key = plan_cache.cluster_key(cluster, self.travel_table)
+            keys.append(key)
+
+            if key in plans or key in unplanned:
+                continue
+            elif key in plan_cache:
+                plans[key] = plan_cache.plan(key)
+            else:
+                unplanned[key] = cluster
+
+        if jobs > 1 and len(unplanned) > 1:
+            clusters = list(unplanned.values())
+
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = executor.map(
+                    allocate_moves,
+                    [cluster.cluster_need for cluster in clusters],
+                    [cluster.cluster_freed for cluster in clusters],
+                    [cluster.durations for cluster in clusters],
+                    [cluster.spare_times for cluster in clusters],
+                    itertools.repeat(self.travel_table),
+                    chunksize=max(1, len(clusters) // (4 * jobs)),
+                )
+
+                for key, plan in zip(unplanned, results):
+                    plan_cache.store(key, plan)
+                    plans[key] = plan
+        else:
+            for key, cluster in unplanned.items():
+                cluster.find_optimal_moves(self.travel_table)
+                plan = (cluster.moves, cluster.cluster_freed)
+                plan_cache.store(key, plan)
+                plans[key] = plan
+
+        # Every cluster that was not planned itself reused a plan.
+        plan_cache.hits += len(cluster_list) - len(unplanned)
+
+        for key, cluster in zip(keys, cluster_list):
+            moves, cluster_freed = plans[key]
+            cluster.moves, cluster.cluster_freed = list(moves), list(cluster_freed)
+
         self.combine_cluster_moves()
 
     def find_locations(self) -> None:
-        first_group = self.group_list.group_list[0]
-        if first_group.movement_directions[1] == RIGHT_DIRECTION:
-            current_location = max(first_group.possible_locations)
+        if not self.moves:
+            return
+        elif self.start_location is not None:
+            current_location = self.start_location
         else:
-            current_location = min(first_group.possible_locations)
+            first_group = self.group_list.group_list[0]
+            if first_group.movement_directions[1] == RIGHT_DIRECTION:
+                current_location = first_group.max_position()
+            else:
+                current_location = first_group.min_position()
         for i, move in enumerate(self.moves):
-            self.playable_list[i].set_position(current_location)
+            self.columns.position[i] = current_location
             current_location += move
 
     def find_time_losses(self) -> None:
         for i in range(0, len(self.moves)):
-            self.playable_list[i].find_time_loss(
-                abs(self.moves[i]), KEYWIDTH, maxAccel, maxSpeed
-            )
+            self[i].find_time_loss(abs(self.moves[i]), self.travel_table)
 
     def __iter__(self) -> list[PlayableNote]:
-        return iter(self.playable_list)
+        columns = self.columns
+        return (PlayableNote(columns, i) for i in range(columns.count))
+
+    def __len__(self) -> int:
+        return self.columns.count
 
     def __str__(self) -> str:
         temp = ""
-        for playable in self.playable_list:
+        for playable in self:
             temp += str(playable) + "\n"
         return temp
 
     def __repr__(self) -> str:
         temp = ""
-        for playable in self.playable_list:
+        for playable in self:
             temp += repr(playable) + "\n"
         return temp
 
     def __getitem__(self, i: int) -> PlayableNote:
-        return self.playable_list[i]
-
-    def __setitem__(self, i: int, data: PlayableNote) -> None:
-        self.playable_list[i] = data
+        count = self.columns.count
+        if i < 0:
+            i += count
+        if not 0 <= i < count:
+            raise IndexError("PlayableNoteList index out of range")
+        return PlayableNote(self.columns, i)
 
 
 class PlayableGroup:
@@ -477,8 +635,8 @@ class PlayableGroup:
         """
         self.playable_group: list[PlayableNote] = []
         """A list of Playable notes that can be played without any hand movement."""
-        self.possible_locations: set[int] = []
-        """Set of values that represent each possible location of hand location for this group."""
+        self.location_mask: int = 0
+        """A bitmask with bit n set when hand position n can play every note of this group."""
         self.movement_directions: list[int] = [UNKNOWN_DIRECTION, UNKNOWN_DIRECTION]
         """
         Contains two values. 
@@ -519,22 +677,31 @@ class PlayableGroup:
         return: An interger value that represents whether the note can be added to the
         current group.
         """
-        new_locations = note.possible_locations
-
-        temp_locations = set(self.possible_locations).intersection(new_locations)
+        temp_mask = self.location_mask & note.location_mask
 
-        if temp_locations:
-            self.possible_locations = temp_locations
+        if temp_mask:
+            self.location_mask = temp_mask
             self.playable_group.append(note)
             return INSIDE_LOCATION
 
-        elif self.possible_locations:
+        elif self.location_mask:
             return OUTSIDE_LOCATION
         else:
-            self.possible_locations = note.possible_locations
+            self.location_mask = note.location_mask
             self.playable_group.append(note)
             return INSIDE_LOCATION
 
+    @property
+    def possible_locations(self) -> set[int]:
+        """Set of values that represent each possible location of hand location for this group."""
+        return set(mask_positions(self.location_mask))
+
+    def max_position(self) -> int:
+        return mask_max(self.location_mask)
+
+    def min_position(self) -> int:
+        return mask_min(self.location_mask)
+
     def append_move(self, move_value: int) -> None:
         self.moves.append(move_value)
 
@@ -581,19 +748,21 @@ class PlayableGroup:
 
     def last_freed_point(self, distance: int) -> None:
         """TODO Does nothing useful atm.
-        Add the last freed point based on the first note of the next group.
+        Add the last freed point based on the first note of the next group. A group
+        whose notes all share the same edge location, such as a single note, frees
+        nothing before its last note and has no freed points yet.
 
         param distance: An integer representing distance this group can travel to the next group.
         """
         group_length = len(self.playable_group)
-        if self.freed_points[-1][0] == group_length - 1:
+        if self.freed_points and self.freed_points[-1][0] == group_length - 1:
             self.freed_points[-1][1] += distance
         else:
             self.freed_points.append([group_length - 1, distance])
 
     def find_default_position(self) -> int:
         """Is this used?"""
-        return min(self.possible_locations)
+        return self.min_position()
 
     def min_locations(self, direction: bool) -> list[int]:
         """
@@ -609,7 +778,7 @@ class PlayableGroup:
         locations: list[int] = []
 
         for note in self.playable_group:
-            locations.append(min(note.possible_locations))
+            locations.append(note.min_position())
 
         unique_locations = list(set(locations))
 
@@ -631,7 +800,7 @@ class PlayableGroup:
         locations: list[int] = []
 
         for note in self.playable_group:
-            locations.append(max(note.possible_locations))
+            locations.append(note.max_position())
 
         unique_locations = list(set(locations))
 
@@ -643,16 +812,16 @@ class PlayableGroup:
         self, group: list[PlayableNote], element: int, direction: int
     ) -> list[list[PlayableNote]]:
         if direction == LEFT_DIRECTION:
-            if max(group[-1].possible_locations) == element:
+            if group[-1].max_position() == element:
                 return [group, []]
             for i, item in enumerate(group):
-                if max(item.possible_locations) == element:
+                if item.max_position() == element:
                     return [group[: i + 1], group[i + 1 :]]
         else:
-            if min(group[-1].possible_locations) == element:
+            if group[-1].min_position() == element:
                 return [group, []]
             for i, item in enumerate(group):
-                if min(item.possible_locations) == element:
+                if item.min_position() == element:
                     return [group[: i + 1], group[i + 1 :]]
 
             raise IndexError("Provided element does not exist in group.")
@@ -681,8 +850,14 @@ class PlayableGroup:
                 target_location = ordered_locations.pop(0)
                 temp_movement += target_location - ordered_locations[0]
                 for i, note in enumerate(current_group):
-                    min_location = min(note.possible_locations)
+                    min_location = note.min_position()
                     if min_location == target_location:
+                        # The first note sets the location the group is entered
+                        # at, so only later notes can need more movement.
+                        if i == 0:
+                            current_group = []
+                            break
+                        temp_movement = min(temp_movement, remaining_need)
                         self.need_points.append([i, temp_movement])
                         current_group = current_group[0:i]
                         remaining_need -= abs(temp_movement)
@@ -702,8 +877,14 @@ class PlayableGroup:
                 target_location = ordered_locations.pop(0)
                 temp_movement += target_location - ordered_locations[0]
                 for i, note in enumerate(current_group):
-                    max_location = max(note.possible_locations)
+                    max_location = note.max_position()
                     if max_location == target_location:
+                        # The first note sets the location the group is entered
+                        # at, so only later notes can need more movement.
+                        if i == 0:
+                            current_group = []
+                            break
+                        temp_movement = max(temp_movement, -remaining_need)
                         self.need_points.append([i, temp_movement])
                         current_group = current_group[0:i]
                         remaining_need -= abs(temp_movement)
@@ -737,8 +918,14 @@ class PlayableGroup:
                 target_location = ordered_locations.pop(0)
                 temp_movement += ordered_locations[0] - target_location
                 for i, note in enumerate(current_group):
-                    min_location = min(note.possible_locations)
+                    min_location = note.min_position()
                     if min_location == target_location:
+                        # The last note sets the location the group is left
+                        # from, so only earlier notes can free movement.
+                        if i == 0:
+                            current_group = []
+                            break
+                        temp_movement = max(temp_movement, -remaining_freed)
                         self.freed_points.append(
                             [group_length - (i + 1), temp_movement]
                         )
@@ -760,8 +947,14 @@ class PlayableGroup:
                 target_location = ordered_locations.pop(0)
                 temp_movement += ordered_locations[0] - target_location
                 for i, note in enumerate(current_group):
-                    max_location = max(note.possible_locations)
+                    max_location = note.max_position()
                     if max_location == target_location:
+                        # The last note sets the location the group is left
+                        # from, so only earlier notes can free movement.
+                        if i == 0:
+                            current_group = []
+                            break
+                        temp_movement = min(temp_movement, remaining_freed)
                         self.freed_points.append(
                             [group_length - (i + 1), temp_movement]
                         )
@@ -916,6 +1109,10 @@ class PlayableGroupCluster:
         """A list of locations a move will take place and how much it will move."""
         self.cluster_playable: list[PlayableNote] = []
         """A list all the PlayableNotes in the cluster"""
+        self.durations = numpy.zeros(0, dtype=numpy.int64)
+        """The duration of each note in cluster_playable in microseconds."""
+        self.spare_times = numpy.zeros(0, dtype=numpy.int64)
+        """The time between the end of each note in cluster_playable and the next note start."""
 
     def add_group(self, new_group: PlayableGroup) -> None:
         """
@@ -939,23 +1136,23 @@ class PlayableGroupCluster:
         self,
         current_direction: int,
         previous_width: int,
-        current_locations: set[int],
-        previous_locations: set[int],
+        current_mask: int,
+        previous_mask: int,
     ) -> int:
         """
         Find the absolute need for a given current location set based on a previous location set.
 
         param current_direction: An integer that represents the in direction the current group.
         param previous_width: An integer that represents the previous groups possible location width.
-        param current_locations: A set of integers that represent a current groups possible locations.
-        param previous_locations: A set of integers that represent a previous groups possible locations.
+        param current_mask: A bitmask of a current groups possible locations.
+        param previous_mask: A bitmask of a previous groups possible locations.
 
         return: Returns and integer value as a distance of keys.
         """
         if current_direction == LEFT_DIRECTION:
-            distance = min(current_locations) - max(previous_locations)
+            distance = mask_min(current_mask) - mask_max(previous_mask)
         elif current_direction == RIGHT_DIRECTION:
-            distance = max(current_locations) - min(previous_locations)
+            distance = mask_max(current_mask) - mask_min(previous_mask)
         else:
             raise ValueError("All groups by here should have directions assigned.")
 
@@ -964,21 +1161,21 @@ class PlayableGroupCluster:
     def find_absolute_freed(
         self,
         current_direction: int,
-        current_locations: set[int],
-        previous_locations: set[int],
+        current_mask: int,
+        previous_mask: int,
     ) -> int:
         """
         Find the absolute freed for a previous current location set based on a current location set.
 
-        param current_locations: A set of integers that represent a current groups possible locations.
-        param previous_locations: A set of integers that represent a previous groups possible locations.
+        param current_mask: A bitmask of a current groups possible locations.
+        param previous_mask: A bitmask of a previous groups possible locations.
 
         return: Returns and integer value as a distance of keys.
         """
         if current_direction == LEFT_DIRECTION:
-            distance = min(current_locations) - min(previous_locations)
+            distance = mask_min(current_mask) - mask_min(previous_mask)
         elif current_direction == RIGHT_DIRECTION:
-            distance = max(current_locations) - max(previous_locations)
+            distance = mask_max(current_mask) - mask_max(previous_mask)
         else:
             raise ValueError("All groups by here should have directions assigned.")
 
@@ -994,23 +1191,23 @@ class PlayableGroupCluster:
 
         for i in range(0, len(groups)):
             if i != 0:
-                current_locations = groups[i].possible_locations
-                previous_locations = previous_group.possible_locations
+                current_mask = groups[i].location_mask
+                previous_mask = previous_group.location_mask
                 current_group_direction = groups[i].movement_directions[0]
 
                 need_distance = self.find_absolute_need(
                     current_group_direction,
                     previous_width,
-                    current_locations,
-                    previous_locations,
+                    current_mask,
+                    previous_mask,
                 )
                 freed_distance = self.find_absolute_freed(
-                    current_group_direction, current_locations, previous_locations
+                    current_group_direction, current_mask, previous_mask
                 )
 
                 groups[i].set_absolute_need(need_distance)
                 previous_group.set_absolute_freed(freed_distance)
-                # previous_width = len(current_locations)
+                # previous_width = current_mask.bit_count()
 
             previous_group = groups[i]
 
@@ -1057,39 +1254,245 @@ class PlayableGroupCluster:
         for group in self.cluster:
             self.cluster_playable += group.playable_group
 
-    def find_optimal_moves(
-        self, key_width: float, acceleration: int, velocity: int
-    ) -> None:
+        if self.cluster_playable:
+            columns = self.cluster_playable[0].columns
+            indexes = [note.index for note in self.cluster_playable]
+            self.durations = columns.duration[indexes]
+            self.spare_times = columns.next_delay[indexes] - self.durations
+
+    def move_scores(
+        self,
+        move_counts: numpy.ndarray,
+        spare_times: numpy.ndarray,
+        travel_table: TravelTable,
+        first: int = 0,
+    ) -> numpy.ndarray:
         """
-        Find for the entire cluster the optimal moves for each needed move.
-        """
-        scores: list[float] = [1.0] * len(self.cluster_playable)
-        self.moves = [0] * len(self.cluster_playable)
-
-        for need in self.cluster_need:
-            last_note = need[0]
-            scores: list[float] = [1.0] * len(self.cluster_playable)
-            need_distance = abs(need[1])
-            for i in range(1, (need_distance + 1)):
-                for j, freed in enumerate(self.cluster_freed):
-                    if j < last_note:
-                        if abs(freed) >= 1:
-                            scores[j] = self.cluster_playable[j].move_score(
-                                abs(self.moves[j]) + 1,
-                                key_width,
-                                acceleration,
-                                velocity,
-                            )
-
-                    else:
-                        break
+        Score a move of move_counts[i] keys after note first + i of cluster_playable for
+        every entry at once. Each score matches PlayableNote.move_score.
+
+        param move_counts: A numpy array of the integer number of keys to score.
+        param spare_times: A numpy array of the spare time after each scored note.
+        param travel_table: The TravelTable of the machine profile.
+        param first: The index in cluster_playable of the first scored note.
+
+        return: A float64 numpy array of scores. Scores of 1 or more cannot be played.
+        """
+        durations = self.durations[first : first + len(move_counts)]
+
+        return move_scores(move_counts, spare_times, durations, travel_table)
+
+    def find_optimal_moves(self, travel_table: TravelTable) -> None:
+        """
+        Find for the entire cluster the optimal moves for each needed move with
+        allocate_moves.
+
+        param travel_table: The TravelTable of the machine profile.
+        """
+        self.moves, self.cluster_freed = allocate_moves(
+            self.cluster_need,
+            self.cluster_freed,
+            self.durations,
+            self.spare_times,
+            travel_table,
+        )
+
+
+def move_scores(
+    move_counts: numpy.ndarray,
+    spare_times: numpy.ndarray,
+    durations: numpy.ndarray,
+    travel_table: TravelTable,
+) -> numpy.ndarray:
+    """
+    Score a move of move_counts[i] keys after a note with spare_times[i] spare time and
+    durations[i] duration for every entry at once. Each score matches
+    PlayableNote.move_score. A note with no duration cannot absorb any lost time so its
+    score is infinite.
+
+    return: A float64 numpy array of scores. Scores of 1 or more cannot be played.
+    """
+    score_times = travel_table.move_time_many(move_counts)
+    lost_times = score_times - spare_times
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        scores = numpy.where(lost_times >= 0, lost_times / durations, 0.0)
+
+    scores[numpy.isnan(scores)] = numpy.inf
+
+    return scores
+
+
+def allocate_moves(
+    cluster_need: list[list[int]],
+    cluster_freed: list[int],
+    durations: numpy.ndarray,
+    spare_times: numpy.ndarray,
+    travel_table: TravelTable,
+) -> tuple[list[int], list[int]]:
+    """
+    Find the optimal moves of a single cluster. Each single key step of a need is given
+    to the earlier note with the lowest move score, the lowest index winning ties. Scores
+    live in a heap that is seeded with move_scores and only the note that was given a
+    step is rescored. A note stays available while its freed distance is larger than the
+    number of steps given so far in the cluster. This only depends on its arguments so
+    clusters can be planned in any process.
+
+    param cluster_need: The [note index, distance] needs of the cluster.
+    param cluster_freed: The freed distance at each note of the cluster.
+    param durations: The duration of each note of the cluster in microseconds.
+    param spare_times: The spare time after each note of the cluster in microseconds.
+    param travel_table: The TravelTable of the machine profile.
+
+    return: The move after each note and the freed distance left at each note.
+    """
+    note_count = min(len(durations), len(cluster_freed))
+    moves = [0] * len(durations)
+
+    # The number of times each note has been rescored. Older heap entries are stale.
+    versions = [0] * note_count
+    heap: list[tuple[float, int, int]] = []
+    pushed = 0
+    steps = 0
+
+    def push_scores(first: int, last: int) -> None:
+        move_counts = numpy.abs(moves[first:last]) + 1
+        scores = move_scores(
+            move_counts, spare_times[first:last], durations[first:last], travel_table
+        )
+
+        for j, score in enumerate(scores.tolist(), first):
+            heapq.heappush(heap, (score, j, versions[j]))
+
+    for need in cluster_need:
+        last_note = min(need[0], note_count)
+        direction = int(math.copysign(1, need[1]))
+
+        if pushed < last_note:
+            push_scores(pushed, last_note)
+            pushed = last_note
+
+        for _ in range(abs(need[1])):
+            later_entries: list[tuple[float, int, int]] = []
+
+            while heap:
+                score, j, version = heap[0]
+                if version != versions[j] or abs(cluster_freed[j]) <= steps:
+                    heapq.heappop(heap)
+                elif j >= last_note:
+                    later_entries.append(heapq.heappop(heap))
+                else:
+                    break
+
+            if not heap or heap[0][0] >= 1.0:
+                raise ValueError("Minimum score is not <1")
+
+            best_index = heap[0][1]
+            moves[best_index] += direction
+            versions[best_index] += 1
+            push_scores(best_index, best_index + 1)
+            steps += 1
+
+            for entry in later_entries:
+                heapq.heappush(heap, entry)
+
+    remaining_freed = [
+        int(math.copysign(max(abs(freed) - steps, 0), freed)) for freed in cluster_freed
+    ]
+
+    return moves, remaining_freed
+
+
+class ClusterPlanCache:
+    def __init__(self, max_plans: int = PLAN_CACHE_SIZE) -> None:
+        """
+        Plans of PlayableGroupClusters keyed by everything allocate_moves reads. Repeated
+        passages give the same key and are only planned once. The needs and freed
+        distances are relative so a transposed passage shares a plan whenever the key
+        layout gives it the same needs, while a transposition that changes them can never
+        reuse a wrong plan. Durations and spare times are kept exact, so a plan never
+        depends on which passages were planned before it.
+
+        param max_plans: The number of plans kept. The least recently used plan is
+                         dropped when a new one is stored past this.
+        """
+        self.plans: OrderedDict[tuple, tuple[tuple[int, ...], tuple[int, ...]]] = (
+            OrderedDict()
+        )
+        """The (moves, remaining freed) plan of each key, least recently used first."""
+        self.max_plans = max_plans
+        self.hits = 0
+        """The number of clusters that reused a plan instead of being planned."""
+        self.misses = 0
+        """The number of plans that had to be made and stored."""
+
+    def cluster_key(
+        self, cluster: PlayableGroupCluster, travel_table: TravelTable
+    ) -> tuple:
+        """
+        Build the canonical signature of a cluster whose cluster_playable is set.
+
+        param cluster: The PlayableGroupCluster to sign.
+        param travel_table: The TravelTable the cluster will be planned with.
+
+        return: A hashable tuple. Equal tuples always give equal plans.
+        """
+        return (
+            tuple(tuple(need) for need in cluster.cluster_need),
+            tuple(cluster.cluster_freed),
+            cluster.durations.astype(numpy.int64).tobytes(),
+            cluster.spare_times.astype(numpy.int64).tobytes(),
+            travel_table.profile,
+        )
+
+    def store(self, key: tuple, plan: tuple[list[int], list[int]]) -> None:
+        moves, cluster_freed = plan
+        self.plans[key] = (tuple(moves), tuple(cluster_freed))
+        self.plans.move_to_end(key)
+        self.misses += 1
+
+        if len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+
+    def plan(self, key: tuple) -> tuple[list[int], list[int]]:
+        """
+        Get a stored plan.
+
+        param key: A key from cluster_key that has been stored.
+
+        return: New lists of the moves and the remaining freed distances.
+        """
+        self.plans.move_to_end(key)
+        moves, cluster_freed = self.plans[key]
+        return list(moves), list(cluster_freed)
+
+    def copy(self) -> ClusterPlanCache:
+        """
+        A cache with the same plans and no counts, to plan with in another process and
+        then merge back.
+        """
+        plan_cache = ClusterPlanCache(self.max_plans)
+        plan_cache.plans = self.plans.copy()
+        return plan_cache
+
+    def merge(self, other: ClusterPlanCache) -> None:
+        """
+        Add the plans and counts of a cache made by copy.
+
+        param other: The copy, after it was planned with.
+        """
+        for key, plan in other.plans.items():
+            self.plans[key] = plan
+            self.plans.move_to_end(key)
+
+        while len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+
+        self.hits += other.hits
+        self.misses += other.misses
 
-                if min(scores) >= 1.0:
-                    raise ValueError("Minimum score is not <1")
-                best_index = min(range(len(scores)), key=scores.__getitem__)
-                self.moves[best_index] += int(math.copysign(1, need[1]))
-                self.cluster_freed = move_closer_to_zero(self.cluster_freed)
-                scores = [1.0] * len(self.cluster_playable)
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.plans
 
 
 if __name__ == "__main__":
@@ -1113,11 +1516,11 @@ if __name__ == "__main__":
 
     note_list.find_groups()
     note_list.find_clusters()
-    note_list.find_moves(KEYWIDTH, constants.max_acceleration, constants.max_velocity)
+    note_list.find_moves(23.2, constants.max_acceleration, constants.max_velocity)
     note_list.find_locations()
     note_list.find_time_losses()
 
-    for i, item in enumerate(note_list.playable_list):
+    for i, item in enumerate(note_list):
         print(
             f"{i}\nPosition: {item.position} \nNotes: {item.midi_pitches}\nTime Loss: {item.time_loss}\n"
         )
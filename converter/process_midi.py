@@ -0,0 +1,195 @@
+"""
+Direct midi ingestion. Every track is read in a single time ordered pass and note_on,
+note_off and set_tempo messages are turned straight into PlayableNotes with integer
+microsecond timing.
+"""
+
+from __future__ import annotations
+import heapq
+import warnings
+from collections.abc import Iterator
+from operator import itemgetter
+
+import mido
+
+from solenoids import SolenoidIndex
+from playable import PlayableNote, PlayableNoteList, OUTSIDE_LOCATION
+
+DEFAULT_TEMPO = 500000
+"""Microseconds per beat before the first set_tempo message, as set by the midi standard."""
+DRUM_CHANNEL = 9
+"""The General MIDI percussion channel. Its note numbers are drums rather than pitches."""
+MIN_DURATION = 1000
+"""
+The shortest note in microseconds. A note_on and note_off on the same tick would
+otherwise give a note no time to play in.
+"""
+
+
+class MidiClock:
+    def __init__(self, ticks_per_beat: int) -> None:
+        """
+        Converts absolute midi ticks to microseconds while following set_tempo messages.
+        Time is kept exactly in units of 1 / ticks_per_beat microseconds and rounded once
+        per conversion, so the error never grows with the number of tempo changes.
+
+        param ticks_per_beat: The ticks_per_beat of the midi file.
+        """
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo = DEFAULT_TEMPO
+        """The current tempo in microseconds per beat."""
+        self.base_tick = 0
+        """The tick of the last tempo change."""
+        self.base_scaled = 0
+        """The time of base_tick in units of 1 / ticks_per_beat microseconds."""
+
+    def set_tempo(self, tick: int, tempo: int) -> None:
+        self.base_scaled += (tick - self.base_tick) * self.tempo
+        self.base_tick = tick
+        self.tempo = tempo
+
+    def tick_us(self, tick: int) -> int:
+        """
+        Convert an absolute tick at or after the last tempo change to microseconds.
+
+        param tick: An integer value of midi ticks from the start of the file.
+
+        return: An integer value of microseconds from the start of the file.
+        """
+        scaled = self.base_scaled + (tick - self.base_tick) * self.tempo
+
+        return (2 * scaled + self.ticks_per_beat) // (2 * self.ticks_per_beat)
+
+
+def iter_track(track: mido.MidiTrack, index: int) -> Iterator[tuple]:
+    tick = 0
+    for message in track:
+        tick += message.time
+        yield (tick, index, message)
+
+
+def iter_messages(midi_file: mido.MidiFile) -> Iterator[tuple]:
+    """
+    Merge every track of a midi file into a single stream ordered by absolute tick.
+    Messages at the same tick keep their track order.
+
+    param midi_file: A mido MidiFile.
+
+    return: An iterator of (tick, track index, message) tuples.
+    """
+    track_iterators = [iter_track(track, i) for i, track in enumerate(midi_file.tracks)]
+
+    return heapq.merge(*track_iterators, key=itemgetter(0, 1))
+
+
+def midi_note_list(
+    key_map: SolenoidIndex,
+    file: str,
+    tracks: set[int] | None = None,
+    channels: set[int] | None = None,
+) -> PlayableNoteList:
+    """
+    Read a midi file into a PlayableNoteList. Notes that start on the same tick are
+    combined into a chord with the velocity of the first note and a duration that lasts
+    until the last of its keys is released. Keys that are never released are held until
+    the end of the file. A note that is still held when the next note starts is cut
+    short at that point since a hand plays a single chord at a time. A key that is
+    pressed again before it is released ends its earlier note there. Every note lasts
+    at least MIN_DURATION unless the next note starts sooner. Chord notes that do not
+    fit in the hand span of their chord are dropped with a warning.
+
+    param key_map: A SolenoidIndex object that holds the mapping between midi pitch, key
+                   location, and valid hand positions for a giving pitch.
+    param file: The path to the midi file.
+    param tracks: The indexes of the tracks to read notes from or None for every track.
+                  Tempo changes are read from every track.
+    param channels: The channels to read notes from or None for every channel except
+                    the percussion channel.
+
+    return: A PlayableNoteList of every playable note in the selected tracks and channels.
+    """
+    midi_file = mido.MidiFile(file)
+    clock = MidiClock(midi_file.ticks_per_beat)
+    note_list = PlayableNoteList(key_map, None)
+
+    chord_tick = -1
+    sounding: dict[tuple[int, int], PlayableNote] = {}
+    end_tick = 0
+    dropped = 0
+
+    for tick, track_index, message in iter_messages(midi_file):
+        end_tick = tick
+
+        if message.type == "set_tempo":
+            clock.set_tempo(tick, message.tempo)
+            continue
+
+        if message.type not in ("note_on", "note_off"):
+            continue
+        if tracks is not None and track_index not in tracks:
+            continue
+        if channels is None and message.channel == DRUM_CHANNEL:
+            continue
+        if channels is not None and message.channel not in channels:
+            continue
+
+        current_us = clock.tick_us(tick)
+        key = (message.channel, message.note)
+
+        if message.type == "note_on" and message.velocity > 0:
+            if key_map.index_list[message.note] is None:
+                continue
+
+            if key in sounding:
+                retriggered = sounding.pop(key)
+                retriggered.duration = max(
+                    retriggered.duration, current_us - retriggered.note_start
+                )
+
+            if tick == chord_tick:
+                playable = note_list[-1]
+                if playable.add_pitch(message.note) == OUTSIDE_LOCATION:
+                    dropped += 1
+                    continue
+            else:
+                playable = note_list.add_note(
+                    current_us, 0, message.note, message.velocity
+                )
+                chord_tick = tick
+
+            sounding[key] = playable
+
+        elif key in sounding:
+            playable = sounding.pop(key)
+            playable.duration = max(playable.duration, current_us - playable.note_start)
+
+    end_us = clock.tick_us(end_tick)
+
+    for playable in sounding.values():
+        playable.duration = max(playable.duration, end_us - playable.note_start)
+
+    for playable in note_list:
+        playable.duration = max(playable.duration, MIN_DURATION)
+        if playable.next_delay and playable.duration > playable.next_delay:
+            playable.duration = playable.next_delay
+
+    if dropped:
+        warnings.warn(
+            f"{file}: {dropped} chord notes do not fit in the hand span of their "
+            "chord and were dropped"
+        )
+
+    return note_list
+
+
+if __name__ == "__main__":
+    import sys
+    from constants import Constants
+
+    constants = Constants()
+
+    key_map = SolenoidIndex(88, constants.first_88_key)
+
+    note_list = midi_note_list(key_map, sys.argv[1])
+
+    print(note_list)
@@ -14,64 +14,323 @@ from generated.musicxml import (
     Attributes,
     WedgeType,
     Pitch,
+    Rest,
 )
 from xsdata.formats.dataclass.parsers import XmlParser
 from decimal import Decimal
 from operator import itemgetter
+from bisect import bisect_right
+from fractions import Fraction
+
+US_PER_MINUTE = 60000000
 
 
 class TaggedNote:
-    def __init__(self, note: Note, tick: Decimal):
-        self.note = note
+    def __init__(
+        self,
+        tick: Decimal,
+        duration: Decimal,
+        staff: int | None,
+        pitch: tuple[str, int, Decimal] | None,
+        chord: bool,
+        measure: str | None = None,
+    ):
+        """
+        The parts of a musicxml note needed to play it, tagged with its start tick.
+
+        param tick: A Decimal value of musicxml ticks from the start of the part.
+        param duration: A Decimal value of musicxml ticks the note advances the part by.
+        param staff: An integer for the staff the note is on or None if not given.
+        param pitch: A (step, octave, alter) tuple or None if the note is a rest.
+        param chord: True if the note is played with the previous note.
+        param measure: The number of the measure the note is in as written in the
+                       musicxml file or None if not known.
+        """
         self.tick = tick
+        self.duration = duration
+        self.staff = staff
+        self.pitch = pitch
+        self.chord = chord
+        self.measure = measure
+
+    def is_rest(self) -> bool:
+        return self.pitch is None
+
+
+def ramp_value(ramp: tuple[Decimal], tick: Decimal) -> Decimal:
+    """
+    Evaluate a linear ramp at a given tick.
+
+    param ramp: A (start_tick, end_tick, start_value, end_value) tuple.
+    param tick: A Decimal value of musicxml ticks inside the ramp.
+
+    return: A Decimal value linearly interpolated between the ramp start and end values.
+    """
+    start_tick, end_tick, start_value, end_value = ramp
+    progress = Decimal(tick - start_tick) / Decimal(end_tick - start_tick)
+
+    return start_value + progress * (end_value - start_value)
+
+
+def find_ramp(
+    ramp_list: list[tuple[Decimal]], ramp_ticks: list[Decimal], tick: Decimal
+) -> tuple[Decimal] | None:
+    """
+    Find the ramp in a list sorted by start tick that covers a given tick.
+
+    param ramp_list: A list of (start_tick, end_tick, start_value, end_value) tuples.
+    param ramp_ticks: The start tick of each ramp in ramp_list.
+    param tick: A Decimal value of musicxml ticks from the start of the piece.
+
+    return: The last ramp that starts at or before tick and ends after it, or None.
+    """
+    index = bisect_right(ramp_ticks, tick) - 1
+
+    if index >= 0 and tick < ramp_list[index][1]:
+        return ramp_list[index]
+
+    return None
 
 
 class TempoList:
     def __init__(self):
         self.tempo_list: list[tuple[Decimal]] = []
+        """Every (tempo, tick) pair kept sorted by tick."""
+        self.tick_list: list[Decimal] = []
+        """The tick of each entry in tempo_list so lookups can be bisected."""
+        self.ramp_list: list[tuple[Decimal]] = []
+        """
+        Every accel. and rit. as a (start_tick, end_tick, start_tempo, end_tempo) tuple
+        kept sorted by start tick. The tempo changes linearly between the two ticks.
+        """
+        self.ramp_ticks: list[Decimal] = []
+        """The start tick of each entry in ramp_list so lookups can be bisected."""
+        self.elapsed_list: list[Fraction] = []
+        """
+        The sum of ticks / tempo from tick zero up to each entry in tempo_list.
+        Multiplying by US_PER_MINUTE / divisions converts this to microseconds.
+        """
+        self.elapsed_valid: bool = True
+        """False when an entry has been added since elapsed_list was last built."""
 
     def append(self, tempo: Decimal, tick: Decimal) -> None:
-        self.tempo_list.append((tempo, tick))
+        index = bisect_right(self.tick_list, tick)
+        self.tempo_list.insert(index, (tempo, tick))
+        self.tick_list.insert(index, tick)
+        self.elapsed_valid = False
+
+    def append_ramp(
+        self,
+        start_tempo: Decimal,
+        end_tempo: Decimal,
+        start_tick: Decimal,
+        end_tick: Decimal,
+    ) -> None:
+        """
+        Add a linear change in tempo. The end tempo stays in effect after end_tick until
+        the next entry.
+
+        param start_tempo: A Decimal value of the tempo at start_tick.
+        param end_tempo: A Decimal value of the tempo at end_tick.
+        param start_tick: A Decimal value of musicxml ticks where the change starts.
+        param end_tick: A Decimal value of musicxml ticks where the change ends.
+        """
+        self.append(start_tempo, start_tick)
+        self.append(end_tempo, end_tick)
+
+        if end_tick > start_tick:
+            ramp = (start_tick, end_tick, Decimal(start_tempo), Decimal(end_tempo))
+            index = bisect_right(self.ramp_ticks, start_tick)
+            self.ramp_list.insert(index, ramp)
+            self.ramp_ticks.insert(index, start_tick)
+
+    def tick_index(self, tick: Decimal) -> int:
+        """
+        Find the index of the entry that is in effect at a given tick. Ticks before the
+        first entry use the first entry.
+
+        param tick: A Decimal value of musicxml ticks from the start of the piece.
+
+        return: An integer index into tempo_list.
+        """
+        return max(bisect_right(self.tick_list, tick) - 1, 0)
 
     def tempo_at_tick(self, tick: Decimal) -> Decimal:
-        tick_index = len([i for i in self.tempo_list if i[1] <= tick]) - 1
+        ramp = find_ramp(self.ramp_list, self.ramp_ticks, tick)
 
-        self.sort()
+        if ramp is not None:
+            return ramp_value(ramp, tick)
+
+        return self.tempo_list[self.tick_index(tick)][0]
+
+    def span_elapsed(self, index: int, end_tick: Decimal) -> Fraction:
+        """
+        Find the sum of ticks / tempo from the entry at index up to end_tick. Inside a
+        ramp this is the closed form integral of 1 / tempo.
+
+        param index: An integer index into tempo_list.
+        param end_tick: A Decimal value of musicxml ticks no later than the next entry.
+
+        return: A Fraction of ticks / tempo.
+        """
+        tempo, tick = self.tempo_list[index]
+        ramp = find_ramp(self.ramp_list, self.ramp_ticks, tick)
+
+        if ramp is None or end_tick < tick:
+            return Fraction(end_tick - tick) / Fraction(tempo)
+
+        start_tick, ramp_end_tick, start_tempo, ramp_end_tempo = ramp
+        slope = (ramp_end_tempo - start_tempo) / Decimal(ramp_end_tick - start_tick)
+
+        if slope == 0:
+            return Fraction(end_tick - tick) / Fraction(start_tempo)
+
+        tempo_ratio = ramp_value(ramp, end_tick) / ramp_value(ramp, tick)
+
+        return Fraction(tempo_ratio.ln() / slope)
+
+    def update_elapsed(self) -> None:
+        """Rebuild elapsed_list from tempo_list."""
+        self.elapsed_list = []
+        elapsed = Fraction(0)
+
+        for i, (_, tick) in enumerate(self.tempo_list):
+            if i != 0:
+                elapsed += self.span_elapsed(i - 1, tick)
+            self.elapsed_list.append(elapsed)
+
+        self.elapsed_valid = True
+
+    def elapsed_at_tick(self, tick: Decimal) -> Fraction:
+        """
+        Find the sum of ticks / tempo from tick zero up to the given tick. This is exact
+        outside of ramps.
+
+        param tick: A Decimal value of musicxml ticks from the start of the piece.
 
-        result = self.tempo_list[tick_index][0]
+        return: A Fraction that converts to microseconds when multiplied by
+        US_PER_MINUTE / divisions.
+        """
+        if not self.elapsed_valid:
+            self.update_elapsed()
 
-        return result
+        index = self.tick_index(tick)
+
+        return self.elapsed_list[index] + self.span_elapsed(index, tick)
+
+    def tick_us(self, tick: Decimal, divisions: Decimal) -> Fraction:
+        """
+        Convert a tick to microseconds from tick zero. The time is exact outside of
+        ramps and correct to 28 significant digits inside them. It is not rounded here,
+        so sums and differences of these times stay exact until they are rounded once
+        where a time is stored.
+
+        param tick: A Decimal value of musicxml ticks from the start of the piece.
+        param divisions: A Decimal value of musicxml ticks per quarter note.
+
+        return: A Fraction of microseconds from tick zero.
+        """
+        elapsed = self.elapsed_at_tick(tick)
+
+        return elapsed * US_PER_MINUTE / Fraction(divisions)
+
+    def tick_time(
+        self, start_tick: Decimal, end_tick: Decimal, divisions: Decimal
+    ) -> Fraction:
+        """
+        Convert a range of ticks to microseconds.
+
+        param start_tick: A Decimal value of musicxml ticks where the range starts.
+        param end_tick: A Decimal value of musicxml ticks where the range ends.
+        param divisions: A Decimal value of musicxml ticks per quarter note.
+
+        return: A Fraction of microseconds between start_tick and end_tick.
+        """
+        end_us = self.tick_us(end_tick, divisions)
+
+        return end_us - self.tick_us(start_tick, divisions)
 
     def sort(self) -> None:
         self.tempo_list.sort(key=itemgetter(1))
+        self.tick_list = [item[1] for item in self.tempo_list]
+        self.ramp_list.sort(key=itemgetter(0))
+        self.ramp_ticks = [item[0] for item in self.ramp_list]
+        self.elapsed_valid = False
 
     def combine(self, list_tempos: TempoList) -> None:
         temp_list = self.tempo_list + list_tempos.tempo_list
         self.tempo_list = list(dict.fromkeys(temp_list))
+        temp_ramps = self.ramp_list + list_tempos.ramp_list
+        self.ramp_list = list(dict.fromkeys(temp_ramps))
+        self.sort()
 
 
 class DynamicList:
     def __init__(self):
         self.dynamic_list: list[tuple[Decimal]] = []
+        """Every (dynamic, tick) pair kept sorted by tick."""
+        self.tick_list: list[Decimal] = []
+        """The tick of each entry in dynamic_list so lookups can be bisected."""
+        self.ramp_list: list[tuple[Decimal]] = []
+        """
+        Every crescendo and diminuendo as a (start_tick, end_tick, start_dynamic,
+        end_dynamic) tuple kept sorted by start tick.
+        """
+        self.ramp_ticks: list[Decimal] = []
+        """The start tick of each entry in ramp_list so lookups can be bisected."""
 
     def append(self, dynamic: Decimal, tick: Decimal) -> None:
-        self.dynamic_list.append((dynamic, tick))
+        index = bisect_right(self.tick_list, tick)
+        self.dynamic_list.insert(index, (dynamic, tick))
+        self.tick_list.insert(index, tick)
+
+    def append_ramp(
+        self,
+        start_dynamic: Decimal,
+        end_dynamic: Decimal,
+        start_tick: Decimal,
+        end_tick: Decimal,
+    ) -> None:
+        """
+        Add a linear change in dynamic. The end dynamic stays in effect after end_tick
+        until the next entry.
+
+        param start_dynamic: A Decimal value of the dynamic at start_tick.
+        param end_dynamic: A Decimal value of the dynamic at end_tick.
+        param start_tick: A Decimal value of musicxml ticks where the change starts.
+        param end_tick: A Decimal value of musicxml ticks where the change ends.
+        """
+        self.append(start_dynamic, start_tick)
+        self.append(end_dynamic, end_tick)
+
+        if end_tick > start_tick:
+            ramp = (start_tick, end_tick, Decimal(start_dynamic), Decimal(end_dynamic))
+            index = bisect_right(self.ramp_ticks, start_tick)
+            self.ramp_list.insert(index, ramp)
+            self.ramp_ticks.insert(index, start_tick)
 
     def dynamic_at_tick(self, tick: Decimal) -> Decimal:
-        tick_index = len([i for i in self.dynamic_list if i[1] <= tick]) - 1
+        ramp = find_ramp(self.ramp_list, self.ramp_ticks, tick)
 
-        self.sort()
+        if ramp is not None:
+            return ramp_value(ramp, tick)
 
-        result = self.dynamic_list[tick_index][0]
+        tick_index = max(bisect_right(self.tick_list, tick) - 1, 0)
 
-        return result
+        return self.dynamic_list[tick_index][0]
 
     def sort(self) -> None:
         self.dynamic_list.sort(key=itemgetter(1))
+        self.tick_list = [item[1] for item in self.dynamic_list]
+        self.ramp_list.sort(key=itemgetter(0))
+        self.ramp_ticks = [item[0] for item in self.ramp_list]
 
     def combine(self, list_tempos: DynamicList) -> None:
         temp_list = self.dynamic_list + list_tempos.dynamic_list
         self.dynamic_list = list(dict.fromkeys(temp_list))
+        temp_ramps = self.ramp_list + list_tempos.ramp_list
+        self.ramp_list = list(dict.fromkeys(temp_ramps))
+        self.sort()
 
 
 def extract_direction_tempo(
@@ -105,13 +364,25 @@ def extract_tempo(tick_tagged_list: list[tuple]) -> TempoList:
                         if choice.type_value == StartStopContinue.STOP:
                             variation_list.append(("stop", element[1]))
 
+    apply_tempo_variations(tempo_list, variation_list)
+
+    return tempo_list
+
+
+def apply_tempo_variations(tempo_list: TempoList, variation_list: list[tuple]) -> None:
+    """
+    Add a ramp to the tempo_list for each accel. or rit. in the variation_list.
+
+    param tempo_list: A TempoList containing every tempo marking of a part.
+    param variation_list: A list of (words, tick) pairs where every start word is
+    followed by its ("stop", tick) pair.
+    """
     for i in range(0, int(len(variation_list) / 2)):
         variation_start = variation_list.pop(0)
         variation_end = variation_list.pop(0)
         variation_type = variation_start[0]
         variation_start_tick = variation_start[1]
         variation_stop_tick = variation_end[1]
-        variation_duration = variation_stop_tick - variation_start_tick
 
         start_tempo = tempo_list.tempo_at_tick(variation_start_tick)
 
@@ -120,17 +391,14 @@ def extract_tempo(tick_tagged_list: list[tuple]) -> TempoList:
         if variation_type == "accel.":
             if start_tempo == stop_tempo:
                 stop_tempo = Decimal(round((stop_tempo * 4 / 3)))
-            tempo_difference = stop_tempo - start_tempo
 
         elif variation_type == "rit.":
             if start_tempo == stop_tempo:
                 stop_tempo = Decimal(round((stop_tempo * 3 / 4)))
-            tempo_difference = stop_tempo - start_tempo
-        for i in range(0, int(variation_duration) + 1):
-            tempo = round((i / (variation_duration)) * tempo_difference) + start_tempo
-            tempo_list.append(tempo, variation_start_tick + i)
 
-    return tempo_list
+        tempo_list.append_ramp(
+            start_tempo, stop_tempo, variation_start_tick, variation_stop_tick
+        )
 
 
 def extract_direction_dynamic(
@@ -159,13 +427,28 @@ def extract_dynamics(tick_tagged_list: list[tuple]) -> DynamicList:
                     if isinstance(choice, Wedge):
                         variation_list.append((choice.type_value, element[1]))
 
+    apply_dynamic_variations(dynamic_list, variation_list)
+
+    return dynamic_list
+
+
+def apply_dynamic_variations(
+    dynamic_list: DynamicList, variation_list: list[tuple]
+) -> None:
+    """
+    Add a ramp to the dynamic_list for each crescendo or diminuendo in the
+    variation_list.
+
+    param dynamic_list: A DynamicList containing every dynamic marking of a part.
+    param variation_list: A list of (WedgeType, tick) pairs where every start wedge is
+    followed by its stop wedge.
+    """
     for i in range(0, int(len(variation_list) / 2)):
         variation_start = variation_list.pop(0)
         variation_end = variation_list.pop(0)
         variation_type = variation_start[0]
         variation_start_tick = variation_start[1]
         variation_stop_tick = variation_end[1]
-        variation_duration = variation_stop_tick - variation_start_tick
 
         start_dynamic = dynamic_list.dynamic_at_tick(variation_start_tick)
 
@@ -174,19 +457,14 @@ def extract_dynamics(tick_tagged_list: list[tuple]) -> DynamicList:
         if variation_type == WedgeType.CRESCENDO:
             if start_dynamic == stop_dynamic:
                 stop_dynamic = Decimal(round((stop_dynamic * 4 / 3)))
-            dynamic_difference = stop_dynamic - start_dynamic
 
         elif variation_type == WedgeType.DIMINUENDO:
             if start_dynamic == stop_dynamic:
                 stop_dynamic = Decimal(round((stop_dynamic * 3 / 4)))
-            dynamic_difference = stop_dynamic - start_dynamic
-        for i in range(0, int(variation_duration) + 1):
-            tempo = (
-                round((i / (variation_duration)) * dynamic_difference) + start_dynamic
-            )
-            dynamic_list.append(tempo, variation_start_tick + i)
 
-    return dynamic_list
+        dynamic_list.append_ramp(
+            start_dynamic, stop_dynamic, variation_start_tick, variation_stop_tick
+        )
 
 
 def tick_tag_note(note: Note) -> Decimal:
@@ -212,7 +490,7 @@ def tick_tag_measure(
     current_tick = measure_tick
 
     for element in measure.choice:
-        result_list.append((element, current_tick))
+        result_list.append((element, current_tick, measure.number))
 
         if isinstance(element, Note):
             current_tick += tick_tag_note(element)
@@ -253,8 +531,112 @@ def extract_pitch(note: Note) -> tuple[str, int, Decimal]:
     raise ValueError("Note does not contain pitch")
 
 
-class MusicPiece:
+def tag_note(note: Note, tick: Decimal, measure: str | None = None) -> TaggedNote:
+    """
+    Convert a musicxml note to a TaggedNote.
+
+    param note: A Note from the musicxml tree.
+    param tick: A Decimal value of musicxml ticks from the start of the part.
+    param measure: The number of the measure the note is in.
+
+    return: A TaggedNote holding the parts of the note needed to play it.
+    """
+    if any(isinstance(x, Rest) for x in note.choice):
+        pitch = None
+    else:
+        pitch = extract_pitch(note)
+
+    chord = any(isinstance(x, Note.Chord) for x in note.choice)
+
+    return TaggedNote(tick, tick_tag_note(note), note.staff, pitch, chord, measure)
+
+
+class PartIndex:
+    def __init__(self, divisions: Decimal, dynamic_list: DynamicList) -> None:
+        """
+        Everything PlayableNoteList needs from a single part.
+
+        param divisions: A Decimal value of musicxml ticks per quarter note.
+        param dynamic_list: The DynamicList of the part.
+        """
+        self.divisions = divisions
+        """A Decimal value of musicxml ticks per quarter note."""
+        self.dynamic_list = dynamic_list
+        """The DynamicList of the part."""
+        self.notes: list[TaggedNote] = []
+        """Every TaggedNote of the part in document order."""
+        self.staff_notes: dict[int | None, list[TaggedNote]] = {}
+        """Every TaggedNote of the part keyed by staff."""
+
+    def append(self, tagged_note: TaggedNote) -> None:
+        self.notes.append(tagged_note)
+        self.staff_notes.setdefault(tagged_note.staff, []).append(tagged_note)
+
+    def extend(self, tagged_notes: list[TaggedNote]) -> None:
+        for tagged_note in tagged_notes:
+            self.append(tagged_note)
+
+
+def index_part(tagged_part: list[tuple]) -> PartIndex:
+    """
+    Build the PartIndex of a tick tagged part.
+
+    param tagged_part: A list of (element, tick, measure number) tuples from
+                       tick_tag_part.
+
+    return: A PartIndex of the part.
+    """
+    divisions: Decimal = 0
+    tagged_notes: list[TaggedNote] = []
+
+    for item in tagged_part:
+        if isinstance(item[0], Note):
+            tagged_notes.append(tag_note(item[0], item[1], item[2]))
+
+        elif isinstance(item[0], Attributes):
+            if item[0].divisions:
+                divisions = item[0].divisions
+
+    dynamic_list = DynamicList()
+    dynamic_list.combine(extract_dynamics(tagged_part))
+
+    part_index = PartIndex(divisions, dynamic_list)
+    part_index.extend(tagged_notes)
+
+    return part_index
+
+
+class IndexedPiece:
+    """
+    The queries PlayableNoteList makes of a piece. Subclasses fill part_index and
+    tempo_list once so every query is a dictionary lookup.
+    """
+
+    def __init__(self) -> None:
+        self.parts_list: list[ScorePart] = []
+        """Every score-part in the part-list."""
+        self.part_index: dict[str, PartIndex] = {}
+        """The PartIndex of each part keyed by part id."""
+        self.tempo_list = TempoList()
+        """The combined TempoList of every part."""
+
+    def find_dynamic_list(self, score_part: ScorePart) -> DynamicList:
+        return self.part_index[score_part.id].dynamic_list
+
+    def part_notes(self, score_part: ScorePart) -> list[TaggedNote]:
+        return self.part_index[score_part.id].notes
+
+    def tick_tag_notes(self, score_part: ScorePart, staff: int) -> list[TaggedNote]:
+        return self.part_index[score_part.id].staff_notes.get(staff, [])
+
+    def part_divisions(self, score_part: ScorePart) -> Decimal:
+        return self.part_index[score_part.id].divisions
+
+
+class MusicPiece(IndexedPiece):
     def __init__(self, file: str) -> None:
+        super().__init__()
+
         parser = XmlParser()
 
         self.music_piece = parser.parse(file, ScorePartwise)
@@ -266,6 +648,9 @@ class MusicPiece:
 
         self.tempo_list = self.find_tempo_list()
 
+        for i, part in enumerate(self.parts):
+            self.part_index[part.id] = index_part(self.tagged_parts[i])
+
     def find_part_list(self) -> list[ScorePart]:
         mixed_list = self.music_piece.part_list.part_group_or_score_part
 
@@ -291,57 +676,6 @@ class MusicPiece:
 
         return temp_list
 
-    def find_dynamic_list(self, score_part: ScorePart) -> DynamicList:
-        temp_list = DynamicList()
-
-        part_index = 0
-
-        for i, part in enumerate(self.parts):
-            if part.id == score_part.id:
-                part_index = i
-
-        tagged_part = self.tagged_parts[part_index]
-
-        temp_list.combine(extract_dynamics(tagged_part))
-
-        return temp_list
-
-    def tick_tag_notes(self, score_part: ScorePart, staff: int) -> list[TaggedNote]:
-        tagged_note_list: list[TaggedNote] = []
-
-        part_index = 0
-
-        for i, part in enumerate(self.parts):
-            if part.id == score_part.id:
-                part_index = i
-
-        tagged_part = self.tagged_parts[part_index]
-
-        for item in tagged_part:
-            if isinstance(item[0], Note):
-                if item[0].staff == staff:
-                    tagged_note = TaggedNote(item[0], item[1])
-                    tagged_note_list.append(tagged_note)
-
-        return tagged_note_list
-
-    def part_divisions(self, score_part: ScorePart) -> Decimal:
-        part_index = 0
-        divisions: Decimal = 0
-
-        for i, part in enumerate(self.parts):
-            if part.id == score_part.id:
-                part_index = i
-
-        tagged_part = self.tagged_parts[part_index]
-
-        for item in tagged_part:
-            if isinstance(item[0], Attributes):
-                if item[0].divisions:
-                    divisions = item[0].divisions
-
-        return divisions
-
 
 if __name__ == "__main__":
     import os
@@ -0,0 +1,298 @@
+"""
+On disk cache of tick tagged pieces. Each entry is a numpy .npz file named by the hash
+of the musicxml file contents and CONVERTER_VERSION, so an edited file or a new
+converter version never reads a stale entry. An entry that can not be read is deleted
+and the file is read again.
+
+Ticks, tempos and dynamics are stored as float64 and turned back into Decimals on load.
+This round trip is lossy: a value with more than 15 significant digits comes back
+rounded to the nearest float64.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import zipfile
+from decimal import Decimal
+
+import numpy
+
+from constants import CONVERTER_VERSION
+from procsss_xml import IndexedPiece, MusicPiece, PartIndex, TaggedNote, DynamicList
+from stream_xml import StreamedPiece, StreamPart
+
+NOTE_DTYPE = numpy.dtype(
+    [
+        ("tick", "f8"),
+        ("duration", "f8"),
+        ("staff", "i2"),
+        ("step", "S1"),
+        ("octave", "i1"),
+        ("alter", "f8"),
+        ("chord", "?"),
+        ("measure", "i4"),
+    ]
+)
+"""
+A single TaggedNote. A staff of 0 means no staff and an empty step means a rest. The
+measure is an index into the measure labels of the part, or -1 if it is not known.
+"""
+
+MARK_DTYPE = numpy.dtype([("value", "f8"), ("tick", "f8")])
+"""A single (value, tick) entry of a TempoList or DynamicList."""
+
+RAMP_DTYPE = numpy.dtype(
+    [
+        ("start_tick", "f8"),
+        ("end_tick", "f8"),
+        ("start_value", "f8"),
+        ("end_value", "f8"),
+    ]
+)
+"""A single ramp of a TempoList or DynamicList."""
+
+
+def to_decimal(value: float) -> Decimal:
+    """
+    Convert a stored float back to a Decimal through its shortest repr. This gives back
+    the Decimal that was stored when it has at most 15 significant digits, as musicxml
+    values usually do, and the nearest float64 value otherwise.
+    """
+    if value.is_integer():
+        return Decimal(int(value))
+
+    return Decimal(repr(value))
+
+
+def file_hash(file: str) -> str:
+    """
+    Hash the contents of a file together with the converter version.
+
+    param file: The path to the file.
+
+    return: A hex string that changes if either the file or CONVERTER_VERSION change.
+    """
+    digest = hashlib.sha256(CONVERTER_VERSION.encode())
+
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def part_name(score_part: StreamPart) -> str:
+    if isinstance(score_part, StreamPart):
+        return score_part.name
+    elif score_part.part_name is None:
+        return ""
+    else:
+        return score_part.part_name.value
+
+
+def pack_notes(notes: list[TaggedNote]) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Pack the notes of a part into a NOTE_DTYPE table and an array of the distinct
+    measure labels the table indexes. The label array is as wide as the longest label.
+    """
+    table = numpy.zeros(len(notes), dtype=NOTE_DTYPE)
+    measures: dict[str, int] = {}
+
+    for i, note in enumerate(notes):
+        if note.measure is None:
+            measure = -1
+        else:
+            measure = measures.setdefault(note.measure, len(measures))
+
+        step, octave, alter = note.pitch or ("", 0, 0)
+        table[i] = (
+            note.tick,
+            note.duration,
+            note.staff or 0,
+            step.encode(),
+            octave,
+            alter,
+            note.chord,
+            measure,
+        )
+
+    return table, numpy.array(list(measures), dtype=str)
+
+
+def unpack_notes(table: numpy.ndarray, labels: numpy.ndarray) -> list[TaggedNote]:
+    notes: list[TaggedNote] = []
+    measures: list[str] = labels.tolist()
+
+    for row in table.tolist():
+        tick, duration, staff, step, octave, alter, chord, measure = row
+
+        if step:
+            pitch = (step.decode(), octave, to_decimal(alter))
+        else:
+            pitch = None
+
+        notes.append(
+            TaggedNote(
+                to_decimal(tick),
+                to_decimal(duration),
+                staff or None,
+                pitch,
+                chord,
+                None if measure < 0 else measures[measure],
+            )
+        )
+
+    return notes
+
+
+def pack_marks(marks: list[tuple[Decimal]]) -> numpy.ndarray:
+    return numpy.array([tuple(mark) for mark in marks], dtype=MARK_DTYPE)
+
+
+def pack_ramps(ramps: list[tuple[Decimal]]) -> numpy.ndarray:
+    return numpy.array([tuple(ramp) for ramp in ramps], dtype=RAMP_DTYPE)
+
+
+def unpack_rows(table: numpy.ndarray) -> list[tuple[Decimal]]:
+    return [tuple(to_decimal(value) for value in row) for row in table.tolist()]
+
+
+class CachedPiece(IndexedPiece):
+    def __init__(self, tables: dict[str, numpy.ndarray]) -> None:
+        """
+        A piece loaded from a ScoreCache entry. This offers the same queries as
+        MusicPiece and StreamedPiece.
+
+        param tables: The arrays of a ScoreCache entry keyed by name.
+        """
+        super().__init__()
+
+        part_ids = tables["part_ids"].tolist()
+        part_names = tables["part_names"].tolist()
+        divisions = tables["divisions"].tolist()
+
+        for i, part_id in enumerate(part_ids):
+            self.parts_list.append(StreamPart(part_id, part_names[i]))
+
+            dynamic_list = DynamicList()
+            dynamic_list.dynamic_list = unpack_rows(tables[f"dynamics_{i}"])
+            dynamic_list.ramp_list = unpack_rows(tables[f"dynamic_ramps_{i}"])
+            dynamic_list.sort()
+
+            part_index = PartIndex(to_decimal(divisions[i]), dynamic_list)
+            part_index.extend(
+                unpack_notes(tables[f"notes_{i}"], tables[f"measures_{i}"])
+            )
+            self.part_index[part_id] = part_index
+
+        self.tempo_list.tempo_list = unpack_rows(tables["tempos"])
+        self.tempo_list.ramp_list = unpack_rows(tables["tempo_ramps"])
+        self.tempo_list.sort()
+
+
+class ScoreCache:
+    def __init__(self, directory: str) -> None:
+        """
+        A directory of tick tagged pieces keyed by file contents.
+
+        param directory: The path of the cache directory. It is created if missing.
+        """
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_path(self, file: str) -> str:
+        return os.path.join(self.directory, f"{file_hash(file)}.npz")
+
+    def load(self, file: str) -> CachedPiece | None:
+        """
+        Load the cached piece for a musicxml file.
+
+        param file: The path to the musicxml file.
+
+        return: A CachedPiece or None if the file has not been cached or its entry can
+                not be read. An entry that can not be read is deleted.
+        """
+        path = self.entry_path(file)
+
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with numpy.load(path, allow_pickle=False) as tables:
+                return CachedPiece(tables)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            # Another process may have removed the bad entry already.
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+
+    def store(self, file: str, piece: IndexedPiece) -> None:
+        """
+        Store the tick tagged tables of a piece for a musicxml file.
+
+        param file: The path to the musicxml file the piece was read from.
+        param piece: A MusicPiece or StreamedPiece read from file.
+        """
+        tables: dict[str, numpy.ndarray] = {}
+
+        for i, score_part in enumerate(piece.parts_list):
+            notes, measures = pack_notes(piece.part_notes(score_part))
+            tables[f"notes_{i}"] = notes
+            tables[f"measures_{i}"] = measures
+
+            dynamic_list = piece.find_dynamic_list(score_part)
+            tables[f"dynamics_{i}"] = pack_marks(dynamic_list.dynamic_list)
+            tables[f"dynamic_ramps_{i}"] = pack_ramps(dynamic_list.ramp_list)
+
+        tables["part_ids"] = numpy.array([part.id for part in piece.parts_list])
+        tables["part_names"] = numpy.array([part_name(x) for x in piece.parts_list])
+        tables["divisions"] = numpy.array(
+            [float(piece.part_divisions(part)) for part in piece.parts_list]
+        )
+        tables["tempos"] = pack_marks(piece.tempo_list.tempo_list)
+        tables["tempo_ramps"] = pack_ramps(piece.tempo_list.ramp_list)
+
+        path = self.entry_path(file)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+
+        try:
+            with open(temp_path, "wb") as f:
+                numpy.savez(f, **tables)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        os.replace(temp_path, path)
+
+
+def load_piece(
+    file: str, cache_directory: str | None = None, streaming: bool = True
+) -> MusicPiece | StreamedPiece | CachedPiece:
+    """
+    Read a musicxml file, using the cache when a directory is given.
+
+    param file: The path to the musicxml file.
+    param cache_directory: The path of the cache directory or None to skip the cache.
+    param streaming: True to read with StreamedPiece and False to use MusicPiece.
+
+    return: A piece that can be passed to PlayableNoteList.
+    """
+    cache = None
+
+    if cache_directory is not None:
+        cache = ScoreCache(cache_directory)
+        cached_piece = cache.load(file)
+
+        if cached_piece is not None:
+            return cached_piece
+
+    if streaming:
+        piece = StreamedPiece(file)
+    else:
+        piece = MusicPiece(file)
+
+    if cache is not None:
+        cache.store(file, piece)
+
+    return piece
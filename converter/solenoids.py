@@ -3,6 +3,8 @@ from key import Key
 
 BLACK_ROW = 1
 WHITE_ROW = 0
+ROW_SOLENOIDS = 9
+"""The number of solenoids in each row of a hand, which is also its width in positions."""
 
 
 def check_key_count(key_count: int) -> bool:
@@ -18,11 +20,51 @@ def check_key_count(key_count: int) -> bool:
         return False
 
 
+def positions_mask(positions: list[int | None]) -> int:
+    """
+    Convert a list of hand positions to a bitmask with bit n set when position n is in
+    the list. None entries are skipped.
+    """
+    mask = 0
+    for position in positions:
+        if position is not None:
+            mask |= 1 << position
+    return mask
+
+
+def mask_positions(mask: int) -> list[int]:
+    """
+    Convert a bitmask of hand positions back to a list of positions in ascending order.
+    """
+    positions: list[int] = []
+    while mask:
+        low_bit = mask & -mask
+        positions.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return positions
+
+
+def mask_min(mask: int) -> int:
+    """Find the lowest position in a bitmask of hand positions."""
+    if not mask:
+        raise ValueError("mask_min() arg is an empty mask")
+    return (mask & -mask).bit_length() - 1
+
+
+def mask_max(mask: int) -> int:
+    """Find the highest position in a bitmask of hand positions."""
+    if not mask:
+        raise ValueError("mask_max() arg is an empty mask")
+    return mask.bit_length() - 1
+
+
 class SolenoidPositions:
     def __init__(self, row: int, positions: list[int]) -> None:
         # TODO Check for valid inputs
         self.row = row
         self.positions = positions
+        self.mask = positions_mask(positions)
+        """The valid hand positions as a bitmask with bit n set for position n."""
 
     def __str__(self) -> str:
         return str(self.row) + ", " + str(self.positions)
@@ -51,7 +93,7 @@ class SolenoidIndex:
                     temp_array.append(new_positions)
                     if first_key.midi_number + key_count - i >= end_key_count:
                         solenoid_positions.insert(0, solenoid_positions[0] + 1)
-                        if len(solenoid_positions) > 9:
+                        if len(solenoid_positions) > ROW_SOLENOIDS:
                             solenoid_positions.pop()
                     else:
                         solenoid_positions.pop()
@@ -75,7 +117,7 @@ class SolenoidIndex:
                     temp_array.append(new_positions)
                     if first_key.midi_number + key_count - i >= end_key_count:
                         solenoid_positions.insert(0, solenoid_positions[0] + 1)
-                        if len(solenoid_positions) > 9:
+                        if len(solenoid_positions) > ROW_SOLENOIDS:
                             solenoid_positions.pop()
                     else:
                         solenoid_positions.pop()
@@ -92,6 +134,9 @@ class SolenoidIndex:
     def playable_for_pitch(self, midi_pitch: int) -> list[int]:
         return self.index_list[midi_pitch].positions
 
+    def mask_for_pitch(self, midi_pitch: int) -> int:
+        return self.index_list[midi_pitch].mask
+
     def __str__(self) -> str:
         return str(self.index_list)
 
@@ -0,0 +1,286 @@
+"""
+Event driven musicxml ingestion. Only notes, backups, forwards, directions and
+attributes are read and each measure is released as soon as it has been tick tagged, so
+the full ScorePartwise tree is never built.
+"""
+
+from __future__ import annotations
+from collections.abc import Iterator
+from decimal import Decimal
+from xml.etree.ElementTree import Element, iterparse
+
+from generated.musicxml import WedgeType
+from procsss_xml import (
+    IndexedPiece,
+    PartIndex,
+    TaggedNote,
+    TempoList,
+    DynamicList,
+    apply_tempo_variations,
+    apply_dynamic_variations,
+)
+
+
+class StreamPart:
+    def __init__(self, id: str, name: str) -> None:
+        """
+        The parts of a musicxml score-part needed to select a part.
+
+        param id: The id of the part as a string.
+        param name: The name of the part as a string.
+        """
+        self.id = id
+        self.name = name
+
+
+class MeasureEvents:
+    def __init__(self, part_id: str, number: str) -> None:
+        """
+        Everything needed from a single measure of a single part. Every tick is from the
+        start of the part.
+
+        param part_id: The id of the part the measure belongs to.
+        param number: The measure number as written in the musicxml file.
+        """
+        self.part_id = part_id
+        self.number = number
+        self.notes: list[TaggedNote] = []
+        """Every note of the measure in document order."""
+        self.tempos: list[tuple[Decimal]] = []
+        """Every (tempo, tick) pair from a sound element."""
+        self.tempo_variations: list[tuple] = []
+        """Every (words, tick) and ("stop", tick) pair that can mark an accel. or rit."""
+        self.dynamics: list[tuple[Decimal]] = []
+        """Every (dynamic, tick) pair from a sound element."""
+        self.dynamic_variations: list[tuple] = []
+        """Every (WedgeType, tick) pair."""
+        self.divisions: Decimal | None = None
+        """The divisions set in this measure or None if they are not changed."""
+        self.end_tick: Decimal = Decimal(0)
+        """The tick the next measure starts at."""
+
+
+def child_decimal(element: Element, tag: str) -> Decimal | None:
+    child = element.find(tag)
+
+    if child is None:
+        return None
+
+    return Decimal(child.text)
+
+
+def stream_note(
+    element: Element, tick: Decimal, measure: str | None = None
+) -> TaggedNote:
+    """
+    Convert a musicxml note element to a TaggedNote.
+
+    param element: A note Element.
+    param tick: A Decimal value of musicxml ticks from the start of the part.
+    param measure: The number of the measure the note is in.
+
+    return: A TaggedNote holding the parts of the note needed to play it.
+    """
+    chord = element.find("chord") is not None
+
+    if chord or element.find("grace") is not None:
+        duration = Decimal(0)
+    else:
+        duration = child_decimal(element, "duration") or Decimal(0)
+
+    staff_element = element.find("staff")
+    staff = None if staff_element is None else int(staff_element.text)
+
+    pitch_element = element.find("pitch")
+
+    if pitch_element is not None:
+        alter = child_decimal(pitch_element, "alter")
+        pitch = (
+            pitch_element.findtext("step"),
+            int(pitch_element.findtext("octave")),
+            Decimal(0) if alter is None else alter,
+        )
+    elif element.find("rest") is not None:
+        pitch = None
+    else:
+        raise ValueError("Note does not contain pitch")
+
+    return TaggedNote(tick, duration, staff, pitch, chord, measure)
+
+
+def stream_direction(element: Element, events: MeasureEvents, tick: Decimal) -> None:
+    """
+    Add the tempo and dynamic markings of a musicxml direction element to events.
+
+    param element: A direction Element.
+    param events: The MeasureEvents of the measure the direction is in.
+    param tick: A Decimal value of musicxml ticks from the start of the part.
+    """
+    sound = element.find("sound")
+
+    if sound is not None:
+        if sound.get("tempo") is not None:
+            events.tempos.append((Decimal(sound.get("tempo")), tick))
+        if sound.get("dynamics") is not None:
+            events.dynamics.append((Decimal(sound.get("dynamics")), tick))
+
+    for direction_type in element.iterfind("direction-type"):
+        for choice in direction_type:
+            if choice.tag == "words":
+                events.tempo_variations.append((choice.text, tick))
+
+            elif choice.tag == "dashes":
+                if choice.get("type") == "stop":
+                    events.tempo_variations.append(("stop", tick))
+
+            elif choice.tag == "wedge":
+                wedge_type = WedgeType(choice.get("type"))
+                events.dynamic_variations.append((wedge_type, tick))
+
+
+def stream_measure(
+    element: Element, part_id: str, measure_tick: Decimal
+) -> MeasureEvents:
+    """
+    Tick tag the contents of a single musicxml measure element.
+
+    param element: A measure Element.
+    param part_id: The id of the part the measure belongs to.
+    param measure_tick: A Decimal value of musicxml ticks the measure starts at.
+
+    return: A MeasureEvents holding everything needed from the measure.
+    """
+    events = MeasureEvents(part_id, element.get("number"))
+    current_tick = measure_tick
+
+    for child in element:
+        if child.tag == "note":
+            tagged_note = stream_note(child, current_tick, events.number)
+            events.notes.append(tagged_note)
+            current_tick += tagged_note.duration
+
+        elif child.tag == "backup":
+            current_tick -= child_decimal(child, "duration")
+
+        elif child.tag == "forward":
+            current_tick += child_decimal(child, "duration")
+
+        elif child.tag == "direction":
+            stream_direction(child, events, current_tick)
+
+        elif child.tag == "attributes":
+            divisions = child_decimal(child, "divisions")
+            if divisions:
+                events.divisions = divisions
+
+    events.end_tick = current_tick
+
+    return events
+
+
+def iter_score(file: str) -> Iterator[StreamPart | MeasureEvents]:
+    """
+    Read a partwise musicxml file one element at a time. A StreamPart is emitted for
+    each score-part in the part-list followed by a MeasureEvents for each measure of
+    each part in file order.
+
+    param file: The path to the musicxml file.
+
+    return: An iterator of StreamPart and MeasureEvents objects.
+    """
+    part: Element | None = None
+    part_id = ""
+    part_tick = Decimal(0)
+
+    for event, element in iterparse(file, events=("start", "end")):
+        if event == "start":
+            if element.tag == "part":
+                part = element
+                part_id = element.get("id")
+                part_tick = Decimal(0)
+            continue
+
+        if element.tag == "score-part":
+            yield StreamPart(element.get("id"), element.findtext("part-name", ""))
+
+        elif element.tag == "measure" and part is not None:
+            events = stream_measure(element, part_id, part_tick)
+            part_tick = events.end_tick
+            part.remove(element)
+            yield events
+
+        elif element.tag == "part":
+            part.clear()
+            part = None
+
+
+class StreamedPiece(IndexedPiece):
+    def __init__(self, file: str) -> None:
+        """
+        A musicxml piece read with iter_score. This offers the same queries as
+        MusicPiece without holding the musicxml tree.
+
+        param file: The path to the musicxml file.
+        """
+        super().__init__()
+
+        self.process_events(iter_score(file))
+
+    def process_events(self, score_events: Iterator[StreamPart | MeasureEvents]):
+        part_tempos: dict[str, TempoList] = {}
+        part_dynamics: dict[str, DynamicList] = {}
+        tempo_variations: dict[str, list[tuple]] = {}
+        dynamic_variations: dict[str, list[tuple]] = {}
+
+        for events in score_events:
+            if isinstance(events, StreamPart):
+                self.parts_list.append(events)
+                continue
+
+            part_id = events.part_id
+
+            if part_id not in self.part_index:
+                self.part_index[part_id] = PartIndex(Decimal(0), DynamicList())
+                part_tempos[part_id] = TempoList()
+                part_dynamics[part_id] = DynamicList()
+                tempo_variations[part_id] = []
+                dynamic_variations[part_id] = []
+
+            part_index = self.part_index[part_id]
+            part_index.extend(events.notes)
+
+            if events.divisions:
+                part_index.divisions = events.divisions
+
+            for tempo, tick in events.tempos:
+                part_tempos[part_id].append(tempo, tick)
+            for dynamic, tick in events.dynamics:
+                part_dynamics[part_id].append(dynamic, tick)
+
+            tempo_variations[part_id] += events.tempo_variations
+            dynamic_variations[part_id] += events.dynamic_variations
+
+        for part_id, part_index in self.part_index.items():
+            apply_tempo_variations(part_tempos[part_id], tempo_variations[part_id])
+            self.tempo_list.combine(part_tempos[part_id])
+
+            dynamic_list = part_dynamics[part_id]
+            apply_dynamic_variations(dynamic_list, dynamic_variations[part_id])
+            part_index.dynamic_list.combine(dynamic_list)
+
+
+if __name__ == "__main__":
+    import os
+
+    current_directory = os.path.dirname(os.path.realpath(__file__))
+    file_name = "test.musicxml"
+
+    xml_file = f"{current_directory}/{file_name}"
+
+    process_music = StreamedPiece(xml_file)
+
+    score_part = process_music.parts_list[0]
+
+    print(process_music.part_divisions(score_part))
+
+    print(len(process_music.tick_tag_notes(score_part, 1)))
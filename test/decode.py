@@ -1,5 +1,10 @@
+import importlib
+import json
+import os
+import sys
 from enum import Enum
 from dataclasses import dataclass
+from types import ModuleType
 
 BASE18 = (
     "0",
@@ -22,6 +27,14 @@ BASE18 = (
     "H",
 )
 
+INDEX_SUFFIX = ".index.json"
+"""The suffix of the seek index the converter writes next to a pcode file."""
+V2_EXTENSION = ".pc2"
+"""The extension of pcode v2 files, which are read with the converter's PcodeV2Reader."""
+CONVERTER_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "converter"
+)
+
 
 class CommandType(Enum):
     """
@@ -122,10 +135,135 @@ class Command:
         return self.command_str
 
 
+def find_seek_entry(
+    path: str, measure: str | None = None, start_time: int | None = None
+) -> dict:
+    """
+    Look up where to start reading a pcode file in its seek index.
+
+    param path: The path of the pcode file. The index is read from path + INDEX_SUFFIX.
+    param measure: The number of a musicxml measure to start at.
+    param start_time: A time in ms to start at when measure is None. Reading starts at
+                      the first command of the seek interval that holds it.
+
+    return: The index entry with the byte offset, the time of the previous deploy and
+            move in ms and the position of each hand at that point.
+    """
+    with open(path + INDEX_SUFFIX, "rt") as f:
+        index = json.load(f)
+
+    if measure is not None:
+        if measure not in index["measures"]:
+            raise ValueError(f"Measure {measure} is not in the seek index.")
+        return index["measures"][measure]
+
+    mark = int(start_time * 1000 // index["interval"])
+
+    return index["marks"][min(mark, len(index["marks"]) - 1)]
+
+
+def import_converter(name: str) -> ModuleType:
+    """
+    Import a module of the converter. The converter has a kinematics module of its own,
+    so the simulator's is set aside while the converter's modules are imported.
+
+    param name: The name of the module in the converter directory.
+
+    return: The imported module.
+    """
+    simulator_kinematics = sys.modules.pop("kinematics", None)
+    sys.path.insert(0, CONVERTER_DIRECTORY)
+
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(CONVERTER_DIRECTORY)
+        sys.modules.pop("kinematics", None)
+        if simulator_kinematics is not None:
+            sys.modules["kinematics"] = simulator_kinematics
+
+
+def truncate_ms(time_us: int) -> int:
+    """Convert microseconds to milliseconds towards zero the way the converter does."""
+    if time_us < 0:
+        return -(-time_us // 1000)
+
+    return time_us // 1000
+
+
+def read_pcode_v2(path: str, start_time: int | None = None) -> list[str]:
+    """
+    Read a pcode v2 file as the lines of text pcode. Every time parameter is counted
+    from zero so the commands keep their absolute times when read from a start_time.
+
+    param path: The path of the pcode v2 file.
+    param start_time: A time in ms to start at. Only the blocks from the one that holds
+                      it are decoded.
+
+    return: The deploy and move commands as lines of text pcode.
+    """
+    pcode_v2 = import_converter("pcode_v2")
+    previous_times = {pcode_v2.DEPLOY: 0, pcode_v2.MOVE: 0}
+    lines: list[str] = []
+
+    with pcode_v2.PcodeV2Reader(path) as reader:
+        for records in reader.seek(0 if start_time is None else start_time * 1000):
+            for record in records:
+                command, hand, time, duration, digits, force, position = record.tolist()
+                time = truncate_ms(time)
+                relative_time = time - previous_times[command]
+                previous_times[command] = time
+                duration = truncate_ms(duration)
+
+                if command == pcode_v2.DEPLOY:
+                    n = "".join(BASE18[digit] for digit in digits)
+                    lines.append(
+                        f"d s{hand} n{n} f{force} t{relative_time} l{duration}"
+                    )
+                else:
+                    lines.append(f"h s{hand} p{position} d{relative_time} l{duration}")
+
+    return lines
+
+
 class CommandList:
-    def __init__(self, path: str) -> None:
-        with open(path, "rt") as f:
-            self.file_commands = f.read().split("\n")
+    def __init__(
+        self, path: str, measure: str | None = None, start_time: int | None = None
+    ) -> None:
+        """
+        Decode a pcode file. With a measure or start_time the file is read from the
+        matching entry of its seek index instead of from the start. Files ending in
+        V2_EXTENSION are read as pcode v2, which can only start at a start_time and does
+        not record where the hands are, so they stay put until their first move.
+
+        param path: The path of the pcode file.
+        param measure: The number of a musicxml measure to start at.
+        param start_time: A time in ms to start at.
+        """
+        self.start_times = {CommandType.DEPLOY: 0, CommandType.MOVE: 0}
+        """The time in ms of the deploy and move before the first command read."""
+        self.start_positions: dict[int, int] = {}
+        """The position in mm of each hand that has moved before the first command."""
+        if path.endswith(V2_EXTENSION):
+            if measure is not None:
+                raise ValueError("pcode v2 can only be started at a time.")
+
+            self.file_commands = read_pcode_v2(path, start_time)
+        else:
+            offset = 0
+
+            if measure is not None or start_time is not None:
+                entry = find_seek_entry(path, measure, start_time)
+                offset = entry["offset"]
+                self.start_times[CommandType.DEPLOY] = entry["deploy_time"]
+                self.start_times[CommandType.MOVE] = entry["move_time"]
+                self.start_positions = {
+                    int(hand): position for hand, position in entry["positions"].items()
+                }
+
+            with open(path, "rb") as f:
+                f.seek(offset)
+                self.file_commands = f.read().decode().split("\n")
 
         self.play_commands: list[Command] = []
         self.move_commands: list[Command] = []
@@ -140,23 +278,33 @@ class CommandList:
 
             if processed_command.command_type == CommandType.DEPLOY:
                 self.play_commands.append(processed_command)
+                self.in_order_commands.append(processed_command)
 
             elif processed_command.command_type == CommandType.MOVE:
                 self.move_commands.append(processed_command)
+                self.in_order_commands.append(processed_command)
 
     def convert_duration(self) -> None:
-        play_time = 0
-        move_time = 0
-
-        for com in self.play_commands:
-            play_time += com.duration
-            com.duration = play_time
-
-        for com in self.move_commands:
-            move_time += com.duration
-            com.duration = move_time
-
-        self.move_commands.sort(key=lambda x: x.duration)
-        self.play_commands.sort(key=lambda x: x.duration)
-        self.in_order_commands = self.move_commands + self.play_commands
-        self.in_order_commands.sort(key=lambda x: x.duration)
+        """
+        Convert the relative time of every command to the absolute time in a single
+        forward pass. The converter writes deploys and moves merged in time order, so the
+        commands are already in order. Files that list every deploy before every move
+        are sorted instead.
+        """
+        times = dict(self.start_times)
+        previous_time = 0
+        in_order = True
+
+        for com in self.in_order_commands:
+            times[com.command_type] += com.duration
+            com.duration = times[com.command_type]
+
+            if com.duration < previous_time:
+                in_order = False
+            previous_time = com.duration
+
+        if not in_order:
+            self.move_commands.sort(key=lambda x: x.duration)
+            self.play_commands.sort(key=lambda x: x.duration)
+            self.in_order_commands = self.move_commands + self.play_commands
+            self.in_order_commands.sort(key=lambda x: x.duration)
@@ -2,6 +2,9 @@ import kinematics as kinematics
 import numpy
 from copy import deepcopy
 import decimal
+import heapq
+import itertools
+from collections.abc import Iterator
 
 from decode import CommandList, CommandType
 
@@ -20,6 +23,17 @@ TOP_ROW_OFFSET = 9
 MAX_VELOCITY = decimal.Decimal(300)
 MAX_ACCELERATION = decimal.Decimal(3000)
 
+RETRACT_EVENT = 0
+STEP_EVENT = 1
+COMMAND_EVENT = 2
+"""
+The kinds of simulation event. Events at the same time run in this order, so a hand
+retracts and finishes shifting before the next command at that time.
+"""
+
+KEYFRAME_INTERVAL = 256
+"""The number of frames between the full copies of the piano kept for random access."""
+
 
 BOTTOM_KEY_TO_MIDI = (
     21,
@@ -142,6 +156,8 @@ class PianoFrame:
         self.solenoids = [None] * 17
 
         self.current_position: int = 0
+        self.solenoid_mask: int = 0
+        """A bit for each solenoid that is actuated."""
 
         self.frame_time: float = 0
 
@@ -209,6 +225,7 @@ class PianoFrame:
                 self.topLine[self.solenoids[sol]] = OPEN_SOLENOID_CHAR
             else:
                 raise ValueError("Maximum location value/index is 16.")
+        self.solenoid_mask = sum(1 << sol for sol in solenoid_locations)
         self.frame_time = frame_time
 
     def shift_hand(self, keys_shift: int, frame_time: float = 0) -> None:
@@ -227,6 +244,7 @@ class PianoFrame:
                 else:
                     self.middleLine[sol] = " "
                 self.topLine[sol] = CLOSED_SOLENOID_CHAR
+        self.solenoid_mask = 0
         self.frame_time = frame_time
 
     def __str__(self) -> str:
@@ -239,83 +257,177 @@ class PianoFrame:
         )
 
 
+class FrameHistory:
+    def __init__(self) -> None:
+        """
+        Every frame of a simulation stored as the time, hand position and solenoid mask
+        of the piano after each change, with the kind of event that made the change. A
+        full copy of the piano is kept every KEYFRAME_INTERVAL frames and any frame is
+        rebuilt from the copy before it.
+        """
+        self.records: list[tuple[float, int, int, int]] = []
+        """The frame_time, current_position, solenoid_mask and event of each frame."""
+        self.keyframes: list[PianoFrame] = []
+        """A copy of the piano at every KEYFRAME_INTERVAL frame."""
+
+    def capture(self, piano_frame: PianoFrame, event: int) -> None:
+        """
+        Store the frame a piano is in after an event.
+
+        param piano_frame: The PianoFrame after the event.
+        param event: The RETRACT_EVENT, STEP_EVENT or COMMAND_EVENT that changed it.
+        """
+        if len(self.records) % KEYFRAME_INTERVAL == 0:
+            self.keyframes.append(deepcopy(piano_frame))
+
+        self.records.append(
+            (
+                piano_frame.frame_time,
+                piano_frame.current_position,
+                piano_frame.solenoid_mask,
+                event,
+            )
+        )
+
+    @staticmethod
+    def apply(piano_frame: PianoFrame, record: tuple[float, int, int, int]) -> None:
+        """
+        Change a piano to the frame after it by replaying the event of the record. An
+        actuate of no solenoids leaves the keys as they are, so it is not a retract even
+        though both end with an empty solenoid_mask.
+
+        param piano_frame: The PianoFrame of the frame before record.
+        param record: The record of the next frame.
+        """
+        frame_time, position, solenoid_mask, event = record
+
+        if event == STEP_EVENT:
+            piano_frame.shift_hand(position - piano_frame.current_position, frame_time)
+        elif event == RETRACT_EVENT:
+            piano_frame.retract(frame_time)
+        else:
+            piano_frame.actuate(
+                [sol for sol in range(17) if solenoid_mask >> sol & 1], frame_time
+            )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> PianoFrame:
+        if index < 0:
+            index += len(self.records)
+        if not 0 <= index < len(self.records):
+            raise IndexError("Frame index out of range.")
+
+        first = index - index % KEYFRAME_INTERVAL
+        piano_frame = deepcopy(self.keyframes[first // KEYFRAME_INTERVAL])
+
+        for record in self.records[first + 1 : index + 1]:
+            self.apply(piano_frame, record)
+
+        return piano_frame
+
+    def __iter__(self) -> Iterator[PianoFrame]:
+        """
+        Rebuild every frame in order. The same PianoFrame is changed and yielded for
+        each frame, so copy it to keep a frame past the next step.
+        """
+        if len(self.records) == 0:
+            return
+
+        piano_frame = deepcopy(self.keyframes[0])
+        yield piano_frame
+
+        for record in self.records[1:]:
+            self.apply(piano_frame, record)
+            yield piano_frame
+
+
 class FrameList:
     def __init__(self) -> None:
         self.piano_state: PianoFrame = PianoFrame()
-        self.frames: list[PianoFrame] = []
+        self.frames: FrameHistory = FrameHistory()
         self.audio_frames: list[AudioFrame] = []
 
         self.piano_state.populate_hand(INITIAL_HAND_POSITION)
 
-        self.movement: list[float] = []
-        self.movement_direction: int = 0
+        self.events: list[tuple] = []
+        """A heap of (time, event, sequence, data) tuples of the events still to come."""
+        self.sequence = itertools.count()
+        """Keeps events at the same time and of the same kind in the order they were added."""
 
-        self.retract_delay: int = 0
+        self.movement_direction: int = 0
 
-        self.current_move_duration: float = 0
+        self.deploy_count: int = 0
+        """The number of deploys so far. A retract for an earlier deploy is skipped."""
+        self.move_count: int = 0
+        """The number of moves so far. Steps left over from an earlier move are skipped."""
 
-    def __capture_frame(self) -> None:
-        self.frames.append(deepcopy(self.piano_state))
+    def __capture_frame(self, event: int) -> None:
+        self.frames.capture(self.piano_state, event)
 
-    def move_hand(self, distance: int):
-        self.movement = kinematics.time_distance_list(
-            KEY_WIDTH, MAX_ACCELERATION, MAX_VELOCITY, abs(distance)
-        )
+    def __add_event(self, time: float, event: int, data) -> None:
+        heapq.heappush(self.events, (time, event, next(self.sequence), data))
 
-        for time in self.movement:
-            time += self.piano_state.frame_time
+    def move_hand(self, distance: int, start_time: float = 0):
+        distance = round(distance)
 
+        self.move_count += 1
         self.movement_direction = int(numpy.sign(distance))
 
+        # The first time of the list is the start of the move, where the hand has not
+        # shifted yet.
+        movement = kinematics.time_distance_list(
+            KEY_WIDTH, MAX_ACCELERATION, MAX_VELOCITY, abs(distance)
+        )[1:]
+
+        for time in movement:
+            self.__add_event(time + start_time, STEP_EVENT, self.move_count)
+
     def process_command_list(self, command_list: CommandList) -> None:
-        while len(command_list.in_order_commands) > 0:
-            next_command_time = command_list.in_order_commands[0].duration
+        start_position = command_list.start_positions.get(0)
+
+        if start_position is not None:
+            self.piano_state.clear_hand()
+            self.piano_state.populate_hand(round(start_position / KEY_WIDTH))
+
+        for command in command_list.in_order_commands:
+            self.__add_event(command.duration, COMMAND_EVENT, command)
+
+        while len(self.events) > 0:
+            event_time, event, _, data = heapq.heappop(self.events)
 
-            if self.retract_delay > 0 and self.retract_delay < next_command_time:
-                self.piano_state.retract(self.retract_delay)
-                self.__capture_frame()
-                self.retract_delay = 0
+            if event == RETRACT_EVENT:
+                if data != self.deploy_count:
+                    continue
+
+                self.piano_state.retract(event_time)
+                self.__capture_frame(RETRACT_EVENT)
                 self.audio_frames[-1].set_frame_stop(self.piano_state.frame_time)
-                continue
 
-            if len(self.movement) > 0 and self.movement[0] < next_command_time:
-                self.piano_state.shift_hand(
-                    self.movement_direction,
-                    self.movement.pop(0) + self.current_move_duration,
-                )
-                self.__capture_frame()
-                continue
+            elif event == STEP_EVENT:
+                if data != self.move_count:
+                    continue
 
-            current_command = command_list.in_order_commands.pop(0)
+                self.piano_state.shift_hand(self.movement_direction, event_time)
+                self.__capture_frame(STEP_EVENT)
 
-            if current_command.command_type == CommandType.DEPLOY:
-                self.piano_state.actuate(
-                    current_command.solenoid_locations, next_command_time
-                )
-                self.retract_delay = (
-                    current_command.duration + current_command.longevity
+            elif data.command_type == CommandType.DEPLOY:
+                self.piano_state.actuate(data.solenoid_locations, event_time)
+                self.deploy_count += 1
+                self.__add_event(
+                    event_time + data.longevity, RETRACT_EVENT, self.deploy_count
                 )
                 self.audio_frames.append(AudioFrame())
                 self.audio_frames[-1].frame_start = self.piano_state.frame_time
                 self.audio_frames[-1].line_index_to_midi(self.piano_state)
-                self.__capture_frame()
+                self.__capture_frame(COMMAND_EVENT)
 
-            elif current_command.command_type == CommandType.MOVE:
+            elif data.command_type == CommandType.MOVE:
                 distance_in_keys = (
-                    current_command.position / KEY_WIDTH
+                    data.position / KEY_WIDTH
                 ) - self.piano_state.current_position
-                self.move_hand(distance_in_keys)
-                self.current_move_duration = current_command.duration
-
-        if self.retract_delay > 0:
-            self.piano_state.retract(self.retract_delay)
-            self.__capture_frame()
-            self.retract_delay = 0
-            self.audio_frames[-1].set_frame_stop(self.piano_state.frame_time)
-
-        while len(self.movement) > 0:
-            self.piano_state.shift_hand(self.movement_direction, self.movement.pop(0))
-            self.__capture_frame()
+                self.move_hand(distance_in_keys, event_time)
 
 
 class AudioFrame:
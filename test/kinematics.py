@@ -1,153 +1,145 @@
 import math
-from decimal import Decimal
+from functools import lru_cache
 
+import numpy
 
-def accel_time(dist: Decimal, accel: Decimal) -> Decimal:
+TIME_LIST_CACHE_SIZE = 256
+"""The number of distinct moves time_distance_list keeps the times of."""
+
+
+def accel_time(dist: numpy.ndarray, accel: float) -> numpy.ndarray:
     """
     Calculates the time in seconds to travel a given distance with a given acceleration.
 
-    param dist: A Decimal value representing the distance to travel in mm.
-    param accel: A Decimal value representing the acceleration of the move in mm/s^2.
+    param dist: A numpy array of the distances to travel in mm.
+    param accel: A float value representing the acceleration of the move in mm/s^2.
 
-    return: A Decimal value representing the time in seconds it take to travel
-    dist with the given accel.
+    return: A numpy array of the time in seconds it take to travel each dist with the
+    given accel.
     """
 
-    under_root = Decimal((2 * dist) / accel)
-    result_time = under_root.sqrt()
+    return numpy.sqrt((2 * dist) / accel)
 
-    return result_time
 
-
-def velocity_time(dist: Decimal, vel: Decimal) -> Decimal:
+def velocity_time(dist: numpy.ndarray, vel: float) -> numpy.ndarray:
     """
     Returns time to travel a given distance at a constant velocity.
 
-    param dist: A Decimal value representing the final distance to travel in mm.
-    param vel: A Decimal value representing the velocity of the move in mm/s.
+    param dist: A numpy array of the final distances to travel in mm.
+    param vel: A float value representing the velocity of the move in mm/s.
 
-    return: A Decimal value for the total time in seconds to travel dist with
+    return: A numpy array of the total time in seconds to travel each dist with
     the given vel.
     """
 
-    result_time = dist / vel
-
-    return result_time
+    return dist / vel
 
 
-def deceleration_time(dist: Decimal, vel: Decimal, accel: Decimal) -> Decimal:
+def deceleration_time(dist: numpy.ndarray, vel: float, accel: float) -> numpy.ndarray:
     """
     Calculates the time in seconds it takes to travel a given distance
     while decelerating at a given rate from a given starting velocity.
 
-    param dist: A Decimal value representing the final distance to travel in mm.
-    param vel: A Decimal value representing the velocity of the move in mm/s.
-    param accel: A Decimal value representing the deceleration of the move in mm/s^2.
+    param dist: A numpy array of the final distances to travel in mm.
+    param vel: A float value representing the velocity of the move in mm/s.
+    param accel: A float value representing the deceleration of the move in mm/s^2.
 
-    return: A Decimal value representing the time to decelerate from a given velocity
-    over a certain distance.
+    return: A numpy array of the time to decelerate from a given velocity over each
+    distance.
     """
 
-    under_abs = (vel**2) - (2 * accel * (dist))
-    under_root = abs(under_abs)
-    squareRoot = under_root.sqrt()
-    result_time = (vel - squareRoot) / accel
+    squareRoot = numpy.sqrt(numpy.abs((vel**2) - (2 * accel * dist)))
 
-    return result_time
+    return (vel - squareRoot) / accel
 
 
 def time_distance_function(
-    dist: Decimal,
-    accel: Decimal,
-    vel: Decimal,
-    total_dist: Decimal,
-) -> Decimal:
+    dist: numpy.ndarray,
+    accel: float,
+    vel: float,
+    total_dist: float,
+) -> numpy.ndarray:
     """
-    Calculate the time to travel a given distance out of the total distance
+    Calculate the time to travel given distances out of the total distance
     with a given acceleration. The acceleration is limited by the a max velocity.
 
-    param dist: A Decimal value that represents the distance
-    into the move time should be calculated for. Should always be less that total_dist
-    param accel: A Decimal value that represents the acceleration of the move.
-    param vel: A Decimal value that represents the maximum velocity of the move.
+    param dist: A numpy array of the distances into the move time should be calculated
+    for. Each should be between 0 and total_dist.
+    param accel: A float value that represents the acceleration of the move.
+    param vel: A float value that represents the maximum velocity of the move.
     This will limit the acceleration.
-    param total_dist: A Decimal value that represents the total distance of the move
+    param total_dist: A float value that represents the total distance of the move
     which defines how much of the move is in acceleration, constant velocity, and
     deceleration.
 
-    return: A Decimal value that represents the time it takes to reach the dist
-    based on the entire move.
+    return: A numpy array of the time in ms it takes to reach each dist based on the
+    entire move.
     """
     vel_time = vel / accel
 
-    vel_distance = Decimal(0.5) * accel * (vel_time**2)
+    vel_distance = 0.5 * accel * (vel_time**2)
 
-    timePoint = 0
-
-    assert (dist <= total_dist) or (
-        dist >= 0
+    assert numpy.all(
+        (dist <= total_dist) & (dist >= 0)
     ), "Distance must be positve and less than or equal to the total distance."
 
-    """If the total distance is less that twice the distance it takes to get to a 
+    """If the total distance is less that twice the distance it takes to get to a
     constant velocity then constant velocity never occurs for the travel path."""
     if (2 * vel_distance) > total_dist:
         halfDistance = total_dist / 2
         timeOffset = math.sqrt((2 * halfDistance) / accel)
 
-        if dist < halfDistance:
-            timePoint = accel_time(dist, accel)
-        else:
-            decel_dist = dist - halfDistance
-            timePoint = deceleration_time(decel_dist, vel, accel) + timeOffset
+        timePoint = numpy.where(
+            dist < halfDistance,
+            accel_time(dist, accel),
+            deceleration_time(dist - halfDistance, vel, accel) + timeOffset,
+        )
 
     else:
         distanceToDeceleration = total_dist - vel_distance
 
-        if dist < vel_distance:
-            timePoint = accel_time(dist, accel)
-
-        elif dist < distanceToDeceleration:
-            vel_distance_2 = dist - vel_distance
-            timePoint = velocity_time(vel_distance_2, vel) + vel_time
-
-        else:
-            vel_distance_2 = distanceToDeceleration - vel_distance
-            timeToDeceleration = velocity_time(vel_distance_2, vel) + vel_time
-
-            decel_dist = dist - distanceToDeceleration
-
-            timePoint = deceleration_time(decel_dist, vel, accel) + timeToDeceleration
+        vel_distance_2 = distanceToDeceleration - vel_distance
+        timeToDeceleration = velocity_time(vel_distance_2, vel) + vel_time
+
+        timePoint = numpy.select(
+            [dist < vel_distance, dist < distanceToDeceleration],
+            [
+                accel_time(dist, accel),
+                velocity_time(dist - vel_distance, vel) + vel_time,
+            ],
+            deceleration_time(dist - distanceToDeceleration, vel, accel)
+            + timeToDeceleration,
+        )
 
-    return 1000 * (timePoint)
+    return 1000 * timePoint
 
 
+@lru_cache(maxsize=TIME_LIST_CACHE_SIZE)
 def time_distance_list(
-    dist_interval: Decimal, accel: Decimal, vel: Decimal, num_intervals: int
-) -> list[Decimal]:
+    dist_interval: float, accel: float, vel: float, num_intervals: int
+) -> tuple[float, ...]:
     """
-    Generates a list of Decimal values that represent the time to travel
-    a number of distance intervals equal to the index of the list
-
-    param dist_interval: A Decimal value that represents the distance interval
-    that will be used to divide the result list.
-    param accel: A Decimal value that represents the acceleration for the total move.
-    param vel: A Decimal value that represents the maximum velocity of the move.
+    Generates the time to travel a number of distance intervals equal to the index of
+    the result. The whole move is computed at once and the times of the most recently
+    used moves are cached, since the same move distances come up again and again.
+
+    param dist_interval: A float value that represents the distance interval
+    that will be used to divide the result.
+    param accel: A float value that represents the acceleration for the total move.
+    param vel: A float value that represents the maximum velocity of the move.
     param num_intervals: A integer value that represents the total number of intervals.
     This mulitplied by the dist_interval will equal the total distance.
 
-    return: A list of Decimals where the index represents the intervals travelled and
-    the Decimal represents the time to travel that number of intervals.
+    return: A tuple of floats where the index represents the intervals travelled and
+    the float represents the time in ms to travel that number of intervals.
     """
-    adjusted_accel = accel / dist_interval
-    adjusted_vel = vel / dist_interval
-
-    positions: list[Decimal] = []
+    adjusted_accel = float(accel) / float(dist_interval)
+    adjusted_vel = float(vel) / float(dist_interval)
 
-    for i in range(int(num_intervals) + 1):
-        positions.append(
-            time_distance_function(
-                i, adjusted_accel, adjusted_vel, Decimal(num_intervals)
-            )
-        )
+    positions = numpy.arange(int(num_intervals) + 1, dtype=numpy.float64)
 
-    return positions
+    return tuple(
+        time_distance_function(
+            positions, adjusted_accel, adjusted_vel, float(num_intervals)
+        ).tolist()
+    )
@@ -5,6 +5,7 @@ import simpleaudio as sa
 from frame import FrameList
 from audioTest import NoteList
 import os
+import sys
 
 SAMPLE_RATE = 48000
 SPEED_MULTIPLIER = 1
@@ -15,7 +16,9 @@ def main(stdscr):
     current_directory = os.path.dirname(os.path.realpath(__file__))
     file = "/testing.pcode"
 
-    command_list = CommandList(current_directory + file)
+    measure = sys.argv[1] if len(sys.argv) > 1 else None
+
+    command_list = CommandList(current_directory + file, measure)
     frame_list = FrameList()
     frame_list.process_command_list(command_list)
     notes = NoteList()
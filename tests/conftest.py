@@ -0,0 +1,74 @@
+import importlib
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONVERTER_DIRECTORY = os.path.join(ROOT, "converter")
+DATA_DIRECTORY = os.path.join(ROOT, "tests", "data")
+SIMULATOR_DIRECTORY = os.path.join(ROOT, "test")
+
+sys.path.insert(0, CONVERTER_DIRECTORY)
+
+from constants import Constants  # noqa: E402
+from solenoids import SolenoidIndex  # noqa: E402
+from compiler import compile_piece  # noqa: E402
+from pcode import INDEX_SUFFIX, SeekIndex, write_pcode  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def constants() -> Constants:
+    return Constants()
+
+
+@pytest.fixture(scope="session")
+def key_map(constants: Constants) -> SolenoidIndex:
+    return SolenoidIndex(88, constants.first_88_key)
+
+
+@pytest.fixture(scope="session")
+def melody_midi() -> str:
+    """A single track midi melody of 200 notes."""
+    return os.path.join(DATA_DIRECTORY, "melody.mid")
+
+
+@pytest.fixture(scope="session")
+def test_musicxml() -> str:
+    """The two staff score the converter is developed against."""
+    return os.path.join(CONVERTER_DIRECTORY, "test.musicxml")
+
+
+@pytest.fixture(scope="session")
+def test_pcode(constants, key_map, test_musicxml, tmp_path_factory) -> str:
+    """test.musicxml compiled to text pcode with its seek index beside it."""
+    pcode_file = str(tmp_path_factory.mktemp("pcode") / "test.pcode")
+    seek_index = SeekIndex()
+    pcode = compile_piece(constants, key_map, test_musicxml, seek_index=seek_index)
+
+    write_pcode(pcode_file, pcode)
+    seek_index.write(pcode_file + INDEX_SUFFIX)
+
+    return pcode_file
+
+
+@pytest.fixture(scope="session")
+def simulator() -> SimpleNamespace:
+    """
+    The decode and frame modules of the simulator. The simulator has a kinematics module
+    of its own, so the converter's is set aside while they are imported.
+    """
+    converter_kinematics = sys.modules.pop("kinematics", None)
+    sys.path.insert(0, SIMULATOR_DIRECTORY)
+
+    try:
+        decode = importlib.import_module("decode")
+        frame = importlib.import_module("frame")
+    finally:
+        sys.path.remove(SIMULATOR_DIRECTORY)
+        sys.modules.pop("kinematics", None)
+        if converter_kinematics is not None:
+            sys.modules["kinematics"] = converter_kinematics
+
+    return SimpleNamespace(decode=decode, frame=frame)
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import shutil
+
+import pytest
+
+import batch
+
+
+def crash(*args, **kwargs):
+    raise RuntimeError("planner bug")
+
+
+@pytest.fixture
+def scores(tmp_path, melody_midi):
+    input_directory = tmp_path / "in"
+    input_directory.mkdir()
+    shutil.copy(melody_midi, input_directory / "melody.mid")
+    (input_directory / "broken.musicxml").write_text("not xml")
+
+    return str(input_directory)
+
+
+def test_batch_reports_bad_pieces(scores, tmp_path):
+    results = batch.compile_batch(scores, str(tmp_path / "out"), jobs=2)
+
+    errors = {os.path.basename(result.input_file): result.error for result in results}
+
+    assert errors["melody.mid"] is None
+    assert errors["broken.musicxml"].startswith("ParseError")
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the workers only see the patched compile_piece when forked",
+)
+def test_batch_continues_after_crash(scores, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "compile_piece", crash)
+
+    results = batch.compile_batch(scores, str(tmp_path / "out"), jobs=2)
+
+    assert len(results) == 2
+    for result in results:
+        assert result.error == "unexpected RuntimeError: planner bug"
@@ -0,0 +1,33 @@
+import numpy
+
+from binary_pcode import (
+    DEPLOY,
+    MOVE,
+    binary_to_text,
+    read_binary_pcode,
+    text_to_binary,
+)
+
+
+def test_binary_round_trip(test_pcode, tmp_path):
+    binary_file = str(tmp_path / "test.pcb")
+    text_file = str(tmp_path / "test.pcode")
+
+    count = text_to_binary(test_pcode, binary_file)
+    binary_to_text(binary_file, text_file)
+
+    with open(test_pcode, "rt") as f:
+        original = f.read()
+    with open(text_file, "rt") as f:
+        assert f.read() == original
+
+    records = read_binary_pcode(binary_file)
+    lines = original.split("\n")
+
+    assert 0 < count == len(records) == len(lines) - 2
+    assert numpy.count_nonzero(records["command"] == DEPLOY) == sum(
+        line.startswith("d ") for line in lines
+    )
+    assert numpy.count_nonzero(records["command"] == MOVE) == sum(
+        line.startswith("h ") for line in lines
+    )
@@ -0,0 +1,98 @@
+import pytest
+
+TEST_KEYFRAME_INTERVAL = 16
+"""Small enough that test.musicxml spans several keyframes."""
+
+
+def frame_state(piano_frame) -> tuple:
+    return (
+        piano_frame.frame_time,
+        piano_frame.current_position,
+        piano_frame.solenoid_mask,
+        str(piano_frame),
+    )
+
+
+@pytest.fixture
+def simulated(simulator, test_pcode, monkeypatch) -> tuple:
+    """The FrameList of test.musicxml and the state of the piano at every capture."""
+    monkeypatch.setattr(simulator.frame, "KEYFRAME_INTERVAL", TEST_KEYFRAME_INTERVAL)
+
+    frame_list = simulator.frame.FrameList()
+    frames = frame_list.frames
+    captured: list[tuple] = []
+    capture = frames.capture
+
+    def record_capture(piano_frame, event) -> None:
+        captured.append(frame_state(piano_frame))
+        capture(piano_frame, event)
+
+    frames.capture = record_capture
+    frame_list.process_command_list(simulator.decode.CommandList(test_pcode))
+
+    return frames, captured
+
+
+def test_keyframe_rebuild(simulated):
+    frames, captured = simulated
+
+    assert len(frames) == len(captured) > 2 * TEST_KEYFRAME_INTERVAL
+    assert len(frames.keyframes) == -(-len(frames) // TEST_KEYFRAME_INTERVAL)
+
+    for i in range(len(frames)):
+        assert frame_state(frames[i]) == captured[i]
+
+    assert frame_state(frames[-1]) == captured[-1]
+    with pytest.raises(IndexError):
+        frames[len(frames)]
+
+
+def test_frame_iteration(simulated):
+    frames, captured = simulated
+
+    assert [frame_state(piano_frame) for piano_frame in frames] == captured
+
+
+def test_empty_actuate_rebuild(simulator, monkeypatch):
+    frame = simulator.frame
+    monkeypatch.setattr(frame, "KEYFRAME_INTERVAL", TEST_KEYFRAME_INTERVAL)
+
+    piano_frame = frame.PianoFrame()
+    piano_frame.populate_hand(frame.INITIAL_HAND_POSITION)
+    frames = frame.FrameHistory()
+    captured: list[tuple] = []
+
+    def capture(event) -> None:
+        frames.capture(piano_frame, event)
+        captured.append(frame_state(piano_frame))
+
+    capture(frame.COMMAND_EVENT)
+    piano_frame.actuate([0, 3, 10], 1.0)
+    capture(frame.COMMAND_EVENT)
+    piano_frame.actuate([], 2.0)
+    capture(frame.COMMAND_EVENT)
+    piano_frame.shift_hand(1, 3.0)
+    capture(frame.STEP_EVENT)
+    piano_frame.actuate([5], 4.0)
+    capture(frame.COMMAND_EVENT)
+    piano_frame.retract(5.0)
+    capture(frame.RETRACT_EVENT)
+
+    # The empty actuate keeps the keys of the one before it pressed.
+    assert captured[2][3] == captured[1][3] != captured[0][3]
+    assert [frame_state(frames[i]) for i in range(len(frames))] == captured
+    assert [frame_state(piano_frame) for piano_frame in frames] == captured
+
+
+@pytest.mark.parametrize("distance, steps", [(1, 1), (1.4, 1), (-2.6, -3), (5, 5)])
+def test_move_steps(simulator, distance, steps):
+    frame = simulator.frame
+    frame_list = frame.FrameList()
+    frame_list.move_hand(distance, 100.0)
+
+    step_times = sorted(time for time, *_ in frame_list.events)
+
+    # One step event per key, the first after the move starts.
+    assert len(step_times) == abs(steps)
+    assert frame_list.movement_direction * abs(steps) == steps
+    assert step_times[0] > 100.0
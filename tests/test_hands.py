@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import compiler
+from compiler import compile_piece, plan_hand, plan_two_hands
+from hands import HAND_STAVES, clear_masks, collides
+from pcode import Hand
+from playable import ClusterPlanCache, Planner
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(__file__), "data")
+
+
+def positions(note_list) -> list[int]:
+    return note_list.columns.column("position").tolist()
+
+
+def plan_alone(constants, key_map, input_file, planner) -> dict:
+    return {
+        hand: plan_hand(constants, key_map, input_file, staff, planner=planner)
+        for hand, staff in HAND_STAVES.items()
+    }
+
+
+def test_left_hand_replanned_below(constants, key_map):
+    input_file = os.path.join(DATA_DIRECTORY, "left_below.musicxml")
+    alone = plan_alone(constants, key_map, input_file, Planner.OPTIMAL)
+
+    assert collides(alone[Hand.LEFT], alone[Hand.RIGHT])
+
+    note_lists = plan_two_hands(constants, key_map, input_file, planner=Planner.OPTIMAL)
+
+    assert not collides(note_lists[Hand.LEFT], note_lists[Hand.RIGHT])
+    assert positions(note_lists[Hand.RIGHT]) == positions(alone[Hand.RIGHT])
+
+
+def test_right_hand_replanned_above(constants, key_map):
+    input_file = os.path.join(DATA_DIRECTORY, "right_above.musicxml")
+    alone = plan_alone(constants, key_map, input_file, Planner.GREEDY)
+
+    assert collides(alone[Hand.LEFT], alone[Hand.RIGHT])
+    assert clear_masks(alone[Hand.LEFT], alone[Hand.RIGHT], min) is None
+
+    note_lists = plan_two_hands(
+        constants, key_map, input_file, plan_cache=ClusterPlanCache()
+    )
+
+    assert not collides(note_lists[Hand.LEFT], note_lists[Hand.RIGHT])
+    assert positions(note_lists[Hand.LEFT]) == positions(alone[Hand.LEFT])
+
+
+def test_crossing_staves_rejected(constants, key_map, test_musicxml):
+    with pytest.raises(ValueError, match="can not be kept apart"):
+        plan_two_hands(constants, key_map, test_musicxml, plan_cache=ClusterPlanCache())
+
+
+def test_two_hands_compile(constants, key_map):
+    input_file = os.path.join(DATA_DIRECTORY, "right_above.musicxml")
+    pcode = compile_piece(
+        constants, key_map, input_file, plan_cache=ClusterPlanCache(), two_hands=True
+    )
+    hands = {line.split(" ")[1] for line in "".join(pcode).split("\n")[1:-1]}
+
+    assert hands == {f"s{Hand.RIGHT.value}", f"s{Hand.LEFT.value}"}
+
+
+def test_two_hands_share_plan_cache(constants, key_map):
+    input_file = os.path.join(DATA_DIRECTORY, "right_above.musicxml")
+    plan_cache = ClusterPlanCache()
+    plan_two_hands(constants, key_map, input_file, plan_cache=plan_cache)
+
+    assert plan_cache.misses > 0
+    assert len(plan_cache.plans) > 0
+
+    misses = plan_cache.misses
+    plan_two_hands(constants, key_map, input_file, plan_cache=plan_cache)
+
+    assert plan_cache.misses == misses
+    assert plan_cache.hits > 0
+
+
+def test_two_hands_planned_in_place_in_workers(constants, key_map, monkeypatch):
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("The patched executor only reaches workers started with fork.")
+
+    def nested_executor(*args, **kwargs):
+        raise RuntimeError("Worker processes must not start their own.")
+
+    input_file = os.path.join(DATA_DIRECTORY, "right_above.musicxml")
+    expected = plan_two_hands(constants, key_map, input_file)
+    monkeypatch.setattr(compiler, "ProcessPoolExecutor", nested_executor)
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(
+            plan_two_hands,
+            constants,
+            key_map,
+            input_file,
+            plan_cache=ClusterPlanCache(),
+        )
+        note_lists = future.result()
+
+    assert positions(note_lists[Hand.LEFT]) == positions(expected[Hand.LEFT])
+    assert positions(note_lists[Hand.RIGHT]) == positions(expected[Hand.RIGHT])
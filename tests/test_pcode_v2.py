@@ -0,0 +1,97 @@
+import mmap
+
+import numpy
+import pytest
+
+import pcode_v2
+from compiler import compile_command_streams
+from pcode import merge_commands
+from pcode_v2 import PcodeV2Reader, write_pcode_v2
+
+TEST_BLOCK_RECORDS = 16
+"""Small enough that test.musicxml spans several blocks."""
+
+
+@pytest.fixture(scope="module")
+def test_pcode_v2(constants, key_map, test_musicxml, tmp_path_factory) -> str:
+    pcode_file = str(tmp_path_factory.mktemp("pcode_v2") / "test.pc2")
+    streams = compile_command_streams(constants, key_map, test_musicxml)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(pcode_v2, "BLOCK_RECORDS", TEST_BLOCK_RECORDS)
+        write_pcode_v2(pcode_file, merge_commands(streams))
+
+    return pcode_file
+
+
+def test_reader_seek(test_pcode_v2):
+    with PcodeV2Reader(test_pcode_v2) as reader:
+        records = reader.records()
+        assert len(records) == len(reader)
+        assert len(reader.block_times) > 1
+        assert numpy.all(numpy.diff(records["time"].astype(numpy.int64)) >= 0)
+
+        for time in (0, int(records["time"][len(records) // 2]), 10**15):
+            seeked = numpy.concatenate(list(reader.seek(time)))
+            assert numpy.array_equal(seeked, records[records["time"] >= time])
+
+    assert reader.data.closed
+
+
+def test_decode_matches_text(simulator, test_pcode, test_pcode_v2):
+    text = simulator.decode.CommandList(test_pcode)
+    v2 = simulator.decode.CommandList(test_pcode_v2)
+
+    assert len(v2.in_order_commands) > 0
+    assert [str(command) for command in v2.in_order_commands] == [
+        str(command) for command in text.in_order_commands
+    ]
+
+
+def test_decode_seek(simulator, test_pcode_v2):
+    full = simulator.decode.CommandList(test_pcode_v2)
+    start_time = full.in_order_commands[len(full.in_order_commands) // 2].duration
+    seeked = simulator.decode.CommandList(test_pcode_v2, start_time=start_time)
+
+    expected = [
+        (command.command_type, command.duration)
+        for command in full.in_order_commands
+        if command.duration >= start_time
+    ]
+
+    assert [
+        (command.command_type, command.duration) for command in seeked.in_order_commands
+    ] == expected
+
+
+@pytest.mark.parametrize(
+    "corrupt, message",
+    [
+        (lambda data: b"PCD1" + data[4:], "is not a pcode v2 file"),
+        (lambda data: data[:-1], "is truncated"),
+        (lambda data: data[:8], "is too short"),
+    ],
+)
+def test_reader_closes_corrupt_file(
+    test_pcode_v2, tmp_path, monkeypatch, corrupt, message
+):
+    with open(test_pcode_v2, "rb") as f:
+        data = f.read()
+
+    corrupt_file = tmp_path / "corrupt.pc2"
+    corrupt_file.write_bytes(corrupt(data))
+
+    maps = []
+    open_mmap = mmap.mmap
+
+    def record_mmap(*args, **kwargs):
+        maps.append(open_mmap(*args, **kwargs))
+        return maps[-1]
+
+    monkeypatch.setattr(pcode_v2.mmap, "mmap", record_mmap)
+
+    with pytest.raises(ValueError, match=message):
+        PcodeV2Reader(str(corrupt_file))
+
+    assert len(maps) == 1
+    assert maps[0].closed
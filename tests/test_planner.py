@@ -0,0 +1,81 @@
+from compiler import compile_piece, plan_note_list, read_note_list
+from playable import ClusterPlanCache, Planner
+
+
+def test_optimal_planner_on_midi(constants, key_map, melody_midi):
+    note_list = read_note_list(key_map, melody_midi)
+
+    plan_note_list(constants, note_list, Planner.OPTIMAL)
+
+    assert len(note_list.moves) == len(note_list)
+    for note in note_list:
+        assert note.position in note.possible_locations
+
+
+def test_optimal_planner_compiles_midi(constants, key_map, melody_midi):
+    pcode = "".join(
+        compile_piece(constants, key_map, melody_midi, planner=Planner.OPTIMAL)
+    )
+    lines = pcode.split("\n")
+
+    assert lines[0] == "s"
+    assert lines[-1] == "e"
+    assert sum(line.startswith("d ") for line in lines) == 200
+
+
+def test_greedy_planner_compiles_midi(constants, key_map, melody_midi):
+    pcode = "".join(compile_piece(constants, key_map, melody_midi))
+    lines = pcode.split("\n")
+
+    assert lines[0] == "s"
+    assert lines[-1] == "e"
+    assert sum(line.startswith("d ") for line in lines) == 200
+
+
+def test_greedy_groups_need_and_free_consistently(key_map, melody_midi):
+    note_list = read_note_list(key_map, melody_midi)
+    note_list.find_groups()
+    note_list.find_clusters()
+
+    for group in note_list.group_list.group_list:
+        needs = [distance for _, distance in group.need_points]
+        freeds = [distance for _, distance in group.freed_points]
+
+        assert sum(abs(need) for need in needs) == abs(group.absolute_need)
+        assert all(need * group.absolute_need >= 0 for need in needs)
+        assert all(freed * group.absolute_freed >= 0 for freed in freeds)
+
+
+def test_plan_cache_counts_repeated_clusters(constants, key_map, test_musicxml):
+    plan_cache = ClusterPlanCache()
+
+    first = read_note_list(key_map, test_musicxml)
+    plan_note_list(constants, first, Planner.GREEDY, plan_cache)
+    clusters = len(first.group_list.cluster_list)
+
+    assert plan_cache.hits == 0
+    assert plan_cache.misses == len(plan_cache.plans) == clusters
+
+    second = read_note_list(key_map, test_musicxml)
+    plan_note_list(constants, second, Planner.GREEDY, plan_cache)
+
+    assert plan_cache.hits == clusters
+    assert plan_cache.misses == clusters
+    assert second.moves == first.moves
+
+
+def test_plan_cache_history_does_not_change_plans(
+    constants, key_map, test_musicxml, melody_midi
+):
+    warm_cache = ClusterPlanCache()
+    plan_note_list(
+        constants, read_note_list(key_map, test_musicxml), Planner.GREEDY, warm_cache
+    )
+
+    moves = []
+    for plan_cache in (ClusterPlanCache(), warm_cache):
+        note_list = read_note_list(key_map, melody_midi)
+        plan_note_list(constants, note_list, Planner.GREEDY, plan_cache)
+        moves.append(note_list.moves)
+
+    assert moves[0] == moves[1]
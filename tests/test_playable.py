@@ -0,0 +1,84 @@
+import numpy
+import pytest
+
+from kinematics import travel_table
+from note_columns import NoteColumns
+from pcode import KEY_WIDTH
+from playable import PlayableNote, move_scores
+
+NOTES = [(i * 100000, 90000 + i, 60 + i, 40 + i) for i in range(10)]
+"""The (start, duration, pitch, velocity) of each stored note."""
+
+
+def test_columns_grow_and_back_notes(key_map):
+    columns = NoteColumns(key_map, capacity=2)
+
+    for start, duration, pitch, velocity in NOTES:
+        index = columns.append(start, duration, pitch, velocity)
+        columns.add_pitch(index, pitch + 12)
+
+    with pytest.raises(ValueError):
+        columns.add_pitch(0, 30)
+
+    notes = [PlayableNote(columns, i) for i in range(columns.count)]
+
+    assert columns.count == len(NOTES)
+    assert [
+        (note.note_start, note.duration, note.midi_pitches, note.velocity)
+        for note in notes
+    ] == [
+        (start, duration, [pitch, pitch + 12], velocity)
+        for start, duration, pitch, velocity in NOTES
+    ]
+
+    # A note is a view of its row, so changes show through every copy of it.
+    notes[3].set_position(7)
+    notes[4].duration = 5
+
+    assert PlayableNote(columns, 3).position == 7
+    assert columns.column("duration")[4] == 5
+    assert columns.column("position").tolist() == [0, 0, 0, 7] + [0] * 6
+
+
+@pytest.mark.parametrize(
+    "duration, next_delay",
+    [
+        (200000, 200000),
+        (200000, 150000),
+        (200000, 0),
+        (1, 0),
+        (200000, 260000),
+        (200000, 2000000),
+    ],
+    ids=["zero", "negative", "last note", "short", "small", "large"],
+)
+def test_move_scores_match_scalar(constants, key_map, duration, next_delay):
+    table = travel_table(KEY_WIDTH, constants.max_acceleration, constants.max_velocity)
+    columns = NoteColumns(key_map)
+    columns.append(0, duration, 60, 40)
+    columns.next_delay[0] = next_delay
+    note = PlayableNote(columns, 0)
+
+    distances = numpy.arange(-12, 13)
+    expected = [note.move_score(int(distance), table) for distance in distances]
+    scores = move_scores(
+        distances,
+        numpy.full(len(distances), next_delay - duration, dtype=numpy.int64),
+        numpy.full(len(distances), duration, dtype=numpy.int64),
+        table,
+    )
+
+    assert scores.tolist() == pytest.approx(expected)
+
+
+def test_move_scores_without_duration(constants):
+    table = travel_table(KEY_WIDTH, constants.max_acceleration, constants.max_velocity)
+    scores = move_scores(
+        numpy.array([0, 1, 0]),
+        numpy.array([0.0, 0.0, 10.0**9]),
+        numpy.zeros(3),
+        table,
+    )
+
+    # No time can be taken from a note without a duration unless the move fits.
+    assert scores.tolist() == [numpy.inf, numpy.inf, 0.0]
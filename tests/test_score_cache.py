@@ -0,0 +1,89 @@
+import glob
+import os
+
+import pytest
+
+import score_cache
+from procsss_xml import MusicPiece
+from score_cache import ScoreCache
+from stream_xml import StreamedPiece
+
+TESTS_DIRECTORY = os.path.dirname(__file__)
+PIECES = [
+    os.path.join(TESTS_DIRECTORY, "..", "converter", "test.musicxml"),
+    *sorted(glob.glob(os.path.join(TESTS_DIRECTORY, "data", "*.musicxml"))),
+]
+"""Every musicxml file the tests are run against."""
+
+LONG_MEASURE = "X1-second-ending-repeat"
+"""A measure label longer than a fixed width field would hold."""
+
+
+def note_rows(piece) -> list[list[tuple]]:
+    return [
+        [
+            (note.tick, note.duration, note.staff, note.pitch, note.chord, note.measure)
+            for note in piece.part_notes(score_part)
+        ]
+        for score_part in piece.parts_list
+    ]
+
+
+def piece_rows(piece) -> tuple:
+    return (
+        [score_part.id for score_part in piece.parts_list],
+        note_rows(piece),
+        [
+            piece.find_dynamic_list(score_part).dynamic_list
+            for score_part in piece.parts_list
+        ],
+        [piece.part_divisions(score_part) for score_part in piece.parts_list],
+        piece.tempo_list.tempo_list,
+        piece.tempo_list.ramp_list,
+    )
+
+
+@pytest.mark.parametrize(
+    "input_file",
+    PIECES,
+    ids=os.path.basename,
+)
+def test_pieces_read_the_same_notes(input_file, tmp_path):
+    music_piece = MusicPiece(input_file)
+    streamed_piece = StreamedPiece(input_file)
+
+    cache = ScoreCache(str(tmp_path))
+    cache.store(input_file, streamed_piece)
+    cached_piece = cache.load(input_file)
+
+    assert cached_piece is not None
+    assert len(note_rows(music_piece)[0]) > 0
+    assert piece_rows(streamed_piece) == piece_rows(music_piece)
+    assert piece_rows(cached_piece) == piece_rows(music_piece)
+
+
+def test_cache_keeps_long_measure_labels(test_musicxml, tmp_path):
+    piece = StreamedPiece(test_musicxml)
+    notes = piece.part_notes(piece.parts_list[0])
+    notes[0].measure = LONG_MEASURE
+    notes[1].measure = None
+
+    cache = ScoreCache(str(tmp_path))
+    cache.store(test_musicxml, piece)
+    cached_piece = cache.load(test_musicxml)
+
+    assert cached_piece is not None
+    assert note_rows(cached_piece) == note_rows(piece)
+
+
+def test_failed_store_removes_temp_file(test_musicxml, tmp_path, monkeypatch):
+    def failing_savez(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(score_cache.numpy, "savez", failing_savez)
+    cache = ScoreCache(str(tmp_path))
+
+    with pytest.raises(OSError, match="disk full"):
+        cache.store(test_musicxml, StreamedPiece(test_musicxml))
+
+    assert os.listdir(tmp_path) == []
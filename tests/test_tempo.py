@@ -0,0 +1,48 @@
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from procsss_xml import TempoList
+
+RAMP_US = 4000000 * math.log(2)
+"""The length of a four quarter accel. from 60 to 120 bpm, 4 ln 2 seconds."""
+
+
+@pytest.fixture
+def ramp_tempo() -> TempoList:
+    """60 bpm for four quarters, an accel. to 120 bpm over four more, then 120 bpm."""
+    tempo_list = TempoList()
+    tempo_list.append(Decimal(60), Decimal(0))
+    tempo_list.append_ramp(Decimal(60), Decimal(120), Decimal(4), Decimal(8))
+
+    return tempo_list
+
+
+def test_tick_us_before_ramp_is_exact(ramp_tempo):
+    assert ramp_tempo.tick_us(Decimal(0), Decimal(1)) == 0
+    assert ramp_tempo.tick_us(Decimal("2.5"), Decimal(1)) == 2500000
+    assert ramp_tempo.tick_us(Decimal(4), Decimal(1)) == 4000000
+    assert ramp_tempo.tick_us(Decimal(4), Decimal(2)) == 2000000
+    assert isinstance(ramp_tempo.tick_us(Decimal(3), Decimal(1)), Fraction)
+
+
+@pytest.mark.parametrize(
+    "tick, expected",
+    [
+        (Decimal(6), 4000000 + 4000000 * math.log(1.5)),
+        (Decimal(8), 4000000 + RAMP_US),
+        (Decimal(10), 5000000 + RAMP_US),
+    ],
+)
+def test_tick_us_across_ramp(ramp_tempo, tick, expected):
+    assert float(ramp_tempo.tick_us(tick, Decimal(1))) == pytest.approx(expected)
+
+
+def test_tick_time_across_ramp(ramp_tempo):
+    ramp_time = ramp_tempo.tick_time(Decimal(4), Decimal(8), Decimal(1))
+    after_ramp = ramp_tempo.tick_time(Decimal(8), Decimal(12), Decimal(1))
+
+    assert float(ramp_time) == pytest.approx(RAMP_US)
+    assert after_ramp == 2000000